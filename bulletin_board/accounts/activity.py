@@ -0,0 +1,61 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Case, When
+from django.utils import timezone
+
+from .models import Profile
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = {}  # user_id -> время последней активности
+_last_flush = time.monotonic()
+
+
+def touch(user_id, moment=None):
+    """
+    Запоминает активность пользователя в памяти процесса. В БД уходит пачкой раз
+    в ACTIVITY_FLUSH_INTERVAL секунд или когда в буфере набралось ACTIVITY_FLUSH_SIZE пользователей.
+    """
+    with _lock:
+        _pending[user_id] = moment or timezone.now()
+        due = (
+            time.monotonic() - _last_flush >= getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 60)
+            or len(_pending) >= getattr(settings, 'ACTIVITY_FLUSH_SIZE', 500)
+        )
+    if due:
+        flush()
+
+
+def flush():
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+
+    # один UPDATE ... CASE на всю пачку, как у bulk_update, но по user_id без лишнего SELECT
+    try:
+        return Profile.objects.filter(user_id__in=pending).update(
+            last_activity=Case(*[When(user_id=user_id, then=moment) for user_id, moment in pending.items()])
+        )
+    except Exception as e:
+        logger.error(f"Ошибка сохранения активности пользователей: {e}")
+        with _lock:
+            for user_id, moment in pending.items():
+                _pending.setdefault(user_id, moment)
+        return 0
+
+
+def flush_at_exit():
+    """
+    Досылает буфер при остановке процесса. Вызывается только из wsgi.py/asgi.py: в manage.py
+    к моменту выхода тестовая БД уже удалена, и запись ушла бы в рабочую базу.
+    """
+    atexit.register(flush)
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from board.images import get_executor, open_limited
+
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = getattr(settings, 'AVATAR_SIZES', (40, 96, 256))
+URL_CACHE_TIMEOUT = getattr(settings, 'AVATAR_URL_CACHE_TIMEOUT', 60 * 60 * 24)
+SYNC = getattr(settings, 'IMAGE_RENDITIONS_SYNC', False)
+
+
+def generate_avatar_sizes(name, storage=None):
+    """
+    Обрезает аватар по центру до квадрата и сохраняет фиксированные размеры.
+    Имя файла — хэш содержимого, так что URL неизменяем и кэшируется навсегда.
+    """
+    from PIL import ImageOps
+
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    image = ImageOps.exif_transpose(open_limited(data))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    sizes = {}
+    for size in AVATAR_SIZES:
+        target = f'avatars/{digest}_{size}.jpg'
+        if not storage.exists(target):
+            buffer = BytesIO()
+            ImageOps.fit(image, (size, size)).save(buffer, 'JPEG', quality=85, optimize=True)
+            storage.save(target, ContentFile(buffer.getvalue()))
+        sizes[str(size)] = target
+    return sizes
+
+
+def _store_sizes(profile_pk, user_id, name, sizes):
+    from .models import Profile
+    Profile.objects.filter(pk=profile_pk, avatar=name).update(avatar_sizes=sizes)
+    # update() не шлёт post_save, сбрасываем кэш сами
+    invalidate_avatar_url(user_id)
+
+
+def _on_done(profile_pk, user_id, name, future):
+    try:
+        _store_sizes(profile_pk, user_id, name, future.result())
+    except Exception as e:
+        logger.error(f"Ошибка обработки аватара {name} профиля {profile_pk}: {e}")
+    finally:
+        connection.close()
+
+
+def process_avatar(profile_pk, user_id, name):
+    if SYNC:
+        _store_sizes(profile_pk, user_id, name, generate_avatar_sizes(name))
+        return
+    future = get_executor().submit(generate_avatar_sizes, name)
+    future.add_done_callback(lambda done: _on_done(profile_pk, user_id, name, done))
+
+
+def schedule_avatar(profile):
+    if profile.avatar:
+        pk, user_id, name = profile.pk, profile.user_id, profile.avatar.name
+        transaction.on_commit(lambda: process_avatar(pk, user_id, name))
+
+
+def delete_avatar_sizes(sizes, storage=None):
+    """
+    Удаляет копии прежнего аватара. Имена — хэш содержимого, и та же картинка у другого
+    профиля даёт те же файлы: их оставляем, пока на них кто-то ссылается.
+    """
+    from .models import Profile
+
+    storage = storage or default_storage
+    names = set(sizes.values())
+    in_use = set()
+    for digest in {os.path.basename(name).rsplit('_', 1)[0] for name in names}:
+        for other in Profile.objects.filter(avatar_sizes__icontains=digest).values_list('avatar_sizes', flat=True):
+            in_use.update(other.values())
+    for name in names - in_use:
+        try:
+            storage.delete(name)
+        except OSError as e:
+            logger.warning(f"Не удалось удалить копию аватара {name}: {e}")
+
+
+def delete_avatar_sizes_on_commit(sizes):
+    """Удаляет копии после коммита: при откате профиль продолжает на них ссылаться."""
+    if sizes:
+        sizes = dict(sizes)
+        transaction.on_commit(lambda: delete_avatar_sizes(sizes))
+
+
+def build_avatar_urls(avatar, sizes):
+    """{размер: url} для аватара; пока размеры не готовы — все указывают на оригинал."""
+    if not avatar:
+        return {}
+    if not sizes:
+        original = default_storage.url(str(avatar))
+        return {size: original for size in AVATAR_SIZES}
+    return {int(size): default_storage.url(name) for size, name in sizes.items()}
+
+
+def pick_size(urls, size):
+    if not urls:
+        return ''
+    fitting = [available for available in sorted(urls) if available >= size]
+    return urls[fitting[0] if fitting else max(urls)]
+
+
+def _cache_key(user_id):
+    return f'accounts:avatar:{user_id}'
+
+
+def avatar_urls(user_ids):
+    """URL аватаров пачки пользователей: кэш get_many, промахи — одним запросом."""
+    from .models import Profile
+
+    user_ids = set(user_ids)
+    keys = {_cache_key(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: urls for key, urls in cached.items()}
+
+    missing = user_ids - result.keys()
+    if missing:
+        fresh = {user_id: {} for user_id in missing}
+        rows = Profile.objects.filter(user_id__in=missing).values_list('user_id', 'avatar', 'avatar_sizes')
+        for user_id, avatar, sizes in rows:
+            fresh[user_id] = build_avatar_urls(avatar, sizes)
+        cache.set_many({_cache_key(user_id): urls for user_id, urls in fresh.items()}, URL_CACHE_TIMEOUT)
+        result.update(fresh)
+    return result
+
+
+def avatar_url(user_id, size=96):
+    return pick_size(avatar_urls([user_id])[user_id], size)
+
+
+def invalidate_avatar_url(user_id):
+    cache.delete(_cache_key(user_id))
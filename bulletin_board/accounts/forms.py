@@ -92,7 +92,7 @@ class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
         fields = ['avatar', 'bio', 'phone', 'birth_date', 'website', 'discord', 'steam',
-                  'email_notifications',]
+                  'email_notifications', 'response_notifications']
         widgets = {
             'bio': forms.Textarea(attrs={'class': 'form-control', 'rows': 4, 'placeholder': 'Расскажите о себе...'}),
             'phone': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '+7 (XXX) XXX-XX-XX'}),
@@ -100,7 +100,8 @@ class ProfileForm(forms.ModelForm):
             'website': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://...'}),
             'discord': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Username#1234'}),
             'steam': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Steam ID или ссылка'}),
-            'email_notifications': forms.CheckboxInput(attrs={'class': 'form-check-input'})
+            'email_notifications': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'response_notifications': forms.Select(attrs={'class': 'form-select'}),
         }
         labels = {
             'avatar': 'Аватар',
@@ -111,6 +112,7 @@ class ProfileForm(forms.ModelForm):
             'discord': 'Discord',
             'steam': 'Steam',
             'email_notifications': 'Получать уведомления по email',
+            'response_notifications': 'Письма о новых откликах',
         }
 
 
@@ -0,0 +1,32 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from accounts.avatars import generate_avatar_sizes, invalidate_avatar_url
+from accounts.models import Profile
+from board.images import get_executor
+
+
+class Command(BaseCommand):
+    help = 'Создаёт квадратные копии аватаров, загруженных до появления обработки'
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(avatar='').exclude(avatar__isnull=True).filter(avatar_sizes={})
+
+        executor = get_executor()
+        futures = {
+            executor.submit(generate_avatar_sizes, name): (pk, user_id, name)
+            for pk, user_id, name in profiles.values_list('pk', 'user_id', 'avatar').iterator()
+        }
+        done = failed = 0
+        for future in as_completed(futures):
+            pk, user_id, name = futures[future]
+            try:
+                Profile.objects.filter(pk=pk, avatar=name).update(avatar_sizes=future.result())
+                invalidate_avatar_url(user_id)
+                done += 1
+            except Exception as e:
+                self.stderr.write(f'{name}: {e}')
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано {done}, ошибок {failed}'))
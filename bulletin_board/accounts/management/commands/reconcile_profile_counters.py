@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import Profile
+from board.models import Ad, Response
+
+
+def _count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('user_id')}).order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Profile.total_ads и Profile.total_responses пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        updated = 0
+        while True:
+            ids = list(
+                Profile.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                updated += Profile.objects.filter(pk__in=ids).update(
+                    total_ads=_count_subquery(Ad.objects.all(), 'author'),
+                    total_responses=_count_subquery(Response.objects.all(), 'from_user'),
+                )
+            last_pk = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Счётчики пересчитаны для {updated} профилей'))
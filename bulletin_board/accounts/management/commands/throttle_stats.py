@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.throttling import get_stats, stats_shared
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько запросов пропустили и отбили лимиты частоты. '
+        'Счётчики лежат в кэше, поэтому нужен общий для всех процессов кэш (Redis, REDIS_URL): '
+        'с LocMemCache у команды свой пустой кэш, а не кэш воркеров сайта.'
+    )
+
+    def handle(self, *args, **options):
+        if not stats_shared():
+            raise CommandError(
+                'Кэш по умолчанию не общий (LocMemCache): счётчики воркеров из команды не видны. '
+                'Настройте общий кэш, например REDIS_URL.'
+            )
+        for scope, counters in get_stats().items():
+            total = counters['allowed'] + counters['throttled']
+            share = counters['throttled'] / total * 100 if total else 0.0
+            self.stdout.write(
+                f"{scope:<16} пропущено {counters['allowed']:>8}  отбито {counters['throttled']:>8}  ({share:.1f}%)"
+            )
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+def disable_for_opted_out(apps, schema_editor):
+    # кто отказался от писем вообще, не должен начать получать письма об откликах
+    Profile = apps.get_model('accounts', 'Profile')
+    Profile.objects.filter(email_notifications=False).update(response_notifications='off')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_profile_avatar_sizes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='response_notifications',
+            field=models.CharField(choices=[('instant', 'Сразу'), ('hourly', 'Сводка раз в час'), ('daily', 'Сводка раз в день'), ('off', 'Не присылать')], default='instant', max_length=10, verbose_name='Уведомления об откликах'),
+        ),
+        migrations.RunPython(disable_for_opted_out, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 23:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_response_notifications'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последняя активность'),
+        ),
+    ]
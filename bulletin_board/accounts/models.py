@@ -2,11 +2,25 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 from django.db.models.signals import post_save
+from django.utils import timezone
 
 
 class Profile(models.Model):
+    NOTIFY_INSTANT = 'instant'
+    NOTIFY_HOURLY = 'hourly'
+    NOTIFY_DAILY = 'daily'
+    NOTIFY_OFF = 'off'
+    NOTIFY_CHOICES = [
+        (NOTIFY_INSTANT, 'Сразу'),
+        (NOTIFY_HOURLY, 'Сводка раз в час'),
+        (NOTIFY_DAILY, 'Сводка раз в день'),
+        (NOTIFY_OFF, 'Не присылать'),
+    ]
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name='Аватар')
+    # квадратные копии аватара {'40': 'avatars/<хэш>_40.jpg', ...}, заполняет accounts.avatars
+    avatar_sizes = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(max_length=500, blank=True, verbose_name='О себе')
     phone = models.CharField(max_length=20, blank=True, verbose_name='Телефон')
     birth_date = models.DateField(null=True, blank=True, verbose_name='Дата рождения')
@@ -15,8 +29,12 @@ class Profile(models.Model):
     steam = models.CharField(max_length=50, blank=True, verbose_name='Steam ID')
     total_ads = models.PositiveIntegerField(default=0, verbose_name='Всего объявлений')
     total_responses = models.PositiveIntegerField(default=0, verbose_name='Всего откликов')
-    last_activity = models.DateTimeField(auto_now=True, verbose_name='Последняя активность')
+    # пишет accounts.activity пачкой; auto_now затирал бы буфер при каждом сохранении профиля
+    last_activity = models.DateTimeField(default=timezone.now, verbose_name='Последняя активность')
     email_notifications = models.BooleanField(default=True, verbose_name='Уведомления по email')
+    # письма о новых откликах на объявления пользователя: сразу, сводкой или никак
+    response_notifications = models.CharField(max_length=10, choices=NOTIFY_CHOICES, default=NOTIFY_INSTANT,
+                                              verbose_name='Уведомления об откликах')
     password_reset_token = models.CharField(max_length=100, blank=True, verbose_name='Токен сброса пароля')
 
 
@@ -25,8 +43,9 @@ class Profile(models.Model):
 
     @property
     def get_avatar_url(self):
+        from .avatars import build_avatar_urls, pick_size
         if self.avatar:
-            return self.avatar.url
+            return pick_size(build_avatar_urls(self.avatar, self.avatar_sizes), 256)
         return '/static/images/default-avatar.png'
 
     class Meta:
@@ -37,9 +56,4 @@ class Profile(models.Model):
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.create(user=instance)
-
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+        Profile.objects.create(user=instance)
\ No newline at end of file
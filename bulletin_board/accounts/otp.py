@@ -0,0 +1,96 @@
+import secrets
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+# Незавершённые регистрации живут в кэше с TTL, а не в django_session:
+# анонимный посетитель не создаёт строк в БД, просроченные записи исчезают сами.
+TTL = getattr(settings, 'OTP_TTL', 600)
+MAX_ATTEMPTS = getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+RESEND_INTERVAL = getattr(settings, 'OTP_RESEND_INTERVAL', 60)
+CODE_LENGTH = 6
+
+COOKIE_NAME = 'register_id'
+COOKIE_SALT = 'accounts.otp.register'
+
+VERIFIED = 'verified'
+INVALID = 'invalid'
+LOCKED = 'locked'
+EXPIRED = 'expired'
+
+
+def _key(registration_id, suffix=''):
+    return f'accounts:register:{registration_id}{suffix}'
+
+
+def _generate_code():
+    return ''.join(secrets.choice('0123456789') for _ in range(CODE_LENGTH))
+
+
+def _code_digest(registration_id, code):
+    # в кэше только HMAC кода: утечка дампа кэша не раскрывает сами коды
+    return salted_hmac(COOKIE_SALT, f'{registration_id}:{code}').hexdigest()
+
+
+def start_registration(email, username, password):
+    """Создаёт запись регистрации. Возвращает (registration_id, code)."""
+    registration_id = secrets.token_urlsafe(24)
+    code = _generate_code()
+    cache.set(_key(registration_id), {
+        'email': email,
+        'username': username,
+        'password': make_password(password),
+        'code': _code_digest(registration_id, code),
+    }, TTL)
+    cache.set(_key(registration_id, ':attempts'), 0, TTL)
+    cache.set(_key(registration_id, ':resend'), 1, RESEND_INTERVAL)
+    return registration_id, code
+
+
+def get_registration(registration_id):
+    if not registration_id:
+        return None
+    return cache.get(_key(registration_id))
+
+
+def resend_code(registration_id):
+    """Новый код и новый срок жизни. None — запись истекла или прошлый код отправлен слишком недавно."""
+    data = get_registration(registration_id)
+    if data is None or not cache.add(_key(registration_id, ':resend'), 1, RESEND_INTERVAL):
+        return None
+    code = _generate_code()
+    data['code'] = _code_digest(registration_id, code)
+    cache.set(_key(registration_id), data, TTL)
+    cache.set(_key(registration_id, ':attempts'), 0, TTL)
+    return code
+
+
+def attempts_left(registration_id):
+    return max(MAX_ATTEMPTS - (cache.get(_key(registration_id, ':attempts')) or 0), 0)
+
+
+def verify_code(registration_id, code):
+    data = get_registration(registration_id)
+    if data is None:
+        return EXPIRED
+    try:
+        # incr атомарен в Redis/Memcached: параллельный перебор не обойдёт лимит
+        attempts = cache.incr(_key(registration_id, ':attempts'))
+    except ValueError:
+        return EXPIRED
+    if attempts > MAX_ATTEMPTS:
+        finish_registration(registration_id)
+        return LOCKED
+    if not constant_time_compare(data['code'], _code_digest(registration_id, code)):
+        if attempts >= MAX_ATTEMPTS:
+            finish_registration(registration_id)
+            return LOCKED
+        return INVALID
+    return VERIFIED
+
+
+def finish_registration(registration_id):
+    cache.delete_many([_key(registration_id), _key(registration_id, ':attempts'), _key(registration_id, ':resend')])
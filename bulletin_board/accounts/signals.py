@@ -0,0 +1,47 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from board.models import Ad, Response
+from .avatars import delete_avatar_sizes_on_commit, invalidate_avatar_url
+from .models import Profile
+
+
+def _bump(user_id, field, delta):
+    profiles = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(**{f'{field}__gt': 0})
+    profiles.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Ad)
+def count_created_ad(sender, instance, created, **kwargs):
+    if created:
+        _bump(instance.author_id, 'total_ads', 1)
+
+
+@receiver(post_delete, sender=Ad)
+def count_deleted_ad(sender, instance, **kwargs):
+    _bump(instance.author_id, 'total_ads', -1)
+
+
+@receiver(post_save, sender=Response)
+def count_created_response(sender, instance, created, **kwargs):
+    if created:
+        _bump(instance.from_user_id, 'total_responses', 1)
+
+
+@receiver(post_delete, sender=Response)
+def count_deleted_response(sender, instance, **kwargs):
+    _bump(instance.from_user_id, 'total_responses', -1)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def reset_avatar_url(sender, instance, **kwargs):
+    invalidate_avatar_url(instance.user_id)
+
+
+@receiver(post_delete, sender=Profile)
+def delete_avatar_files(sender, instance, **kwargs):
+    delete_avatar_sizes_on_commit(instance.avatar_sizes)
@@ -0,0 +1,12 @@
+from django import template
+
+from accounts.avatars import avatar_url as get_avatar_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(user_id, size=96):
+    """URL аватара из кэша, без обращения к Profile. Пустая строка — аватара нет."""
+    return get_avatar_url(user_id, size)
@@ -1,3 +1,383 @@
-from django.test import TestCase
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from board.models import Ad, Category, Response
+from . import activity, avatars, otp, throttling
+from .models import Profile
+from .templatetags.avatars import avatar_url
+
+
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def _request(self, user=None, **meta):
+        request = self.factory.post('/', **meta)
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate('5/10m'), (5, 600))
+        self.assertEqual(throttling.parse_rate('3/h'), (3, 3600))
+        self.assertEqual(throttling.parse_rate('100/30s'), (100, 30))
+        self.assertEqual(throttling.parse_rate('1/d'), (1, 86400))
+        for rate in ('5', '5/10', 'x/m', '5/10w'):
+            with self.assertRaises(ValueError):
+                throttling.parse_rate(rate)
+
+    def test_bucket_refills_over_time(self):
+        bucket = [('test:bucket', (2, 60))]
+        self.assertEqual(throttling.take_tokens(bucket, now=1000), 0)
+        self.assertEqual(throttling.take_tokens(bucket, now=1000), 0)
+        # ведро пусто, токен пополняется за 30 с
+        self.assertEqual(throttling.take_tokens(bucket, now=1000), 30)
+        self.assertEqual(throttling.take_tokens(bucket, now=1020), 10)
+        self.assertEqual(throttling.take_tokens(bucket, now=1030), 0)
+
+    def test_rejected_request_spends_no_tokens(self):
+        ip_bucket, user_bucket = ('test:ip', (5, 60)), ('test:user', (1, 60))
+        self.assertEqual(throttling.take_tokens([ip_bucket, user_bucket], now=1000), 0)
+        for _ in range(3):
+            self.assertGreater(throttling.take_tokens([ip_bucket, user_bucket], now=1000), 0)
+        # отбитые запросы IP-ведро не опустошили: с этого адреса проходят другие
+        for _ in range(4):
+            self.assertEqual(throttling.take_tokens([ip_bucket], now=1000), 0)
+        self.assertGreater(throttling.take_tokens([ip_bucket], now=1000), 0)
+
+    def test_client_ip(self):
+        request = self._request(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2, 3.3.3.3')
+        self.assertEqual(throttling.client_ip(request), '10.0.0.1')
+        with override_settings(THROTTLE_NUM_PROXIES=1):
+            self.assertEqual(throttling.client_ip(request), '3.3.3.3')
+        with override_settings(THROTTLE_NUM_PROXIES=2):
+            self.assertEqual(throttling.client_ip(request), '2.2.2.2')
+        # заголовок короче цепочки прокси — подделка или прямой заход, верим только REMOTE_ADDR
+        with override_settings(THROTTLE_NUM_PROXIES=4):
+            self.assertEqual(throttling.client_ip(request), '10.0.0.1')
+
+    @override_settings(THROTTLE_RATES={'test': {'ip': '2/m', 'user': '5/m'}})
+    def test_decorator_returns_429_with_retry_after(self):
+        view = throttling.throttle('test')(lambda request: HttpResponse('ok'))
+        user = User.objects.create_user('player', 'player@example.com', 'password123')
+        for _ in range(2):
+            self.assertEqual(view(self._request(user, REMOTE_ADDR='10.0.0.1')).status_code, 200)
+        response = view(self._request(user, REMOTE_ADDR='10.0.0.1'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # GET токены не расходует
+        self.assertEqual(view(self.factory.get('/')).status_code, 200)
+        self.assertEqual(throttling.get_stats(['test']), {'test': {'allowed': 2, 'throttled': 1}})
+        # с другого адреса у того же пользователя ещё есть токены
+        self.assertEqual(view(self._request(user, REMOTE_ADDR='10.0.0.2')).status_code, 200)
+
+
+    @override_settings(THROTTLE_RATES={'register': {'ip': '1/m'}})
+    def test_rates_come_only_from_settings(self):
+        self.assertEqual(throttling.get_rates('register'), {'ip': (1, 60)})
+        self.assertEqual(throttling.get_rates('password_reset'), {})
+
+    @override_settings(THROTTLE_RATES={'test': {'ip': '2/m'}})
+    def test_stats_command_requires_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('throttle_stats', stdout=StringIO())
+        throttling._count('test', 'throttled')
+        out = StringIO()
+        with mock.patch('accounts.management.commands.throttle_stats.stats_shared', return_value=True):
+            call_command('throttle_stats', stdout=out)
+        self.assertIn('отбито        1', out.getvalue())
+
+
+class OtpTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.registration_id, self.code = otp.start_registration('player@example.com', 'player', 'password123')
+
+    def _later(self, seconds):
+        # locmem-кэш сверяет срок жизни ключей с time.time()
+        now = time.time()
+        return mock.patch('time.time', return_value=now + seconds)
+
+    def _wrong(self, code):
+        return '000000' if code != '000000' else '111111'
+
+    def test_verify(self):
+        self.assertEqual(otp.verify_code(self.registration_id, self._wrong(self.code)), otp.INVALID)
+        self.assertEqual(otp.attempts_left(self.registration_id), otp.MAX_ATTEMPTS - 1)
+        self.assertEqual(otp.verify_code(self.registration_id, self.code), otp.VERIFIED)
+        data = otp.get_registration(self.registration_id)
+        self.assertEqual(data['username'], 'player')
+        self.assertNotIn(self.code, data['code'])
+        self.assertNotEqual(data['password'], 'password123')
+
+    def test_expired(self):
+        with self._later(otp.TTL + 1):
+            self.assertIsNone(otp.get_registration(self.registration_id))
+            self.assertEqual(otp.verify_code(self.registration_id, self.code), otp.EXPIRED)
+            self.assertIsNone(otp.resend_code(self.registration_id))
+
+    def test_locked_after_max_attempts(self):
+        for _ in range(otp.MAX_ATTEMPTS - 1):
+            self.assertEqual(otp.verify_code(self.registration_id, self._wrong(self.code)), otp.INVALID)
+        self.assertEqual(otp.verify_code(self.registration_id, self._wrong(self.code)), otp.LOCKED)
+        # запись удалена: верный код после блокировки уже не подходит
+        self.assertIsNone(otp.get_registration(self.registration_id))
+        self.assertEqual(otp.verify_code(self.registration_id, self.code), otp.EXPIRED)
+
+    def _sent_code(self):
+        return re.search(r'регистрации: (\d+)', mail.outbox[-1].body).group(1)
+
+    def test_resend_extends_registration_cookie(self):
+        self.client.post(reverse('register'), {
+            'email': 'tank@example.com', 'username': 'tank', 'password1': 'password123', 'password2': 'password123',
+        })
+        with self._later(otp.TTL - 30):
+            response = self.client.post(reverse('register_code'), {'resend_code': '1'})
+            self.assertEqual(response.cookies[otp.COOKIE_NAME]['max-age'], otp.TTL)
+        code = self._sent_code()
+
+        # первый срок давно прошёл, а продлённые запись и cookie ещё живы
+        with self._later(otp.TTL + 60):
+            response = self.client.post(reverse('register_code'), {'token': code})
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        self.assertTrue(User.objects.filter(username='tank').exists())
+
+    def test_resend_limited_and_resets_attempts(self):
+        self.assertIsNone(otp.resend_code(self.registration_id))
+        otp.verify_code(self.registration_id, self._wrong(self.code))
+
+        with self._later(otp.RESEND_INTERVAL + 1):
+            code = otp.resend_code(self.registration_id)
+            self.assertIsNotNone(code)
+            self.assertIsNone(otp.resend_code(self.registration_id))
+            self.assertEqual(otp.attempts_left(self.registration_id), otp.MAX_ATTEMPTS)
+            if code != self.code:
+                self.assertEqual(otp.verify_code(self.registration_id, self.code), otp.INVALID)
+            self.assertEqual(otp.verify_code(self.registration_id, code), otp.VERIFIED)
+
+
+@override_settings(ACTIVITY_FLUSH_INTERVAL=10 ** 9, ACTIVITY_FLUSH_SIZE=10 ** 9)
+class ActivityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'player{i}', f'player{i}@example.com', 'pass') for i in range(3)]
+
+    def setUp(self):
+        activity._pending.clear()
+        self.addCleanup(activity._pending.clear)
+        self.long_ago = timezone.now() - timedelta(days=30)
+        Profile.objects.update(last_activity=self.long_ago)
+
+    def _last_activity(self, user):
+        return Profile.objects.get(user=user).last_activity
+
+    def test_flush_writes_batch_in_one_update(self):
+        moments = [timezone.now() - timedelta(minutes=i) for i in range(3)]
+        with self.assertNumQueries(0):
+            for user, moment in zip(self.users, moments):
+                activity.touch(user.pk, moment)
+        with self.assertNumQueries(1):
+            self.assertEqual(activity.flush(), 3)
+        for user, moment in zip(self.users, moments):
+            self.assertEqual(self._last_activity(user), moment)
+        with self.assertNumQueries(0):
+            self.assertEqual(activity.flush(), 0)
+
+    def test_flush_by_size(self):
+        with override_settings(ACTIVITY_FLUSH_SIZE=2):
+            activity.touch(self.users[0].pk)
+            self.assertEqual(self._last_activity(self.users[0]), self.long_ago)
+            activity.touch(self.users[1].pk)
+        self.assertNotEqual(self._last_activity(self.users[0]), self.long_ago)
+        self.assertNotEqual(self._last_activity(self.users[1]), self.long_ago)
+        self.assertEqual(activity._pending, {})
+
+    def test_middleware(self):
+        self.client.get(reverse('ad_list'))
+        with self.assertNumQueries(0):
+            self.assertEqual(activity.flush(), 0)
+
+        self.client.force_login(self.users[0])
+        self.client.get(reverse('ad_list'))
+        self.client.get(reverse('ad_list'))
+        self.assertEqual(self._last_activity(self.users[0]), self.long_ago)
+        with self.assertNumQueries(1):
+            self.assertEqual(activity.flush(), 1)
+        self.assertGreater(self._last_activity(self.users[0]), self.long_ago)
+
+    def test_profile_save_keeps_last_activity(self):
+        profile = Profile.objects.get(user=self.users[0])
+        profile.bio = 'Танк'
+        profile.save()
+        self.assertEqual(self._last_activity(self.users[0]), self.long_ago)
+
+
+@override_settings(ACTIVITY_FLUSH_INTERVAL=10 ** 9, ACTIVITY_FLUSH_SIZE=10 ** 9)
+class ProfileCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.player = User.objects.create_user('player', 'player@example.com', 'pass')
+        cls.category = Category.objects.create(name='Рейды')
+
+    def setUp(self):
+        self.addCleanup(activity._pending.clear)
+
+    def _counters(self, user):
+        return Profile.objects.values_list('total_ads', 'total_responses').get(user=user)
+
+    def _ad(self):
+        return Ad.objects.create(title='Рейд', content='Текст', author=self.author, category=self.category)
+
+    def test_counters_follow_create_and_delete(self):
+        ad = self._ad()
+        response = Response.objects.create(ad=ad, from_user=self.player, text='Готов')
+        self.assertEqual(self._counters(self.author), (1, 0))
+        self.assertEqual(self._counters(self.player), (0, 1))
+
+        response.delete()
+        self.assertEqual(self._counters(self.player), (0, 0))
+        Response.objects.create(ad=ad, from_user=self.player, text='Снова')
+        # отклики уходят каскадом вместе с объявлением
+        ad.delete()
+        self.assertEqual(self._counters(self.author), (0, 0))
+        self.assertEqual(self._counters(self.player), (0, 0))
+
+    def test_counter_never_goes_negative(self):
+        ad = self._ad()
+        Profile.objects.filter(user=self.author).update(total_ads=0)
+        ad.delete()
+        self.assertEqual(self._counters(self.author), (0, 0))
+
+    def test_reconcile_fixes_drift(self):
+        ad = self._ad()
+        Response.objects.create(ad=ad, from_user=self.player, text='Готов')
+        Profile.objects.update(total_ads=7, total_responses=3)
+        call_command('reconcile_profile_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self._counters(self.author), (1, 0))
+        self.assertEqual(self._counters(self.player), (0, 1))
+
+    def test_profile_view_reads_stored_counters(self):
+        self._ad()
+        # расхождение с реальностью видно на странице: значит, она ничего не пересчитывает
+        Profile.objects.filter(user=self.author).update(total_ads=42, total_responses=5)
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('profile'))
+        self.assertEqual((response.context['profile'].total_ads, response.context['profile'].total_responses), (42, 5))
+        statements = [query['sql'].lstrip().upper() for query in queries.captured_queries]
+        # бейдж откликов в шапке (base.html) считает своё, нас интересуют только счётчики профиля
+        self.assertFalse([sql for sql in statements if sql.startswith('SELECT COUNT(')
+                          and ('"AUTHOR_ID"' in sql or '"FROM_USER_ID"' in sql)])
+        self.assertFalse([sql for sql in statements if sql.startswith('UPDATE') and 'ACCOUNTS_PROFILE' in sql])
+
+
+class AvatarTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.user = User.objects.create_user('player', 'player@example.com', 'pass')
+
+    def _image(self, color='red', name='avatar.png'):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), color).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def _upload(self, color='red'):
+        profile = Profile.objects.get(user=self.user)
+        profile.avatar.save('avatar.png', self._image(color))
+        return profile
+
+    def test_sizes_are_square_and_named_by_content(self):
+        from PIL import Image
+        profile = self._upload()
+        sizes = avatars.generate_avatar_sizes(profile.avatar.name)
+        self.assertEqual(sorted(map(int, sizes)), sorted(avatars.AVATAR_SIZES))
+        for size, name in sizes.items():
+            self.assertRegex(name, rf'^avatars/[0-9a-f]{{16}}_{size}\.jpg$')
+            with default_storage.open(name, 'rb') as saved:
+                self.assertEqual(Image.open(saved).size, (int(size), int(size)))
+        # та же картинка под другим именем — те же файлы
+        default_storage.save('copy.png', self._image())
+        self.assertEqual(avatars.generate_avatar_sizes('copy.png'), sizes)
+
+    def test_avatar_url_fallbacks(self):
+        self.assertEqual(avatar_url(self.user.pk), '')
+        profile = self._upload()
+        self.assertEqual(avatar_url(self.user.pk, 40), default_storage.url(profile.avatar.name))
+
+        sizes = avatars.generate_avatar_sizes(profile.avatar.name)
+        Profile.objects.filter(pk=profile.pk).update(avatar_sizes=sizes)
+        avatars.invalidate_avatar_url(self.user.pk)
+        self.assertEqual(avatar_url(self.user.pk, 50), default_storage.url(sizes['96']))
+        self.assertEqual(avatar_url(self.user.pk, 1000), default_storage.url(sizes['256']))
+
+    def test_profile_save_invalidates_cached_url(self):
+        self.assertEqual(avatar_url(self.user.pk), '')
+        with self.assertNumQueries(0):
+            avatar_url(self.user.pk)
+        profile = self._upload()
+        self.assertEqual(avatar_url(self.user.pk), default_storage.url(profile.avatar.name))
+
+    def test_backfill_fills_missing_sizes(self):
+        profile = self._upload()
+        with mock.patch('accounts.management.commands.backfill_avatars.get_executor',
+                        return_value=ThreadPoolExecutor(max_workers=1)):
+            call_command('backfill_avatars', stdout=StringIO())
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_sizes, avatars.generate_avatar_sizes(profile.avatar.name))
+
+    @mock.patch.object(avatars, 'SYNC', True)
+    def test_replaced_avatar_files_deleted_on_commit(self):
+        self.client.force_login(self.user)
+
+        def upload(color):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('profile_edit'), {
+                    'email': self.user.email, 'avatar': self._image(color),
+                    'response_notifications': Profile.NOTIFY_INSTANT,
+                })
+            return Profile.objects.get(user=self.user).avatar_sizes
+
+        old = upload('red')
+        self.assertTrue(old)
+        # та же картинка у другого профиля: общие файлы не трогаем
+        other = User.objects.create_user('twin', 'twin@example.com', 'pass')
+        Profile.objects.filter(user=other).update(avatar_sizes=old)
+        new = upload('blue')
+        self.assertNotEqual(new, old)
+        for name in old.values():
+            self.assertTrue(default_storage.exists(name))
+
+        upload('green')
+        for name in new.values():
+            self.assertFalse(default_storage.exists(name))
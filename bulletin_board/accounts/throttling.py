@@ -0,0 +1,150 @@
+import logging
+import math
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+_RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+STATS_KEY = 'accounts:throttle:stats:{scope}:{outcome}'
+
+
+def parse_rate(rate):
+    """'5/10m' -> (5, 600): ёмкость ведра и период, за который оно наполняется целиком."""
+    match = _RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f'Некорректный лимит: {rate}')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * _UNITS[unit]
+
+
+def configured_rates():
+    # scope -> {'ip': 'N/период', 'user': 'N/период'}; читаем при каждом запросе, как и num_proxies
+    return getattr(settings, 'THROTTLE_RATES', {})
+
+
+def get_rates(scope):
+    return {kind: parse_rate(rate) for kind, rate in configured_rates().get(scope, {}).items() if rate}
+
+
+def num_proxies():
+    # сколько доверенных прокси стоит перед приложением (для X-Forwarded-For);
+    # читаем при каждом запросе, чтобы действовали override_settings и настройки окружения
+    return getattr(settings, 'THROTTLE_NUM_PROXIES', 0)
+
+
+def client_ip(request):
+    proxies = num_proxies()
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _refill(state, capacity, period, now):
+    tokens, updated_at = state or (capacity, now)
+    return min(capacity, tokens + (now - updated_at) * capacity / period)
+
+
+def take_tokens(buckets, now=None):
+    """
+    Token bucket в кэше: ведро на capacity токенов, пополняется равномерно за period секунд.
+    buckets — [(key, (capacity, period))]. Токен списывается из всех вёдер, только если
+    он есть в каждом: запрос, отбитый по одному лимиту, не расходует остальные.
+    Возвращает 0, если токены взяты, иначе через сколько секунд запрос пройдёт.
+    get/set не атомарны, при гонке лимит может быть превышен на единицы запросов.
+    """
+    now = time.time() if now is None else now
+    states = cache.get_many([key for key, _ in buckets])
+    tokens = {key: _refill(states.get(key), capacity, period, now) for key, (capacity, period) in buckets}
+
+    retry_after = max((
+        # round: погрешность float не должна превращать 10 с в 11
+        math.ceil(round((1 - tokens[key]) * period / capacity, 6))
+        for key, (capacity, period) in buckets if tokens[key] < 1
+    ), default=0)
+    if retry_after:
+        return retry_after
+    for key, (capacity, period) in buckets:
+        cache.set(key, (tokens[key] - 1, now), period)
+    return 0
+
+
+def _count(scope, outcome):
+    key = STATS_KEY.format(scope=scope, outcome=outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def stats_shared():
+    """Счётчики общие для всех процессов, только если кэш общий: LocMemCache у каждого процесса свой."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_stats(scopes=None):
+    """Счётчики пропущенных и отбитых запросов: {scope: {'allowed': N, 'throttled': M}}."""
+    scopes = scopes or sorted(configured_rates())
+    keys = {
+        STATS_KEY.format(scope=scope, outcome=outcome): (scope, outcome)
+        for scope in scopes for outcome in ('allowed', 'throttled')
+    }
+    values = cache.get_many(keys)
+    stats = {scope: {'allowed': 0, 'throttled': 0} for scope in scopes}
+    for key, value in values.items():
+        scope, outcome = keys[key]
+        stats[scope][outcome] = value
+    return stats
+
+
+def check(request, scope):
+    """Списывает по токену из вёдер IP и пользователя, если есть в обоих. Возвращает Retry-After или 0."""
+    rates = get_rates(scope)
+    buckets = []
+    if 'ip' in rates:
+        buckets.append((f'accounts:throttle:{scope}:ip:{client_ip(request)}', rates['ip']))
+    user = getattr(request, 'user', None)
+    if 'user' in rates and user is not None and user.is_authenticated:
+        buckets.append((f'accounts:throttle:{scope}:user:{user.pk}', rates['user']))
+    return take_tokens(buckets) if buckets else 0
+
+
+def throttle(scope, when=None):
+    """
+    Ограничивает частоту вызовов вьюхи по лимитам THROTTLE_RATES[scope].
+    when(request) решает, расходует ли запрос токен; по умолчанию — только POST.
+    """
+    when = when or (lambda request: request.method == 'POST')
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if when(request):
+                retry_after = check(request, scope)
+                if retry_after:
+                    _count(scope, 'throttled')
+                    logger.warning(f"Лимит {scope}: отбит запрос с {client_ip(request)}, повтор через {retry_after} с")
+                    response = HttpResponse(
+                        f'Слишком много запросов. Повторите через {retry_after} с.',
+                        status=429, content_type='text/plain; charset=utf-8',
+                    )
+                    response['Retry-After'] = str(retry_after)
+                    return response
+                _count(scope, 'allowed')
+            return view(request, *args, **kwargs)
+        return wrapped
+
+    return decorator
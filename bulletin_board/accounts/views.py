@@ -8,27 +8,40 @@ from django.conf import settings
 from .forms import (UserForm, ProfileForm, CustomUserCreationForm, CustomAuthenticationForm,
                     PasswordResetRequestForm, SetNewPasswordForm)
 from django.core.mail import send_mail
+from .avatars import delete_avatar_sizes_on_commit, schedule_avatar
+from .throttling import throttle
+from .models import Profile
+from board.concurrency import gather_queries, request_user
+from asgiref.sync import sync_to_async
 import uuid
 
 
 @login_required
-def profile_view(request):
-    user = request.user
-    profile = user.profile
+async def profile_view(request):
+    user = await request_user(request)
+    # total_ads/total_responses поддерживаются сигналами, страница профиля ничего не пишет
     user_ads = Ad.objects.filter(author=user)
     user_responses = Response.objects.filter(from_user=user)
-    profile.total_ads = user_ads.count()
-    profile.total_responses = user_responses.count()
-    profile.save()
 
+    results = await gather_queries(
+        profile=lambda: Profile.objects.get(user=user),
+        user_ads=lambda: list(
+            user_ads.select_related('category').with_response_count().order_by('-created')[:5]
+        ),
+        user_responses=lambda: list(
+            user_responses.select_related('ad__author').order_by('-created_at')[:5]
+        ),
+        recent_ads=lambda: list(user_ads.order_by('-created')[:3]),
+        recent_responses=lambda: list(user_responses.select_related('ad').order_by('-created_at')[:3]),
+    )
     context = {
-        'profile': profile,
-        'user_ads': user_ads.order_by('-created')[:5],
-        'user_responses': user_responses.order_by('-created_at')[:5],
-        'recent_activity': get_recent_activity(user),
+        'profile': results['profile'],
+        'user_ads': results['user_ads'],
+        'user_responses': results['user_responses'],
+        'recent_activity': build_recent_activity(results['recent_ads'], results['recent_responses']),
     }
 
-    return render(request, 'account/profile.html', context)
+    return await sync_to_async(render)(request, 'account/profile.html', context)
 
 
 def public_profile_view(request, username):
@@ -53,7 +66,15 @@ def profile_edit(request):
 
         if user_form.is_valid() and profile_form.is_valid():
             user_form.save()
-            profile_form.save()
+            profile = profile_form.save(commit=False)
+            if 'avatar' in profile_form.changed_data:
+                # старые копии относятся к прежнему файлу: удаляем их после коммита,
+                # новые посчитает пул процессов
+                delete_avatar_sizes_on_commit(profile.avatar_sizes)
+                profile.avatar_sizes = {}
+            profile.save()
+            if 'avatar' in profile_form.changed_data:
+                schedule_avatar(profile)
             messages.success(request, 'Профиль успешно обновлен!')
             return redirect('profile')
     else:
@@ -73,9 +94,14 @@ def profile_settings(request):
 
 
 def get_recent_activity(user):
+    recent_ads = Ad.objects.filter(author=user).order_by('-created')[:3]
+    recent_responses = Response.objects.filter(from_user=user).select_related('ad').order_by('-created_at')[:3]
+    return build_recent_activity(recent_ads, recent_responses)
+
+
+def build_recent_activity(recent_ads, recent_responses):
     activity = []
 
-    recent_ads = Ad.objects.filter(author=user).order_by('-created')[:3]
     for ad in recent_ads:
         activity.append({
             'type': 'ad',
@@ -84,7 +110,6 @@ def get_recent_activity(user):
             'message': f'Создал объявление "{ad.title}"'
         })
 
-    recent_responses = Response.objects.filter(from_user=user).order_by('-created_at')[:3]
     for response in recent_responses:
         activity.append({
             'type': 'response',
@@ -126,9 +151,6 @@ def login_view(request):
             user = form.get_user()
             user.backend = 'django.contrib.auth.backends.ModelBackend'
             login(request, user)
-
-            profile = user.profile
-            profile.save()
             messages.success(request, f'Добро пожаловать, {user.username}!')
 
             next_url = request.GET.get('next', 'profile')
@@ -174,6 +196,7 @@ def send_welcome_email(user):
     )
 
 
+@throttle('password_reset')
 def password_reset_request(request):
     if request.method == 'POST':
         form = PasswordResetRequestForm(request.POST)
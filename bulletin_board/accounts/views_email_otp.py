@@ -3,9 +3,9 @@ from django.contrib.auth import login
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.core.mail import send_mail
-from django.utils import timezone
 from django.conf import settings
-import secrets
+from . import otp
+from .throttling import throttle
 from .views import send_welcome_email
 
 
@@ -40,6 +40,16 @@ def send_otp_email(email, token):
         print(f"DEBUG: Код для {email}: {token}")
 
 
+def _set_registration_cookie(request, response, registration_id):
+    # в cookie только подписанный идентификатор, сами данные лежат в кэше;
+    # срок cookie совпадает с TTL записи и продлевается вместе с ним при повторной отправке кода
+    response.set_signed_cookie(
+        otp.COOKIE_NAME, registration_id, salt=otp.COOKIE_SALT,
+        max_age=otp.TTL, httponly=True, samesite='Lax', secure=request.is_secure(),
+    )
+
+
+@throttle('register')
 def register_step1(request):
     if request.user.is_authenticated:
         return redirect('profile')
@@ -63,90 +73,91 @@ def register_step1(request):
         elif password1 != password2:
             messages.error(request, 'Пароли не совпадают')
         else:
-            token = ''.join(secrets.choice('0123456789') for _ in range(6))
-
-            request.session['register_data'] = {
-                'email': email,
-                'username': username,
-                'password': password1,
-                'otp': token,
-                'otp_time': timezone.now().isoformat(),
-            }
+            registration_id, token = otp.start_registration(email, username, password1)
 
             send_otp_email(email, token)
 
             messages.success(request, f'Код подтверждения отправлен на {email}')
-            return redirect('register_code')
+            response = redirect('register_code')
+            _set_registration_cookie(request, response, registration_id)
+            return response
 
     return render(request, 'account/auth/email_register_step1.html')
 
 
+@throttle('resend_code', when=lambda request: request.method == 'POST' and 'resend_code' in request.POST)
 def register_step2(request):
     if request.user.is_authenticated:
         return redirect('profile')
 
-    register_data = request.session.get('register_data')
+    registration_id = request.get_signed_cookie(otp.COOKIE_NAME, default=None, salt=otp.COOKIE_SALT,
+                                                max_age=otp.TTL)
+    register_data = otp.get_registration(registration_id)
 
     if not register_data:
-        messages.error(request, 'Сессия устарела. Начните регистрацию заново.')
-        return redirect('register')
-
-    email = register_data.get('email')
-    stored_token = register_data.get('otp')
-    token_time = register_data.get('otp_time')
+        # запись истекла по TTL кэша или её не было
+        messages.error(request, 'Код устарел или регистрация не начата. Начните регистрацию заново.')
+        response = redirect('register')
+        response.delete_cookie(otp.COOKIE_NAME)
+        return response
 
-    if token_time:
-        token_time = timezone.datetime.fromisoformat(token_time)
-        if timezone.now() - token_time > timezone.timedelta(minutes=10):
-            messages.error(request, 'Код устарел. Запросите новый.')
-            request.session.pop('register_data', None)
-            return redirect('register')
+    email = register_data['email']
 
     if request.method == 'POST':
         if 'resend_code' in request.POST:
-            new_token = ''.join(secrets.choice('0123456789') for _ in range(6))
-
-            register_data['otp'] = new_token
-            register_data['otp_time'] = timezone.now().isoformat()
-            request.session['register_data'] = register_data
-
-            send_otp_email(email, new_token)
-
-            messages.success(request, 'Новый код отправлен!')
-            return redirect('register_code')
+            new_token = otp.resend_code(registration_id)
+            response = redirect('register_code')
+            if new_token is None:
+                messages.error(request, f'Новый код можно запросить не чаще раза в {otp.RESEND_INTERVAL} секунд')
+            else:
+                send_otp_email(email, new_token)
+                messages.success(request, 'Новый код отправлен!')
+                # resend_code продлил запись в кэше, продлеваем и cookie
+                _set_registration_cookie(request, response, registration_id)
+            return response
 
         entered_token = request.POST.get('token', '').strip()
 
-        if len(entered_token) != 6 or not entered_token.isdigit():
+        if len(entered_token) != otp.CODE_LENGTH or not entered_token.isdigit():
             messages.error(request, 'Введите 6-значный цифровой код')
-        elif entered_token != stored_token:
-            messages.error(request, 'Неверный код')
+            return render(request, 'account/auth/email_register_step2.html', {'email': email})
+
+        result = otp.verify_code(registration_id, entered_token)
+        if result in (otp.LOCKED, otp.EXPIRED):
+            messages.error(request, 'Слишком много неверных попыток или код устарел. Начните регистрацию заново.')
+            response = redirect('register')
+            response.delete_cookie(otp.COOKIE_NAME)
+            return response
+        elif result == otp.INVALID:
+            messages.error(request, f'Неверный код. Осталось попыток: {otp.attempts_left(registration_id)}')
         else:
             username = register_data['username']
-            password = register_data['password']
 
             try:
                 if User.objects.filter(email=email).exists():
                     messages.error(request, 'Пользователь с таким email уже существует')
-                    request.session.pop('register_data', None)
+                    otp.finish_registration(registration_id)
                     return redirect('register')
 
                 if User.objects.filter(username=username).exists():
                     messages.error(request, 'Пользователь с таким именем уже существует')
                     return redirect('register_code')
 
-                user = User.objects.create_user(
+                # пароль хранится в кэше уже хэшированным
+                user = User.objects.create(
                     username=username,
-                    email=email,
-                    password=password,
-                    is_active=True
+                    email=User.objects.normalize_email(email),
+                    password=register_data['password'],
+                    is_active=True,
                 )
                 user.backend = 'django.contrib.auth.backends.ModelBackend'
                 login(request, user)
-                request.session.pop('register_data', None)
+                otp.finish_registration(registration_id)
                 messages.success(request, f'Регистрация завершена! Добро пожаловать, {username}!')
                 send_welcome_email(user)
-                return redirect('profile')
+                response = redirect('profile')
+                response.delete_cookie(otp.COOKIE_NAME)
+                return response
 
             except Exception as e:
                 print(f"DEBUG: Ошибка создания пользователя: {e}")
@@ -1,6 +1,19 @@
 from django.contrib import admin
-from .models import Category, Ad, Response
+from .models import Category, Ad, Response, OutboxEmail, NewsletterCampaign
 
 admin.site.register(Category)
 admin.site.register(Ad)
-admin.site.register(Response)
\ No newline at end of file
+admin.site.register(Response)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'sent_count', 'failed_count', 'last_user_id', 'created_at', 'finished_at')
+    list_filter = ('status',)
@@ -0,0 +1,349 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views.decorators.http import condition, require_safe
+
+from .categories import registry as category_registry
+from .models import Ad, Response, Tombstone
+from .pagination import CursorPaginator
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# сколько дней хранятся записи об удалениях: лента изменений с более старым since невозможна
+TOMBSTONE_DAYS = getattr(settings, 'API_TOMBSTONE_DAYS', 30)
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+# поле API -> (колонки для only(), функция получения значения)
+AD_FIELDS = {
+    'id': (('id',), lambda ad, request: ad.pk),
+    'title': (('title',), lambda ad, request: ad.title),
+    'content': (('content',), lambda ad, request: ad.content),
+    'category': (('category__name',), lambda ad, request: ad.category.name),
+    'author': (('author__username',), lambda ad, request: ad.author.username),
+    'created': (('created',), lambda ad, request: _iso(ad.created)),
+    'update': (('update',), lambda ad, request: _iso(ad.update)),
+    'is_active': (('is_active',), lambda ad, request: ad.is_active),
+    'image': (('image',), lambda ad, request: request.build_absolute_uri(ad.image.url) if ad.image else None),
+    'file': (('file',), lambda ad, request: request.build_absolute_uri(
+        reverse('ad_file_download', args=[ad.pk])) if ad.file else None),
+    'url': (('id',), lambda ad, request: request.build_absolute_uri(reverse('ad_detail', args=[ad.pk]))),
+    'response_count': ((), lambda ad, request: ad.response_count),
+}
+AD_DEFAULT_FIELDS = ('id', 'title', 'category', 'author', 'created', 'update', 'is_active', 'url')
+
+RESPONSE_FIELDS = {
+    'id': (('id',), lambda response, request: response.pk),
+    'text': (('text',), lambda response, request: response.text),
+    'ad': (('ad',), lambda response, request: response.ad_id),
+    'ad_title': (('ad__title',), lambda response, request: response.ad.title),
+    'from_user': (('from_user__username',), lambda response, request: response.from_user.username),
+    'is_accepted': (('is_accepted',), lambda response, request: response.is_accepted),
+    'created_at': (('created_at',), lambda response, request: _iso(response.created_at)),
+    'updated_at': (('updated_at',), lambda response, request: _iso(response.updated_at)),
+}
+RESPONSE_DEFAULT_FIELDS = ('id', 'ad', 'ad_title', 'from_user', 'text', 'is_accepted', 'created_at')
+
+
+def parse_fields(request, available, default):
+    """Разреженная выборка: ?fields=id,title. Лишние колонки из БД при этом не читаются."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(default)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def _limit(request):
+    try:
+        return max(1, min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+
+
+def _since(request):
+    raw = request.GET.get('since')
+    if not raw:
+        return None
+    value = parse_datetime(raw)
+    if value is None:
+        raise ApiError('since должен быть датой в формате ISO 8601')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    if value < timezone.now() - timedelta(days=TOMBSTONE_DAYS):
+        # об удалениях раньше этого срока записей уже нет: клиент пропустил бы их молча
+        raise ApiError(f'since старше {TOMBSTONE_DAYS} дней: загрузите список заново без since', status=410)
+    return value
+
+
+def _restrict(queryset, fields, available, extra=()):
+    columns = {'id' if name.lstrip('-') == 'pk' else name.lstrip('-') for name in extra}
+    for name in fields:
+        columns.update(available[name][0])
+    relations = {column.split('__')[0] for column in columns if '__' in column}
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*columns)
+
+
+def _page_payload(request, paginator, serialize):
+    page = paginator.get_page()
+    results = [serialize(obj) for obj in page]
+    payload = {
+        'results': results,
+        'next': request.build_absolute_uri(f'?{page.next_query}') if page.has_next() else None,
+        'previous': request.build_absolute_uri(f'?{page.previous_query}') if page.has_previous() else None,
+    }
+    return page, payload
+
+
+def _json_response(payload, etag, timestamp):
+    response = JsonResponse(payload, json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    if timestamp:
+        response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def _deleted_entries(tombstones, since, paginator, page):
+    """
+    Удаления для страницы ленты изменений: те, что случились в её отрезке времени —
+    от курсора after (или since) до последнего объекта страницы, а на последней странице
+    без верхней границы. При проходе вперёд каждое удаление приходит ровно один раз.
+    """
+    after = paginator.params.get('after')
+    after_values = paginator.decode_cursor(after) if after else None
+    tombstones = tombstones.filter(deleted_at__gt=after_values[0] if after_values else since)
+    if page.has_next() and page.object_list:
+        name = paginator.ordering[0][0]
+        tombstones = tombstones.filter(deleted_at__lte=getattr(page.object_list[-1], name))
+    return [{'id': object_id, 'deleted': True}
+            for object_id in tombstones.order_by('deleted_at', 'pk').values_list('object_id', flat=True)]
+
+
+def _validators(request, queryset, fields, aggregates, tombstones=None, extra=()):
+    """
+    ETag и Last-Modified выборки по одному агрегату: число строк ловит удаление,
+    максимум метки времени — добавление и любое изменение. Считается до чтения страницы,
+    поэтому на 304 сама выборка не выполняется. В ленте изменений учитываются и записи
+    об удалениях после since.
+    """
+    state = queryset.order_by().aggregate(**aggregates)
+    if tombstones is not None:
+        state.update(tombstones.aggregate(deleted_count=Count('pk'), deleted_modified=Max('deleted_at')))
+    etag = '"' + hashlib.md5(repr((
+        request.user.pk, request.GET.urlencode(), fields, sorted(state.items()), extra,
+    )).encode()).hexdigest() + '"'
+    last_modified = max((value for name, value in state.items() if name.endswith('modified') and value),
+                        default=None)
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def _response_validators(request, responses, fields, tombstones=None):
+    aggregates = {'count': Count('pk'), 'modified': Max('updated_at')}
+    if 'ad_title' in fields:
+        # заголовок объявления меняется без изменения отклика
+        aggregates['ad_modified'] = Max('ad__update')
+    return _validators(request, responses, fields, aggregates, tombstones)
+
+
+def _ad_validators(request, ads, fields, tombstones=None):
+    aggregates = {'count': Count('pk'), 'modified': Max('update')}
+    if 'response_count' in fields:
+        # JOIN с откликами размножает строки объявлений: их число считаем по уникальным id
+        aggregates.update(count=Count('pk', distinct=True), responses=Count('response'))
+    # название категории меняется без изменения объявления: его ловит версия справочника
+    extra = category_registry.version if 'category' in fields else None
+    return _validators(request, ads, fields, aggregates, tombstones, extra)
+
+
+def _error_response(error):
+    return JsonResponse({'error': str(error)}, status=error.status, json_dumps_params={'ensure_ascii': False})
+
+
+@require_safe
+def ad_list_api(request):
+    """
+    GET /api/ads/?category=&author=&active=&since=&fields=&limit=
+    С since= отдаёт ленту изменений по возрастанию update, включая снятые с публикации
+    объявления (только id, is_active и update) и удалённые ({"id": ..., "deleted": true}),
+    чтобы клиент мог синхронизироваться.
+    """
+    try:
+        fields = parse_fields(request, AD_FIELDS, AD_DEFAULT_FIELDS)
+        limit = _limit(request)
+        since = _since(request)
+
+        ads = Ad.objects.all()
+        # записи об удалениях для ленты изменений фильтруются так же, как сама выборка
+        tombstones = Tombstone.objects.filter(kind=Tombstone.KIND_AD)
+        category = request.GET.get('category')
+        if category:
+            # имя -> id по справочнику категорий: фильтр по индексу category_id без JOIN
+            category_id = category if category.isdigit() else category_registry.id_for_name(category)
+            if category_id is None:
+                ads, tombstones = ads.none(), tombstones.none()
+            else:
+                ads, tombstones = ads.filter(category_id=category_id), tombstones.filter(category_id=category_id)
+        author = request.GET.get('author')
+        if author:
+            if author.isdigit():
+                ads, tombstones = ads.filter(author_id=author), tombstones.filter(author_id=author)
+            else:
+                ads = ads.filter(author__username=author)
+                tombstones = tombstones.filter(author_id__in=User.objects.filter(username=author).values('pk'))
+
+        # неактивные объявления видит только их автор; в ленте изменений они идут без содержимого
+        active = request.GET.get('active', 'true').lower() not in ('false', '0')
+        own = request.user.is_authenticated and author in (str(request.user.pk), request.user.username)
+        if since is not None:
+            ads = ads.filter(update__gt=since)
+            ordering = ('update', 'pk')
+            tombstones = tombstones.filter(deleted_at__gt=since)
+        else:
+            tombstones = None
+            if active or not own:
+                ads = ads.filter(is_active=True)
+            else:
+                ads = ads.filter(is_active=False)
+            ordering = ('-created', '-pk')
+
+        etag, timestamp = _ad_validators(request, ads, fields, tombstones)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            if 'response_count' in fields:
+                ads = ads.with_response_count()
+            # id и is_active нужны для записей о снятых с публикации объявлениях в ленте
+            restricted = set(fields) | {'id', 'is_active'}
+            ads = _restrict(ads, restricted, AD_FIELDS, extra=ordering)
+
+            def serialize(ad):
+                if since is not None and not ad.is_active and not own:
+                    return {'id': ad.pk, 'is_active': False, 'update': _iso(ad.update)}
+                return {name: AD_FIELDS[name][1](ad, request) for name in fields}
+
+            paginator = CursorPaginator(ads, limit, ordering, request.GET)
+            page, payload = _page_payload(request, paginator, serialize)
+            if tombstones is not None:
+                payload['results'] += _deleted_entries(tombstones, since, paginator, page)
+            response = _json_response(payload, etag, timestamp)
+    except ApiError as e:
+        return _error_response(e)
+    patch_vary_headers(response, ['Cookie'])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _ad_last_modified(request, pk):
+    return Ad.objects.filter(pk=pk).values_list('update', flat=True).first()
+
+
+def _ad_etag(request, pk):
+    row = Ad.objects.filter(pk=pk).values_list('update', 'is_active', 'author_id').first()
+    if row is None:
+        return None
+    return hashlib.md5(repr((row, request.GET.get('fields'))).encode()).hexdigest()
+
+
+@require_safe
+@condition(etag_func=_ad_etag, last_modified_func=_ad_last_modified)
+def ad_detail_api(request, pk):
+    try:
+        fields = parse_fields(request, AD_FIELDS, AD_DEFAULT_FIELDS + ('content', 'image', 'file'))
+    except ApiError as e:
+        return _error_response(e)
+    ads = Ad.objects.all()
+    if 'response_count' in fields:
+        ads = ads.with_response_count()
+    ad = get_object_or_404(_restrict(ads, set(fields) | {'is_active'}, AD_FIELDS, extra=('author',)), pk=pk)
+    if not ad.is_active and ad.author_id != request.user.pk:
+        return JsonResponse({'error': 'Объявление не найдено'}, status=404, json_dumps_params={'ensure_ascii': False})
+    response = JsonResponse({name: AD_FIELDS[name][1](ad, request) for name in fields},
+                            json_dumps_params={'ensure_ascii': False})
+    patch_vary_headers(response, ['Cookie'])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_safe
+def response_list_api(request):
+    """
+    GET /api/responses/?role=received|sent&ad=&accepted=&since=&fields=&limit=
+    Отклики текущего пользователя: на его объявления (по умолчанию) или оставленные им.
+    С since= отдаёт ленту изменений по возрастанию updated_at: новые и изменённые
+    (например, принятые) отклики, а также удалённые ({"id": ..., "deleted": true}).
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401, json_dumps_params={'ensure_ascii': False})
+    try:
+        fields = parse_fields(request, RESPONSE_FIELDS, RESPONSE_DEFAULT_FIELDS)
+        limit = _limit(request)
+        since = _since(request)
+
+        if request.GET.get('role') == 'sent':
+            responses = Response.objects.filter(from_user=request.user)
+        else:
+            responses = Response.objects.filter(ad_author=request.user)
+        ad = request.GET.get('ad')
+        if ad:
+            if not ad.isdigit():
+                raise ApiError('ad должен быть числом')
+            responses = responses.filter(ad_id=ad)
+        accepted = request.GET.get('accepted')
+        if accepted:
+            responses = responses.filter(is_accepted=accepted.lower() in ('true', '1'))
+
+        tombstones = None
+        if since is not None:
+            responses = responses.filter(updated_at__gt=since)
+            ordering = ('updated_at', 'pk')
+            tombstones = Tombstone.objects.filter(kind=Tombstone.KIND_RESPONSE, deleted_at__gt=since)
+            if request.GET.get('role') == 'sent':
+                tombstones = tombstones.filter(from_user_id=request.user.pk)
+            else:
+                tombstones = tombstones.filter(author_id=request.user.pk)
+            if ad:
+                tombstones = tombstones.filter(ad_id=ad)
+        else:
+            ordering = ('-created_at', '-pk')
+
+        etag, timestamp = _response_validators(request, responses, fields, tombstones)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            paginator = CursorPaginator(_restrict(responses, fields, RESPONSE_FIELDS, extra=ordering),
+                                        limit, ordering, request.GET)
+            page, payload = _page_payload(
+                request, paginator,
+                lambda obj: {name: RESPONSE_FIELDS[name][1](obj, request) for name in fields},
+            )
+            if tombstones is not None:
+                payload['results'] += _deleted_entries(tombstones, since, paginator, page)
+            response = _json_response(payload, etag, timestamp)
+    except ApiError as e:
+        return _error_response(e)
+    patch_vary_headers(response, ['Cookie'])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
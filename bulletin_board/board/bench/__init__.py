@@ -0,0 +1 @@
+"""Генерация данных и прогон маршрутов для замеров производительности (seed_bench, run_bench)."""
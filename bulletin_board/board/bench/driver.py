@@ -0,0 +1,238 @@
+import json
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+import accounts.urls
+import board.urls
+from .. import concurrency, pagecache
+from ..models import Ad, Response
+from .seed import USERNAME_PREFIX
+
+
+URLCONFS = (('board', board.urls), ('accounts', accounts.urls))
+# маршруты с <int:pk>, где pk — это отклик, а не объявление
+RESPONSE_ROUTES = {'response_detail', 'accept_response', 'delete_response'}
+# GET меняет данные: по умолчанию не гоняем
+UNSAFE_ROUTES = {'accept_response'}
+
+
+def percentile(timings, share):
+    timings = sorted(timings)
+    return timings[min(int(len(timings) * share), len(timings) - 1)]
+
+
+def discover_routes(include_unsafe=False):
+    """[(app, имя маршрута, имена параметров)] из board/urls.py и accounts/urls.py."""
+    routes = []
+    for app, module in URLCONFS:
+        for pattern in module.urlpatterns:
+            if pattern.name in UNSAFE_ROUTES and not include_unsafe:
+                continue
+            routes.append((app, pattern.name, list(pattern.pattern.converters)))
+    return routes
+
+
+def fixtures(username=None):
+    """Пользователь, от имени которого идут запросы, и объекты для параметров маршрутов."""
+    users = User.objects.all()
+    if username:
+        user = users.get(username=username)
+    else:
+        # автор последнего объявления: у него точно есть объявления и, скорее всего, отклики
+        author_id = Ad.objects.filter(author__username__startswith=USERNAME_PREFIX).order_by('-pk') \
+            .values_list('author_id', flat=True).first()
+        user = users.get(pk=author_id) if author_id else users.order_by('pk').first()
+    if user is None:
+        raise ValueError('В базе нет пользователей: сначала запустите seed_bench')
+
+    own_ad = Ad.objects.filter(author=user).order_by('-pk').values_list('pk', flat=True).first()
+    other_ad = Ad.objects.filter(is_active=True).exclude(author=user).order_by('-pk') \
+        .values_list('pk', flat=True).first()
+    response = Response.objects.filter(ad_author=user).order_by('-pk').values_list('pk', flat=True).first()
+    return {
+        'user': user,
+        'ad': own_ad or other_ad or 0,
+        'other_ad': other_ad or own_ad or 0,
+        'response': response or 0,
+    }
+
+
+def route_path(name, params, data):
+    kwargs = {}
+    for param in params:
+        if param == 'username':
+            kwargs[param] = data['user'].username
+        elif param == 'ad_pk':
+            kwargs[param] = data['other_ad']
+        elif name in RESPONSE_ROUTES:
+            kwargs[param] = data['response']
+        else:
+            kwargs[param] = data['ad']
+    return reverse(name, kwargs=kwargs)
+
+
+@contextmanager
+def record_queries():
+    """Перехватывает (sql, params) всех запросов текущего соединения."""
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    # параллельные запросы async-вьюх идут в других соединениях, на время замера отключаем их
+    parallel, concurrency.PARALLEL = concurrency.PARALLEL, False
+    try:
+        with connection.execute_wrapper(wrapper):
+            yield queries
+    finally:
+        concurrency.PARALLEL = parallel
+
+
+def rows_read(queries):
+    """
+    Сколько строк вернули SELECT'ы запроса: каждый повторяется как COUNT(*) от подзапроса.
+    Нижняя оценка прочитанного — строки, отброшенные фильтром при сканировании, сюда не входят.
+    """
+    total = 0
+    with connection.cursor() as cursor:
+        for sql, params in queries:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            cursor.execute(f'SELECT COUNT(*) FROM ({sql})', params)
+            total += cursor.fetchone()[0]
+    return total
+
+
+def _client(user):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def measure_route(path, requests, user=None, base_url=None):
+    """
+    Гоняет path requests раз и возвращает задержки и статистику запросов к БД.
+    Через тестовый клиент кэш страниц сбрасывается перед каждым запросом: замеряется рендеринг.
+    С base_url запросы идут по HTTP в запущенный сервер, тогда запросы к БД не видны.
+    """
+    timings = []
+    status = None
+    if base_url:
+        url = base_url.rstrip('/') + path
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = rows = None
+    else:
+        client = _client(user)
+        client.get(path)  # прогрев: кэши процесса, реестр категорий
+        for _ in range(requests):
+            # анонимам страницы отдаёт кэш страниц: сбрасываем его до замера,
+            # иначе измеряли бы попадания в кэш, а не саму вьюху
+            pagecache.bump(pagecache.ALL_SCOPE)
+            started = time.perf_counter()
+            status = client.get(path).status_code
+            timings.append((time.perf_counter() - started) * 1000)
+        # отдельный проход для подсчёта запросов, чтобы обёртка не влияла на задержки
+        pagecache.bump(pagecache.ALL_SCOPE)
+        with record_queries() as recorded:
+            client.get(path)
+        queries, rows = len(recorded), rows_read(recorded)
+
+    return {
+        'path': path,
+        'status': status,
+        'requests': len(timings),
+        'p50': round(percentile(timings, 0.5), 3),
+        'p95': round(percentile(timings, 0.95), 3),
+        'p99': round(percentile(timings, 0.99), 3),
+        'queries': queries,
+        'rows_read': rows,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(requests, username=None, anonymous=False, base_url=None, include_unsafe=False, only=None, log=print):
+    data = fixtures(username)
+    user = None if anonymous else data['user']
+    results = {}
+    for app, name, params in discover_routes(include_unsafe):
+        if only and name not in only:
+            continue
+        try:
+            path = route_path(name, params, data)
+            results[name] = {'app': app, **measure_route(path, requests, user, base_url)}
+        except Exception as e:
+            # например, у вьюхи нет шаблона: отмечаем маршрут в отчёте и продолжаем прогон
+            results[name] = {'app': app, 'error': f'{type(e).__name__}: {e}'}
+        log(format_result(name, results[name]))
+    return {
+        'commit': git_commit(),
+        'started_at': timezone.now().isoformat(),
+        'requests': requests,
+        'user': None if anonymous else data['user'].username,
+        'mode': 'http' if base_url else 'client',
+        'routes': results,
+    }
+
+
+def format_result(name, result):
+    if 'error' in result:
+        return f"{name:20} ошибка: {result['error']}"
+    queries = '-' if result['queries'] is None else result['queries']
+    rows = '-' if result['rows_read'] is None else result['rows_read']
+    return (
+        f"{name:20} {result['status']}  p50 {result['p50']:8.2f}  p95 {result['p95']:8.2f}  "
+        f"p99 {result['p99']:8.2f} мс  запросов {queries:>4}  строк {rows:>7}"
+    )
+
+
+def save(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def compare(report, baseline_path):
+    """Строки «маршрут: было → стало» по p50, p99 и числу запросов."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    lines = [f"Сравнение с {baseline.get('commit') or baseline_path}:"]
+    for name, result in report['routes'].items():
+        old = baseline['routes'].get(name)
+        if old is None:
+            lines.append(f'{name:20} нет в базовом прогоне')
+            continue
+        if 'error' in result or 'error' in old:
+            lines.append(f"{name:20} ошибка: {result.get('error') or old['error']}")
+            continue
+        change = (result['p50'] - old['p50']) / old['p50'] * 100 if old['p50'] else 0
+        lines.append(
+            f"{name:20} p50 {old['p50']:8.2f} → {result['p50']:8.2f} ({change:+.0f}%)  "
+            f"p99 {old['p99']:8.2f} → {result['p99']:8.2f}  "
+            f"запросов {old['queries']} → {result['queries']}"
+        )
+    return lines
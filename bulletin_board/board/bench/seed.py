@@ -0,0 +1,131 @@
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from accounts.models import Profile
+from ..models import Ad, Category, Response
+
+
+USERNAME_PREFIX = 'bench_'
+PASSWORD = 'bench'
+
+WORDS = (
+    'ищу', 'продам', 'гильдия', 'рейд', 'танк', 'хил', 'данж', 'зелье', 'кузнец', 'кожевник',
+    'квест', 'сет', 'оружие', 'броня', 'пати', 'вечером', 'опытный', 'новичок', 'помогу', 'срочно',
+)
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def clear():
+    """Удаляет всё, что создал seed: объявления и отклики уходят каскадом вместе с пользователями."""
+    deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    return deleted
+
+
+def seed_users(count, batch_size, rng, log):
+    # хэш пароля считаем один раз: PBKDF2 на каждого из 100k пользователей занял бы часы
+    password = make_password(PASSWORD)
+    start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    created = 0
+    for batch in _batches(range(start, start + count), batch_size):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{USERNAME_PREFIX}{n}', email=f'{USERNAME_PREFIX}{n}@example.com', password=password)
+                for n in batch
+            ])
+            # bulk_create не шлёт post_save, профиль создаём сами
+            Profile.objects.bulk_create([
+                Profile(user=user, bio=_text(rng, 3, 12), response_notifications=Profile.NOTIFY_OFF)
+                for user in users
+            ])
+        created += len(batch)
+        log(f'Пользователей: {created}/{count}')
+    return list(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('pk', flat=True))
+
+
+def seed_ads(count, user_ids, category_ids, batch_size, rng, log):
+    created = 0
+    for batch in _batches(range(count), batch_size):
+        with transaction.atomic():
+            Ad.objects.bulk_create([
+                Ad(
+                    title=_text(rng, 2, 6)[:200],
+                    content=_text(rng, 10, 80),
+                    author_id=rng.choice(user_ids),
+                    category_id=rng.choice(category_ids),
+                    # примерно каждое десятое объявление снято с публикации
+                    is_active=rng.random() > 0.1,
+                )
+                for _ in batch
+            ])
+        created += len(batch)
+        log(f'Объявлений: {created}/{count}')
+    return list(Ad.objects.filter(author__username__startswith=USERNAME_PREFIX).values_list('pk', 'author_id'))
+
+
+def seed_responses(count, user_ids, ads, batch_size, rng, log):
+    """
+    Возвращает, сколько откликов реально вставлено. Пара (from_user, ad) уникальна:
+    повторы внутри пачки отбрасываем сразу, а совпадения с прошлыми пачками
+    пропускает ignore_conflicts — множество всех пар на 5M откликов не держим в памяти.
+    """
+    # популярность объявлений по Парето: на немногие приходится большинство откликов
+    cum_weights = list(itertools.accumulate(rng.paretovariate(1.2) for _ in ads))
+    before = Response.objects.count()
+    attempted = 0
+    for batch in _batches(range(count), batch_size):
+        picked = rng.choices(ads, cum_weights=cum_weights, k=len(batch))
+        pairs = set()
+        responses = []
+        for ad_id, author_id in picked:
+            from_user_id = rng.choice(user_ids)
+            if from_user_id == author_id or (from_user_id, ad_id) in pairs:
+                continue
+            pairs.add((from_user_id, ad_id))
+            # bulk_create минует Response.save(), поэтому ad_author заполняем явно
+            responses.append(Response(
+                ad_id=ad_id,
+                ad_author_id=author_id,
+                from_user_id=from_user_id,
+                text=_text(rng, 3, 30),
+                is_accepted=rng.random() < 0.1,
+            ))
+        with transaction.atomic():
+            Response.objects.bulk_create(responses, ignore_conflicts=True)
+        attempted += len(batch)
+        log(f'Откликов: {attempted}/{count}')
+    return Response.objects.count() - before
+
+
+def seed(users, ads, responses, batch_size=5000, random_seed=None, log=print):
+    """
+    Заполняет базу синтетическими пользователями, объявлениями и откликами
+    по существующим категориям. Сигналы при bulk_create не срабатывают:
+    письма не уходят, а поисковый индекс и счётчики пересчитывает вызывающий.
+    Возвращает, сколько объектов оказалось в базе (отклики-дубликаты пропускаются).
+    """
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+    if not category_ids:
+        raise ValueError('Нет ни одной категории: создайте категории перед генерацией данных')
+
+    rng = random.Random(random_seed)
+    user_ids = seed_users(users, batch_size, rng, log)
+    if not user_ids:
+        raise ValueError('Нет пользователей для объявлений')
+    ad_rows = seed_ads(ads, user_ids, category_ids, batch_size, rng, log) if ads else []
+    created = 0
+    if responses and ad_rows:
+        created = seed_responses(responses, user_ids, ad_rows, batch_size, rng, log)
+    return {'users': len(user_ids), 'ads': len(ad_rows), 'responses': created}
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+
+
+VERSION_KEY = 'board:categories:version'
+# как часто процесс сверяет свою копию с общей версией в кэше
+CHECK_INTERVAL = getattr(settings, 'CATEGORY_REGISTRY_CHECK_INTERVAL', 5)
+
+
+class CategoryRegistry:
+    """
+    Справочник категорий, загруженный один раз на процесс. Категории меняются редко,
+    поэтому страницы берут их отсюда, а не из БД. Сохранение или удаление категории
+    поднимает общую версию в кэше, и остальные процессы перечитывают справочник.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns(), None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _load(self):
+        now = time.monotonic()
+        categories = self._categories
+        if categories is not None and now - self._checked_at < CHECK_INTERVAL:
+            return categories
+        with self._lock:
+            version = self._shared_version()
+            if self._categories is None or version != self._version:
+                categories = list(Category.objects.order_by('name'))
+                self._by_id = {category.pk: category for category in categories}
+                self._by_name = {category.name: category for category in categories}
+                self._categories = categories
+                self._version = version
+            self._checked_at = now
+            return self._categories
+
+    @property
+    def version(self):
+        """Общая версия справочника: меняется при любой правке категорий."""
+        return self._shared_version()
+
+    def all(self):
+        return list(self._load())
+
+    def get(self, pk):
+        self._load()
+        return self._by_id.get(pk)
+
+    def id_for_name(self, name):
+        self._load()
+        category = self._by_name.get(name)
+        return category.pk if category else None
+
+    def hints(self):
+        return {category.name: category.description for category in self._load() if category.description}
+
+    def choices(self):
+        return [(category.pk, category.name) for category in self._load()]
+
+    def invalidate(self):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), None)
+        with self._lock:
+            self._categories = None
+
+
+registry = CategoryRegistry()
@@ -0,0 +1,59 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from . import instrumentation
+
+
+PARALLEL = getattr(settings, 'ASYNC_PARALLEL_QUERIES', True)
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+def _isolated(func):
+    # отдельный поток — отдельное соединение; закрываем его по правилам CONN_MAX_AGE
+    def run():
+        close_old_connections()
+        try:
+            # запросы этого потока тоже попадают в счётчики QueryInstrumentationMiddleware
+            with instrumentation.capture():
+                return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_queries(**calls):
+    """
+    Выполняет независимые запросы одновременно и возвращает {имя: результат}.
+    Каждый вызываемый объект должен сам вычислить queryset (list(), count() и т.п.).
+
+    Async ORM Django выполняет все запросы в одном потоке по очереди, поэтому
+    asyncio.gather над ним время не экономит. Здесь каждый запрос идёт в своём
+    потоке со своим соединением, и страница ждёт только самый медленный из них.
+    Внутри транзакции (ATOMIC_REQUESTS, тесты) другие соединения не видят её данных,
+    тогда запросы выполняются последовательно в основном соединении.
+    """
+    parallel = PARALLEL and not await sync_to_async(_in_transaction)()
+    if parallel:
+        results = await asyncio.gather(*(
+            sync_to_async(_isolated(func), thread_sensitive=False)() for func in calls.values()
+        ))
+    else:
+        results = [await sync_to_async(func)() for func in calls.values()]
+    return dict(zip(calls, results))
+
+
+async def request_user(request):
+    """
+    Пользователь запроса для async-вьюх. Загружается через request.auser() и подставляется
+    в request.user: иначе шаблон (контекст-процессор auth) и ActivityMiddleware загрузили бы
+    его второй раз синхронно. В gather_queries пользователя передают явно, а не через request.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
@@ -0,0 +1,108 @@
+import logging
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+
+from accounts.models import Profile
+from .emails import build_email, new_response_email
+from .models import PendingNotification
+from .outbox import enqueue_email, enqueue_emails
+
+
+logger = logging.getLogger(__name__)
+
+# получателей за один проход: один SELECT событий, один INSERT писем, один DELETE
+BATCH_SIZE = getattr(settings, 'DIGEST_BATCH_SIZE', 500)
+# сколько откликов на одно объявление показывать в сводке, остальные — числом
+MAX_RESPONSES_PER_AD = getattr(settings, 'DIGEST_MAX_RESPONSES_PER_AD', 5)
+
+PERIODS = {
+    Profile.NOTIFY_HOURLY: 'за последний час',
+    Profile.NOTIFY_DAILY: 'за последние сутки',
+}
+
+
+def response_notifications(user_id):
+    mode = Profile.objects.filter(user_id=user_id).values_list('response_notifications', flat=True).first()
+    return mode or Profile.NOTIFY_INSTANT
+
+
+def notify_new_response(response):
+    """Письмо автору объявления сразу, событие для сводки или ничего — по настройке автора."""
+    mode = response_notifications(response.ad_author_id)
+    if mode == Profile.NOTIFY_OFF:
+        return None
+    if mode == Profile.NOTIFY_INSTANT:
+        return enqueue_email(**new_response_email(response))
+    return PendingNotification.objects.create(recipient_id=response.ad_author_id, response=response)
+
+
+def _modes_for(mode):
+    # часовой проход заодно досылает события тех, кто переключился на «сразу»
+    return [mode, Profile.NOTIFY_INSTANT] if mode == Profile.NOTIFY_HOURLY else [mode]
+
+
+def _group_by_ad(events):
+    groups = []
+    for _, ad_events in groupby(events, key=lambda event: event.response.ad_id):
+        responses = [event.response for event in ad_events]
+        groups.append({
+            'ad': responses[0].ad,
+            'responses': responses[:MAX_RESPONSES_PER_AD],
+            'more': max(len(responses) - MAX_RESPONSES_PER_AD, 0),
+            'count': len(responses),
+        })
+    return groups
+
+
+def digest_email(recipient, events, mode):
+    groups = _group_by_ad(events)
+    total = sum(group['count'] for group in groups)
+    return build_email('digest', f'Новые отклики на ваши объявления: {total}', recipient.email, {
+        'recipient': recipient,
+        'groups': groups,
+        'total': total,
+        'period': PERIODS.get(mode, ''),
+    })
+
+
+def _send_batch(recipient_ids, mode):
+    events = list(
+        PendingNotification.objects
+        .filter(recipient_id__in=recipient_ids)
+        .select_related('recipient', 'response__ad', 'response__from_user')
+        .order_by('recipient_id', 'response__ad_id', 'id')
+    )
+    emails = []
+    for _, recipient_events in groupby(events, key=lambda event: event.recipient_id):
+        recipient_events = list(recipient_events)
+        recipient = recipient_events[0].recipient
+        if recipient.email:
+            emails.append(digest_email(recipient, recipient_events, mode))
+    with transaction.atomic():
+        enqueue_emails(emails)
+        # удаляем ровно то, что попало в письма: пришедшее за это время уйдёт в следующей сводке
+        PendingNotification.objects.filter(pk__in=[event.pk for event in events]).delete()
+    return len(emails), len(events)
+
+
+def send_digests(mode):
+    """Собирает накопившиеся события получателей с режимом mode и кладёт по одному письму на каждого."""
+    # события тех, кто отключил уведомления, больше не нужны
+    PendingNotification.objects.filter(recipient__profile__response_notifications=Profile.NOTIFY_OFF).delete()
+
+    recipient_ids = list(
+        PendingNotification.objects
+        .filter(recipient__profile__response_notifications__in=_modes_for(mode))
+        .order_by('recipient_id')
+        .values_list('recipient_id', flat=True)
+        .distinct()
+    )
+    sent = events = 0
+    for start in range(0, len(recipient_ids), BATCH_SIZE):
+        batch_sent, batch_events = _send_batch(recipient_ids[start:start + BATCH_SIZE], mode)
+        sent += batch_sent
+        events += batch_events
+    logger.info(f"Сводки ({mode}): {sent} писем вместо {events}")
+    return sent, events
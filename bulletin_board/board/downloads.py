@@ -0,0 +1,133 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# 'nginx' — X-Accel-Redirect, 'sendfile' — X-Sendfile (Apache/lighttpd), None — отдаёт сам Django
+SENDFILE_BACKEND = getattr(settings, 'DOWNLOADS_SENDFILE_BACKEND', None)
+# internal location в nginx, который смотрит в MEDIA_ROOT
+ACCEL_PREFIX = getattr(settings, 'DOWNLOADS_ACCEL_PREFIX', '/protected-media/')
+CHUNK_SIZE = getattr(settings, 'DOWNLOADS_CHUNK_SIZE', 64 * 1024)
+MAX_AGE = getattr(settings, 'DOWNLOADS_MAX_AGE', 3600)
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """Разбирает заголовок Range. Поддерживается один диапазон; None — отдать файл целиком."""
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        # bytes=-500: последние 500 байт
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        raise ValueError('Диапазон вне файла')
+    return start, end
+
+
+def file_etag(size, mtime):
+    return f'"{size:x}-{int(mtime):x}"'
+
+
+def _iter_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _content_disposition(filename):
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+def serve_file(request, field_file, filename=None):
+    """
+    Отдаёт файл из FileField: условные запросы (ETag/Last-Modified), Range и 206,
+    при настроенном фронтенде — передача через X-Accel-Redirect/X-Sendfile.
+    Права доступа проверяет вызывающая вьюха.
+    """
+    storage = field_file.storage
+    name = field_file.name
+    filename = filename or os.path.basename(name)
+
+    try:
+        size = storage.size(name)
+        try:
+            mtime = storage.get_modified_time(name).timestamp()
+        except NotImplementedError:
+            mtime = 0
+    except OSError:
+        # запись в БД есть, а файла в хранилище нет (удалён руками, не доехал при переезде)
+        raise Http404
+    etag = file_etag(size, mtime)
+    last_modified = int(mtime) or None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    # encoding не используем: .tar.gz должен скачаться архивом, а не распаковаться браузером
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if SENDFILE_BACKEND:
+        # фронтенд сам отдаёт байты и обрабатывает Range, воркер освобождается сразу
+        response = HttpResponse(content_type=content_type)
+        if SENDFILE_BACKEND == 'nginx':
+            response['X-Accel-Redirect'] = quote(ACCEL_PREFIX.rstrip('/') + '/' + name)
+        else:
+            response['X-Sendfile'] = storage.path(name)
+    else:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+            try:
+                byte_range = parse_range(request.headers.get('Range'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        try:
+            file = storage.open(name, 'rb')
+        except OSError:
+            raise Http404
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+            response['Content-Length'] = size
+            response.block_size = CHUNK_SIZE
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _iter_range(file, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = _content_disposition(filename)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    # файл может быть закрыт для посторонних, поэтому только private-кэш
+    patch_cache_control(response, private=True, max_age=MAX_AGE)
+    return response
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+
+
+SITE_NAME = 'MMORPG Форум'
+TEMPLATE_DIR = 'board/emails'
+
+
+def _template(name):
+    # скомпилированный шаблон хранит кэширующий загрузчик Django (он включён по умолчанию
+    # и при DEBUG сбрасывается автоперезагрузкой), поэтому разбор идёт один раз на процесс
+    return get_template(name).template
+
+
+def render_email(name, context):
+    """
+    Рендерит HTML- и текстовую часть письма name из одного контекста.
+    Возвращает (message, html_message).
+    """
+    context = Context({'site_name': SITE_NAME, 'site_url': settings.SITE_URL, **context})
+    html_message = _template(f'{TEMPLATE_DIR}/{name}.html').render(context)
+    message = _template(f'{TEMPLATE_DIR}/{name}.txt').render(context).strip()
+    return message, html_message
+
+
+def build_email(name, subject, recipient, context):
+    """Аргументы enqueue_email для письма name."""
+    message, html_message = render_email(name, context)
+    return {
+        'subject': subject,
+        'message': message,
+        'recipient_list': [recipient],
+        'html_message': html_message,
+    }
+
+
+def new_response_email(response):
+    ad = response.ad
+    author = ad.author
+    return build_email('new_response', f'Новый отклик на ваше объявление "{ad.title}"', author.email, {
+        'ad': ad,
+        'response': response,
+        'author': author,
+        'responder': response.from_user,
+    })
+
+
+def response_accepted_email(response):
+    ad = response.ad
+    responder = response.from_user
+    return build_email('response_accepted', f'Ваш отклик на объявление "{ad.title}" принят!', responder.email, {
+        'ad': ad,
+        'response': response,
+        'responder': responder,
+        'author': ad.author,
+    })
+
+
+def ad_created_email(ad):
+    author = ad.author
+    return build_email('ad_created', f'Ваше объявление "{ad.title}" успешно создано!', author.email, {
+        'ad': ad,
+        'author': author,
+    })
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Ad, Response
+from .categories import registry as category_registry
 
 class AdForm(forms.ModelForm):
     class Meta:
@@ -35,6 +36,13 @@ class AdForm(forms.ModelForm):
             'file': 'Прикрепите дополнительный файл (необязательно)'
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # варианты из справочника категорий, без запроса при каждом рендере формы
+        field = self.fields['category']
+        empty = [('', field.empty_label)] if field.empty_label is not None else []
+        field.choices = empty + category_registry.choices()
+
 
 class ResponseForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,177 @@
+import logging
+import multiprocessing
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+RENDITION_WIDTHS = getattr(settings, 'IMAGE_RENDITION_WIDTHS', (320, 640, 1280))
+MAX_PIXELS = getattr(settings, 'IMAGE_MAX_PIXELS', 40_000_000)
+WORKERS = getattr(settings, 'IMAGE_WORKERS', 2)
+SYNC = getattr(settings, 'IMAGE_RENDITIONS_SYNC', False)
+
+FORMAT_OPTIONS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'avif': ('AVIF', {'quality': 60}),
+}
+
+
+def available_formats():
+    from PIL import features
+    formats = ['jpg', 'webp'] if features.check('webp') else ['jpg']
+    # AVIF есть в Pillow 11.2+ или через плагин pillow-avif-plugin
+    try:
+        from PIL import AvifImagePlugin  # noqa: F401
+        formats.append('avif')
+    except ImportError:
+        try:
+            import pillow_avif  # noqa: F401
+            formats.append('avif')
+        except ImportError:
+            pass
+    return formats
+
+
+def rendition_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f'{root}_w{width}.{fmt}'
+
+
+def rendition_files(renditions, fmt, name):
+    """
+    [(ширина, имя файла)] копий формата fmt из Ad.image_renditions. Имя хранится то,
+    что вернуло хранилище; у записей старого вида ([ширины]) выводится из оригинала.
+    """
+    return [
+        tuple(entry) if isinstance(entry, (list, tuple)) else (entry, rendition_name(name, entry, fmt))
+        for entry in renditions.get(fmt, [])
+    ]
+
+
+def delete_renditions(renditions, name, storage=None):
+    storage = storage or default_storage
+    for fmt in renditions:
+        for _, file_name in rendition_files(renditions, fmt, name):
+            try:
+                storage.delete(file_name)
+            except OSError as e:
+                logger.warning(f"Не удалось удалить копию {file_name}: {e}")
+
+
+def delete_renditions_on_commit(renditions, name):
+    """Удаляет файлы копий после коммита: при откате объявление продолжает на них ссылаться."""
+    if renditions:
+        renditions = dict(renditions)
+        transaction.on_commit(lambda: delete_renditions(renditions, name))
+
+
+def open_limited(data):
+    """Открывает изображение, отказываясь декодировать слишком большие (decompression bomb)."""
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        image = Image.open(BytesIO(data))
+        width, height = image.size  # читается из заголовка, до декодирования пикселей
+        if width * height > MAX_PIXELS:
+            raise ValueError(f'Изображение слишком большое: {width}x{height}')
+        image.load()
+    return image
+
+
+def generate_renditions(name, storage=None):
+    """Создаёт уменьшенные копии рядом с оригиналом. Возвращает {формат: [[ширина, имя файла]]}."""
+    from PIL import ImageOps
+
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as source:
+        image = open_limited(source.read())
+    image = ImageOps.exif_transpose(image)
+
+    renditions = {}
+    for fmt in available_formats():
+        pil_format, options = FORMAT_OPTIONS[fmt]
+        for width in RENDITION_WIDTHS:
+            if width > image.width and width != RENDITION_WIDTHS[0]:
+                continue  # не растягиваем маленькие картинки
+            resized = image.copy()
+            resized.thumbnail((width, width * 4))
+            if pil_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+                resized = resized.convert('RGB')
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            target = rendition_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            # при гонке хранилище может сохранить файл под другим именем: запоминаем настоящее
+            saved = storage.save(target, ContentFile(buffer.getvalue()))
+            renditions.setdefault(fmt, []).append([width, saved])
+    return renditions
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def store_renditions(ad_pk, name, renditions):
+    from .models import Ad
+    from . import pagecache
+    # сохраняем только если за время обработки картинку не заменили, иначе копии никому не нужны
+    if Ad.objects.filter(pk=ad_pk, image=name).update(image_renditions=renditions):
+        pagecache.bump('ads', f'ad:{ad_pk}')
+        return True
+    delete_renditions(renditions, name)
+    return False
+
+
+def _on_done(ad_pk, name, future):
+    # колбэк выполняется в служебном потоке пула, у него своё соединение с БД
+    try:
+        store_renditions(ad_pk, name, future.result())
+    except Exception as e:
+        logger.error(f"Ошибка обработки изображения {name} объявления {ad_pk}: {e}")
+    finally:
+        connection.close()
+
+
+def process_ad_image(ad_pk, name):
+    if SYNC:
+        store_renditions(ad_pk, name, generate_renditions(name))
+        return
+    future = get_executor().submit(generate_renditions, name)
+    future.add_done_callback(lambda done: _on_done(ad_pk, name, done))
+
+
+def schedule_ad_image(ad):
+    """Ставит обработку картинки в пул процессов после коммита: запрос её не ждёт."""
+    if ad.image:
+        pk, name = ad.pk, ad.image.name
+        transaction.on_commit(lambda: process_ad_image(pk, name))
@@ -0,0 +1,199 @@
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    # читаем при каждом запросе: override_settings и настройки окружения действуют сразу
+    return getattr(settings, name, default)
+
+
+def slow_query_ms():
+    return _setting('SQL_INSTRUMENTATION_SLOW_QUERY_MS', 100)
+
+
+def duplicate_threshold():
+    # столько одинаковых по форме запросов за один HTTP-запрос считаем N+1
+    return _setting('SQL_INSTRUMENTATION_DUPLICATE_THRESHOLD', 5)
+
+
+def top_queries():
+    return _setting('SQL_INSTRUMENTATION_TOP_QUERIES', 5)
+
+
+_IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+\b')
+
+_recorder = ContextVar('sql_recorder', default=None)
+
+
+def fingerprint(sql):
+    """Форма запроса без значений: IN (%s, %s, %s) и IN (%s) дают один отпечаток."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('(...)', sql)
+
+
+class QueryRecorder:
+    """execute_wrapper, который считает запросы одного HTTP-запроса."""
+
+    def __init__(self):
+        self.top_size = top_queries()
+        self.slow_ms = slow_query_ms()
+        self.duplicate_threshold = duplicate_threshold()
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.slowest = []  # куча (мс, sql) из top_size самых долгих
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.count += 1
+                self.duration += elapsed
+                self.fingerprints[fingerprint(sql)] += 1
+                if len(self.slowest) < self.top_size:
+                    heapq.heappush(self.slowest, (elapsed, sql))
+                else:
+                    heapq.heappushpop(self.slowest, (elapsed, sql))
+            if elapsed >= self.slow_ms:
+                logger.warning(f"Медленный SQL ({elapsed:.1f} мс): {sql[:500]}")
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.most_common() if count >= self.duplicate_threshold}
+
+    def top(self):
+        return [(round(ms, 2), sql) for ms, sql in sorted(self.slowest, reverse=True)]
+
+
+def capture():
+    """
+    Подключает активный рекордер к соединению текущего потока.
+    Нужен там, где запросы идут в своих потоках и соединениях (board.concurrency).
+    """
+    recorder = _recorder.get()
+    return connection.execute_wrapper(recorder) if recorder is not None else nullcontext()
+
+
+class _Aggregates:
+    """Накопленная статистика процесса по именам маршрутов."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def add(self, route, recorder, total_ms):
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                'requests': 0, 'queries': 0, 'db_ms': 0.0, 'total_ms': 0.0,
+                'max_queries': 0, 'n_plus_one': 0, 'duplicates': Counter(), 'slowest': [],
+            })
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['db_ms'] += recorder.duration
+            stats['total_ms'] += total_ms
+            stats['max_queries'] = max(stats['max_queries'], recorder.count)
+            duplicates = recorder.duplicates()
+            if duplicates:
+                stats['n_plus_one'] += 1
+                stats['duplicates'].update(duplicates)
+            stats['slowest'] = heapq.nlargest(recorder.top_size, stats['slowest'] + recorder.top())
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                route: {
+                    'requests': stats['requests'],
+                    'avg_queries': round(stats['queries'] / stats['requests'], 1),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_ms': round(stats['db_ms'] / stats['requests'], 2),
+                    'avg_total_ms': round(stats['total_ms'] / stats['requests'], 2),
+                    'n_plus_one_requests': stats['n_plus_one'],
+                    'duplicates': dict(stats['duplicates'].most_common(top_queries())),
+                    'slowest': [{'ms': ms, 'sql': sql} for ms, sql in stats['slowest']],
+                }
+                for route, stats in sorted(self._routes.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+aggregates = _Aggregates()
+
+
+@contextmanager
+def record():
+    recorder = QueryRecorder()
+    token = _recorder.set(recorder)
+    try:
+        with connection.execute_wrapper(recorder):
+            yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path
+    return match.view_name or match.route
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает запросы к БД на каждый HTTP-запрос: число, время, N+1 и самые медленные.
+    Включается настройкой SQL_INSTRUMENTATION. Синхронный намеренно: под ASGI Django
+    выполняет его в том же потоке, что и sync_to_async(thread_sensitive=True) вьюхи,
+    поэтому execute_wrapper видит запросы и async-вьюх.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with record() as recorder:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        route = route_name(request)
+        aggregates.add(route, recorder, total_ms)
+
+        if _setting('SQL_INSTRUMENTATION_SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration:.1f};desc="{recorder.count} queries", app;dur={total_ms:.1f}'
+            )
+
+        duplicates = recorder.duplicates()
+        max_queries = _setting('SQL_INSTRUMENTATION_MAX_QUERIES', 50)
+        max_db_ms = _setting('SQL_INSTRUMENTATION_MAX_DB_MS', 200)
+        if recorder.count >= max_queries or recorder.duration >= max_db_ms or duplicates:
+            message = (
+                f"SQL {request.method} {route}: {recorder.count} запросов, "
+                f"{recorder.duration:.1f} мс в БД, {total_ms:.1f} мс всего"
+            )
+            for sql, count in list(duplicates.items())[:recorder.top_size]:
+                message += f"\n  N+1 ×{count}: {sql[:300]}"
+            for ms, sql in recorder.top():
+                message += f"\n  {ms} мс: {sql[:300]}"
+            logger.warning(message)
+        return response
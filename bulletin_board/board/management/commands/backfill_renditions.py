@@ -0,0 +1,35 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from board.images import generate_renditions, get_executor, store_renditions
+from board.models import Ad
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок для объявлений, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Пересоздать копии для всех объявлений')
+
+    def handle(self, *args, **options):
+        ads = Ad.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            ads = ads.filter(image_renditions={})
+
+        executor = get_executor()
+        futures = {
+            executor.submit(generate_renditions, name): (pk, name)
+            for pk, name in ads.values_list('pk', 'image').iterator()
+        }
+        done = failed = 0
+        for future in as_completed(futures):
+            pk, name = futures[future]
+            try:
+                store_renditions(pk, name, future.result())
+                done += 1
+            except Exception as e:
+                self.stderr.write(f'{name}: {e}')
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано {done}, ошибок {failed}'))
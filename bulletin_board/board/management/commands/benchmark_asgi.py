@@ -0,0 +1,111 @@
+import asyncio
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+
+
+def percentile(timings, share):
+    timings = sorted(timings)
+    return timings[min(int(len(timings) * share), len(timings) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает p50/p99 страниц под WSGI и ASGI. Без --wsgi-url/--asgi-url гоняет запросы '
+        'через обработчики Django в процессе, с ними — по HTTP в запущенные серверы '
+        '(например, gunicorn bulletin_board.wsgi и uvicorn bulletin_board.asgi:application).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=['/', '/account/profile/', '/bulletin-board/responses/'])
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--username', help='Под каким пользователем открывать закрытые страницы')
+        parser.add_argument('--wsgi-url', help='Адрес запущенного WSGI-сервера')
+        parser.add_argument('--asgi-url', help='Адрес запущенного ASGI-сервера')
+
+    def _user(self, username):
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден')
+
+    def _run_wsgi(self, path, total, concurrency, user):
+        def worker(count):
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                client.get(path)
+                timings.append((time.perf_counter() - started) * 1000)
+            return timings
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            chunks = pool.map(worker, [total // concurrency] * concurrency)
+        return [timing for chunk in chunks for timing in chunk]
+
+    def _run_asgi(self, path, total, concurrency, user):
+        async def worker(client, count):
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                await client.get(path)
+                timings.append((time.perf_counter() - started) * 1000)
+            return timings
+
+        async def main():
+            clients = []
+            for _ in range(concurrency):
+                client = AsyncClient()
+                if user is not None:
+                    await client.aforce_login(user)
+                clients.append(client)
+            chunks = await asyncio.gather(*(worker(client, total // concurrency) for client in clients))
+            return [timing for chunk in chunks for timing in chunk]
+
+        return asyncio.run(main())
+
+    def _run_http(self, base_url, path, total, concurrency):
+        url = base_url.rstrip('/') + path
+
+        def fetch(_):
+            started = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(fetch, range(total)))
+
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+        user = self._user(options['username'])
+        over_http = options['wsgi_url'] or options['asgi_url']
+
+        for path in options['paths']:
+            if over_http:
+                runs = [
+                    (name, lambda url=url: self._run_http(url, path, total, concurrency))
+                    for name, url in (('WSGI', options['wsgi_url']), ('ASGI', options['asgi_url'])) if url
+                ]
+            else:
+                runs = [
+                    ('WSGI', lambda: self._run_wsgi(path, total, concurrency, user)),
+                    ('ASGI', lambda: self._run_asgi(path, total, concurrency, user)),
+                ]
+            for name, run in runs:
+                started = time.perf_counter()
+                timings = run()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{path:32} {name}  p50 {percentile(timings, 0.5):8.2f} мс  '
+                    f'p99 {percentile(timings, 0.99):8.2f} мс  {len(timings) / elapsed:8.1f} запр/с'
+                )
@@ -0,0 +1,103 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine
+from django.utils import timezone
+
+from board import emails
+from board.models import Ad, Category, Response
+
+
+def _sample():
+    # объекты не сохраняются: меряем только рендер, без запросов к БД
+    author = User(pk=1, username='author', email='author@example.com')
+    responder = User(pk=2, username='responder', email='responder@example.com')
+    ad = Ad(pk=1, title='Ищу пати в рейд', content='Описание объявления ' * 20,
+            author=author, category=Category(pk=1, name='Танки'), created=timezone.now())
+    response = Response(pk=1, ad=ad, from_user=responder, ad_author=author,
+                        text='Готов присоединиться', created_at=timezone.now())
+    return ad, response
+
+
+def _legacy_render(engine, name, context, plain):
+    # как письма собирались раньше: поиск и разбор шаблона на каждое письмо плюс f-строка
+    html_message = engine.get_template(f'board/emails/{name}.html').render(Context(context))
+    return plain, html_message
+
+
+def _legacy_emails(engine, ad, response):
+    author, responder = ad.author, response.from_user
+    context = {'ad': ad, 'response': response, 'author': author, 'responder': responder,
+               'site_name': emails.SITE_NAME}
+    return {
+        'new_response': lambda: _legacy_render(engine, 'new_response', context, f"""
+            Здравствуйте, {author.username}!
+
+            Пользователь {responder.username} оставил отклик на ваше объявление "{ad.title}".
+
+            Текст отклика:
+            {response.text}
+
+            Вы можете просмотреть и принять отклик в личном кабинете:
+            {settings.SITE_URL}/bulletin-board/responses/
+            """),
+        'response_accepted': lambda: _legacy_render(engine, 'response_accepted', context, f"""
+            Поздравляем, {responder.username}!
+
+            Автор {author.username} принял ваш отклик на объявление "{ad.title}".
+            Email автора: {author.email}
+
+            Текст вашего отклика:
+            {response.text}
+            """),
+        'ad_created': lambda: _legacy_render(engine, 'ad_created', context, f"""
+            Здравствуйте, {author.username}!
+
+            Ваше объявление "{ad.title}" успешно создано.
+            Категория: {ad.category.name}
+            Дата создания: {ad.created.strftime('%d.%m.%Y %H:%M')}
+            {settings.SITE_URL}/bulletin-board/{ad.pk}/
+            """),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость рендера одного письма: прежняя схема (шаблон ищется и разбирается '
+        'на каждое письмо, текст — f-строкой) против board.emails (шаблоны из кэширующего загрузчика, '
+        'HTML и текст из одного контекста).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=1000, help='Писем каждого типа')
+
+    def _measure(self, render, count):
+        render()  # прогрев: импорт тегов, первая компиляция
+        started = time.perf_counter()
+        for _ in range(count):
+            render()
+        return (time.perf_counter() - started) / count * 1_000_000
+
+    def handle(self, *args, **options):
+        count = options['emails']
+        ad, response = _sample()
+        # загрузчики без кэширующего: шаблон ищется и разбирается на каждое письмо
+        engine = Engine(dirs=settings.TEMPLATES[0]['DIRS'], loaders=[
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ])
+        legacy = _legacy_emails(engine, ad, response)
+        current = {
+            'new_response': lambda: emails.new_response_email(response),
+            'response_accepted': lambda: emails.response_accepted_email(response),
+            'ad_created': lambda: emails.ad_created_email(ad),
+        }
+
+        for name in current:
+            before = self._measure(legacy[name], count)
+            after = self._measure(current[name], count)
+            self.stdout.write(
+                f'{name:20} до {before:9.1f} мкс  после {after:9.1f} мкс  ×{before / after:5.1f}'
+            )
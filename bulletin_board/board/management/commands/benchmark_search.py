@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from board.models import Ad, Response
+from board.search import LikeSearchBackend, get_backend
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время поиска через полнотекстовый индекс и через icontains'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=['танк', 'гильдия', 'зелье лечения'])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _measure(self, func, repeat):
+        timings = []
+        count = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            count = len(list(func()[:50]))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2], timings[-1], count
+
+    def handle(self, *args, **options):
+        backends = [('icontains', LikeSearchBackend()), (type(get_backend()).__name__, get_backend())]
+        for query in options['queries']:
+            for name, backend in backends:
+                for label, func in [
+                    ('ads', lambda: backend.filter_ads(Ad.objects.all(), query)),
+                    ('responses', lambda: backend.filter_responses(Response.objects.all(), query)),
+                ]:
+                    median, worst, count = self._measure(func, options['repeat'])
+                    self.stdout.write(
+                        f'{query!r:20} {label:10} {name:20} median {median:8.2f} мс, max {worst:8.2f} мс, найдено {count}'
+                    )
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from board.api import TOMBSTONE_DAYS
+from board.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет записи об удалённых объявлениях и откликах старше API_TOMBSTONE_DAYS дней: '
+        'лента изменений API с таким since всё равно отвечает 410. Запускается по cron раз в сутки.'
+    )
+
+    def handle(self, *args, **options):
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=TOMBSTONE_DAYS)).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей об удалениях: {deleted}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from board.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает поисковый индекс объявлений и откликов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Индекс перестроен ({type(backend).__name__})'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from board import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики статистики сайта с нуля'
+
+    def handle(self, *args, **options):
+        stats.reconcile()
+        site_stats = stats.get_site_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Пользователей: {site_stats['user_count']}, активных объявлений: {site_stats['ad_count']}, "
+            f"откликов за 24 часа: {site_stats['response_count']}"
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from board.bench import driver
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все маршруты board/urls.py и accounts/urls.py и выводит p50/p95/p99, '
+        'число запросов к БД и прочитанных строк. Результат можно сохранить в JSON '
+        'и сравнить с прогоном на другом коммите.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*', help='Имена маршрутов; по умолчанию все')
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на маршрут')
+        parser.add_argument('--username', help='От чьего имени ходить; по умолчанию автор последнего объявления')
+        parser.add_argument('--anonymous', action='store_true', help='Ходить без входа в систему')
+        parser.add_argument('--url', help='Адрес запущенного сервера; без него — через тестовый клиент')
+        parser.add_argument('--include-unsafe', action='store_true',
+                            help='Гонять и маршруты, которые меняют данные по GET')
+        parser.add_argument('--output', help='Сохранить результат в JSON')
+        parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        try:
+            report = driver.run(
+                options['requests'],
+                username=options['username'],
+                anonymous=options['anonymous'],
+                base_url=options['url'],
+                include_unsafe=options['include_unsafe'],
+                only=set(options['routes']),
+                log=self.stdout.write,
+            )
+        except (ValueError, User.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            driver.save(report, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранён в {options['output']}"))
+        if options['compare']:
+            for line in driver.compare(report, options['compare']):
+                self.stdout.write(line)
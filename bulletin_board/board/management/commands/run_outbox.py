@@ -0,0 +1,53 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from board.outbox import BATCH_SIZE, deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из outbox пачками через переиспользуемые SMTP-соединения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=1, help='Количество параллельных воркеров')
+        parser.add_argument('--interval', type=float, default=5.0, help='Пауза (сек), когда очередь пуста')
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь и выйти')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = {'sent': 0, 'failed': 0}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    sent, failed = deliver_batch(options['batch_size'])
+                    with lock:
+                        totals['sent'] += sent
+                        totals['failed'] += failed
+                    if sent or failed:
+                        continue
+                    if options['once']:
+                        break
+                    stop.wait(options['interval'])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(options['workers'], 1))]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox: отправлено {totals['sent']}, ошибок {totals['failed']}"
+        ))
@@ -0,0 +1,45 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from board.bench import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для замеров через bulk_create по существующим категориям, '
+        'например: seed_bench --users 100000 --ads 1000000 --responses 5000000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--ads', type=int, default=10000)
+        parser.add_argument('--responses', type=int, default=50000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, help='Зерно генератора для воспроизводимых данных')
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее сгенерированные данные и выйти')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = seed.clear()
+            self.stdout.write(self.style.SUCCESS(f'Удалено объектов: {deleted}'))
+            return
+
+        try:
+            created = seed.seed(
+                options['users'], options['ads'], options['responses'],
+                batch_size=options['batch_size'], random_seed=options['seed'],
+                log=lambda message: self.stdout.write(message, ending='\r'),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('')
+        self.stdout.write(
+            f"Пользователей: {created['users']}, объявлений: {created['ads']}, "
+            f"откликов вставлено: {created['responses']} из {options['responses']}"
+        )
+
+        # сигналы при bulk_create не срабатывали: догоняем поисковый индекс и счётчики
+        call_command('rebuild_search_index', stdout=self.stdout)
+        call_command('reconcile_stats', stdout=self.stdout)
+        call_command('reconcile_profile_counters', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Данные для замеров готовы'))
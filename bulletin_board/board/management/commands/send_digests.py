@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Profile
+from board.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет сводки о новых откликах тем, кто выбрал их вместо письма на каждый отклик. '
+        'Запускается по cron: hourly — каждый час, daily — раз в сутки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', choices=[Profile.NOTIFY_HOURLY, Profile.NOTIFY_DAILY])
+
+    def handle(self, *args, **options):
+        sent, events = send_digests(options['mode'])
+        self.stdout.write(self.style.SUCCESS(f'Сводок поставлено в очередь: {sent}, откликов в них: {events}'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from board.models import NewsletterCampaign
+from board.newsletter import BATCH_SIZE, CHUNK_SIZE, run_campaign
+
+
+class Command(BaseCommand):
+    help = 'Запускает новую рассылку, продолжает прерванную с последнего чекпоинта или повторяет неудачные адреса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject')
+        parser.add_argument('--message')
+        parser.add_argument('--html-message', default='')
+        parser.add_argument('--resume', type=int, help='id кампании, которую нужно продолжить')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                campaign = NewsletterCampaign.objects.get(pk=options['resume'])
+            except NewsletterCampaign.DoesNotExist:
+                raise CommandError(f"Рассылка {options['resume']} не найдена")
+            if campaign.status == NewsletterCampaign.STATUS_DONE and not campaign.failed_user_ids:
+                raise CommandError(f"Рассылка {campaign.pk} уже завершена")
+        elif options['subject'] and options['message']:
+            campaign = NewsletterCampaign.objects.create(
+                subject=options['subject'],
+                message=options['message'],
+                html_message=options['html_message'],
+            )
+        else:
+            raise CommandError('Укажите --subject и --message или --resume')
+
+        stats = run_campaign(campaign, options['batch_size'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Рассылка {campaign.pk}: отправлено {stats['sent']}, ошибок {stats['failed']}, "
+            f"{stats['elapsed']:.1f} с, {stats['rate']:.1f} писем/с"
+        ))
+        if stats['interrupted']:
+            self.stdout.write(self.style.WARNING(
+                f"SMTP недоступен, рассылка прервана. Продолжить: send_newsletter --resume {campaign.pk}"
+            ))
+        elif campaign.failed_user_ids:
+            self.stdout.write(self.style.WARNING(
+                f"Не доставлено {len(campaign.failed_user_ids)} адресатам. "
+                f"Повторить: send_newsletter --resume {campaign.pk}"
+            ))
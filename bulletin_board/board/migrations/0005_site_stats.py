@@ -0,0 +1,68 @@
+# Generated by Django 6.0 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    Ad = apps.get_model('board', 'Ad')
+    Category = apps.get_model('board', 'Category')
+    Response = apps.get_model('board', 'Response')
+    SiteCounter = apps.get_model('board', 'SiteCounter')
+    CategoryCounter = apps.get_model('board', 'CategoryCounter')
+    ResponseBucket = apps.get_model('board', 'ResponseBucket')
+
+    SiteCounter.objects.create(name='users', value=User.objects.count())
+    SiteCounter.objects.create(name='active_ads', value=Ad.objects.filter(is_active=True).count())
+    CategoryCounter.objects.bulk_create([
+        CategoryCounter(category_id=category.pk, active_ads=category.active)
+        for category in Category.objects.annotate(active=Count('ad', filter=Q(ad__is_active=True)))
+    ])
+
+    hours = {}
+    since = timezone.now() - timedelta(hours=25)
+    for created_at in Response.objects.filter(created_at__gte=since).values_list('created_at', flat=True):
+        hour = created_at.replace(minute=0, second=0, microsecond=0)
+        hours[hour] = hours.get(hour, 0) + 1
+    ResponseBucket.objects.bulk_create([ResponseBucket(hour=hour, count=count) for hour, count in hours.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0004_newslettercampaign'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResponseBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_ads', models.BigIntegerField(default=0)),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='counter', to='board.category')),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 6.0 on 2026-10-18 13:30
+
+import re
+
+from django.db import migrations
+
+
+# Копия board.search.normalize на момент миграции: будущие правки стеммера
+# не должны менять то, что делает уже применённая миграция.
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_CYRILLIC_RE = re.compile(r'[а-я]')
+_RU_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ешь', 'ишь',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ов', 'ев', 'ах', 'ях',
+    'ам', 'ям', 'ом', 'ем', 'ую', 'юю', 'ию', 'ия', 'ть', 'ет', 'ют', 'ут', 'ат', 'ят',
+    'ит', 'ла', 'ли', 'ло', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+_MIN_STEM = 3
+BATCH_SIZE = 1000
+
+
+def _stem(word):
+    if len(word) <= _MIN_STEM or not _CYRILLIC_RE.search(word):
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def normalize(text):
+    text = (text or '').lower().replace('ё', 'е')
+    return ' '.join(_stem(word) for word in _WORD_RE.findall(text))
+
+
+def _insert_batched(cursor, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def create_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Ad = apps.get_model('board', 'Ad')
+    Response = apps.get_model('board', 'Response')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS board_ad_fts USING fts5("
+        "title, content, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS board_response_fts USING fts5("
+        "text, ad_title, username, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    ads = Ad.objects.values_list('pk', 'title', 'content').iterator(chunk_size=BATCH_SIZE)
+    responses = Response.objects.values_list(
+        'pk', 'text', 'ad__title', 'from_user__username'
+    ).iterator(chunk_size=BATCH_SIZE)
+    with schema_editor.connection.cursor() as cursor:
+        _insert_batched(
+            cursor,
+            'INSERT INTO board_ad_fts(rowid, title, content) VALUES (%s, %s, %s)',
+            ((pk, normalize(title), normalize(content)) for pk, title, content in ads),
+        )
+        _insert_batched(
+            cursor,
+            'INSERT INTO board_response_fts(rowid, text, ad_title, username) VALUES (%s, %s, %s, %s)',
+            ((pk, normalize(text), normalize(ad_title), normalize(username))
+             for pk, text, ad_title, username in responses),
+        )
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS board_ad_fts')
+    schema_editor.execute('DROP TABLE IF EXISTS board_response_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0005_site_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_ad_author(apps, schema_editor):
+    Ad = apps.get_model('board', 'Ad')
+    Response = apps.get_model('board', 'Response')
+    Response.objects.filter(ad_author__isnull=True).update(
+        ad_author=Subquery(Ad.objects.filter(pk=OuterRef('ad_id')).values('author_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0006_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='ad_author',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='received_responses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_ad_author, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['-created', '-id'], name='ad_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created', '-id'], name='ad_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['category', '-created', '-id'], name='ad_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ad',
+            index=models.Index(fields=['author', '-created', '-id'], name='ad_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['ad', '-created_at', '-id'], name='response_ad_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['ad', 'is_accepted'], name='response_ad_accepted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['from_user', '-created_at', '-id'], name='response_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['ad_author', '-created_at', '-id'], name='response_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['ad_author', 'is_accepted', '-created_at', '-id'], name='response_author_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['-created_at', '-id'], name='response_created_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+# подсказки, которые раньше были зашиты в AdCreateView
+HINTS = {
+    'Танки': 'Защитники, щиты команды',
+    'Хилы': 'Лекари, поддержка здоровья',
+    'ДД': 'Урон, атакующие классы',
+    'Торговцы': 'Продажа предметов, ремесло',
+    'Гилдмастеры': 'Лидеры гильдий, организаторы',
+    'Квестгиверы': 'Задания, миссии',
+    'Кузнецы': 'Оружие, броня',
+    'Кожевники': 'Кожаная броня, сумки',
+    'Зельевары': 'Зелья, эликсиры',
+    'Мастера заклинаний': 'Магия, заклинания',
+}
+
+
+def fill_descriptions(apps, schema_editor):
+    Category = apps.get_model('board', 'Category')
+    for name, description in HINTS.items():
+        Category.objects.filter(name=name, description='').update(description=description)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0009_ad_update_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='description',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.RunPython(fill_descriptions, migrations.RunPython.noop),
+    ]
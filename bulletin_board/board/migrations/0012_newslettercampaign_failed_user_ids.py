@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0011_pendingnotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='failed_user_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 23:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_created_at(apps, schema_editor):
+    Response = apps.get_model('board', 'Response')
+    Response.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0012_newslettercampaign_failed_user_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['ad_author', 'updated_at', 'id'], name='response_author_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['from_user', 'updated_at', 'id'], name='response_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 23:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0013_response_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ad', 'Объявление'), ('response', 'Отклик')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('ad_id', models.BigIntegerField()),
+                ('author_id', models.BigIntegerField()),
+                ('from_user_id', models.BigIntegerField(blank=True, null=True)),
+                ('category_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['kind', 'deleted_at'], name='tombstone_kind_deleted_idx'),
+                    models.Index(fields=['kind', 'author_id', 'deleted_at'], name='tombstone_author_deleted_idx'),
+                    models.Index(fields=['kind', 'from_user_id', 'deleted_at'], name='tombstone_user_deleted_idx'),
+                ],
+            },
+        ),
+    ]
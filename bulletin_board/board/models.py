@@ -1,16 +1,92 @@
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique = True)
+    # подсказка на странице создания объявления
+    description = models.CharField(max_length=200, blank=True)
 
     def __str__(self):
         return self.name
 
 
-class Ad(models.Model):
+class TrackedFieldsMixin:
+    """
+    Запоминает значения tracked_fields в момент загрузки из БД, чтобы обработчики
+    сигналов видели, что поменялось, без повторного SELECT.
+    Для FK указывается attname: 'category_id', а не 'category'.
+    Поля, отложенные через only()/defer(), попадают в снимок при догрузке, а если им
+    присвоили значение, не читая, — прежнее значение дочитывается одним SELECT перед save().
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        if fields is None:
+            self._loaded_values = {}
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for field in self.tracked_fields:
+            if field in self.__dict__ and (fields is None or field in fields):
+                loaded[field] = self.__dict__[field]
+
+    def _load_missing_snapshot(self):
+        # отложенное поле перезаписали без чтения: старое значение знает только БД
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return
+        missing = [field for field in self.tracked_fields if field in self.__dict__ and field not in loaded]
+        if missing:
+            row = type(self)._base_manager.using(self._state.db).filter(pk=self.pk).values(*missing).first()
+            loaded.update(row or {})
+
+    def get_loaded_value(self, field):
+        return getattr(self, '_loaded_values', {}).get(field)
+
+    def has_changed(self, field):
+        loaded = getattr(self, '_loaded_values', {})
+        return field in loaded and loaded[field] != getattr(self, field)
+
+    def save(self, *args, **kwargs):
+        self._load_missing_snapshot()
+        super().save(*args, **kwargs)
+        # сигналы post_save уже отработали со старым снимком
+        self._snapshot_tracked_fields()
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            self._snapshot_tracked_fields()
+            return
+        # догрузка отложенного поля: в снимок попадает только оно, несохранённые правки других полей не теряются
+        refreshed = set()
+        for name in fields:
+            try:
+                refreshed.add(self._meta.get_field(name).attname)
+            except FieldDoesNotExist:
+                pass
+        self._snapshot_tracked_fields(refreshed)
+
+
+class AdQuerySet(models.QuerySet):
+    def with_response_count(self):
+        # коррелированный подзапрос считается только для строк текущей страницы, без GROUP BY по всей выборке
+        counts = Response.objects.filter(ad=models.OuterRef('pk')).order_by().values('ad').annotate(
+            total=models.Count('pk')
+        ).values('total')
+        return self.annotate(response_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Ad(TrackedFieldsMixin, models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
     image = models.ImageField(upload_to='ads_images/', blank=True, null=True)
@@ -20,23 +96,227 @@ class Ad(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     update = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # готовые уменьшенные копии image: {'webp': [320, 640], 'jpg': [...]}, заполняет board.images
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = AdQuerySet.as_manager()
+    tracked_fields = ('is_active', 'category_id', 'title', 'content', 'image', 'author_id')
 
     def __str__(self):
         return self.title
 
+    def image_srcset(self, fmt):
+        from .images import rendition_files
+        if not self.image:
+            return ''
+        storage = self.image.storage
+        return ', '.join(
+            f'{storage.url(name)} {width}w'
+            for width, name in rendition_files(self.image_renditions, fmt, self.image.name)
+        )
+
+    @property
+    def image_srcset_jpg(self):
+        return self.image_srcset('jpg')
+
+    @property
+    def image_srcset_webp(self):
+        return self.image_srcset('webp')
+
+    @property
+    def image_srcset_avif(self):
+        return self.image_srcset('avif')
+
+    @property
+    def image_thumbnail_url(self):
+        from .images import rendition_files
+        if not self.image:
+            return ''
+        files = rendition_files(self.image_renditions, 'jpg', self.image.name)
+        if files:
+            return self.image.storage.url(files[0][1])
+        return self.image.url
+
     def get_absolute_url(self):
         return reverse("ad_detail", kwargs={"pk": self.pk})
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='ad_created_idx'),
+            # лента изменений API: update > since ORDER BY update, id
+            models.Index(fields=['update', 'id'], name='ad_update_idx'),
+            models.Index(fields=['-created', '-id'], condition=models.Q(is_active=True), name='ad_active_created_idx'),
+            models.Index(fields=['category', '-created', '-id'], name='ad_category_created_idx'),
+            models.Index(fields=['author', '-created', '-id'], name='ad_author_created_idx'),
+        ]
 
 
-class Response(models.Model):
+class Response(TrackedFieldsMixin, models.Model):
     text = models.TextField()
     from_user = models.ForeignKey(User, on_delete=models.CASCADE)
     ad = models.ForeignKey(Ad, on_delete=models.CASCADE)
     is_accepted = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # меняется при любом изменении отклика, в том числе при принятии: по нему лента изменений API
+    updated_at = models.DateTimeField(auto_now=True)
+    # копия ad.author: "отклики на мои объявления" читаются по индексу без IN-подзапроса и сортировки
+    ad_author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_responses',
+                                  null=True, editable=False)
+
+    tracked_fields = ('is_accepted', 'text')
+
+    def save(self, *args, **kwargs):
+        if self.ad_author_id is None and self.ad_id is not None:
+            self.ad_author_id = self.ad.author_id
+        super().save(*args, **kwargs)
+
+    class Meta:
+        unique_together = ['from_user', 'ad'] # один пользователь - один отклик на объявление
+        indexes = [
+            models.Index(fields=['ad', '-created_at', '-id'], name='response_ad_created_idx'),
+            models.Index(fields=['ad', 'is_accepted'], name='response_ad_accepted_idx'),
+            models.Index(fields=['from_user', '-created_at', '-id'], name='response_user_created_idx'),
+            models.Index(fields=['ad_author', '-created_at', '-id'], name='response_author_created_idx'),
+            models.Index(fields=['ad_author', 'is_accepted', '-created_at', '-id'], name='response_author_state_idx'),
+            models.Index(fields=['-created_at', '-id'], name='response_created_idx'),
+            # лента изменений API: updated_at > since ORDER BY updated_at, id
+            models.Index(fields=['ad_author', 'updated_at', 'id'], name='response_author_updated_idx'),
+            models.Index(fields=['from_user', 'updated_at', 'id'], name='response_user_updated_idx'),
+        ]
+
+class OutboxEmail(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENDING, 'Отправляется'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_DEAD, 'Не доставлено'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.TextField()  # адреса получателей через запятую
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} → {self.to}'
+
+    @property
+    def recipients(self):
+        return [address for address in self.to.split(',') if address]
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+
+class PendingNotification(models.Model):
+    """Событие для сводки: отклик, о котором получатель ещё не знает. Удаляется после отправки."""
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_notifications')
+    response = models.ForeignKey(Response, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.recipient_id}: отклик {self.response_id}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'id'], name='pending_recipient_idx'),
+        ]
+
+
+class NewsletterCampaign(models.Model):
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'В процессе'),
+        (STATUS_DONE, 'Завершена'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    html_message = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    last_user_id = models.BigIntegerField(default=0)  # чекпоинт: до этого id всё уже отправлено
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    # получатели, которым письмо не ушло: чекпоинт уже за ними, повторяем отдельно
+    failed_user_ids = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.subject
+
+
+class SiteCounter(models.Model):
+    USERS = 'users'
+    ACTIVE_ADS = 'active_ads'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class CategoryCounter(models.Model):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, related_name='counter')
+    active_ads = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.category}: {self.active_ads}'
+
+
+class ResponseBucket(models.Model):
+    hour = models.DateTimeField(unique=True)  # начало часа, в который пришли отклики
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.hour:%d.%m.%Y %H:00}: {self.count}'
+
+
+class Tombstone(models.Model):
+    """
+    След удалённого объявления или отклика для ленты изменений API (since=): строки уже нет,
+    а клиенту нужно узнать, что её пора убрать. Ссылки — числа, а не внешние ключи:
+    объявление и пользователи могут быть удалены вместе с объектом.
+    """
+    KIND_AD = 'ad'
+    KIND_RESPONSE = 'response'
+    KIND_CHOICES = [
+        (KIND_AD, 'Объявление'),
+        (KIND_RESPONSE, 'Отклик'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    ad_id = models.BigIntegerField()  # для объявления совпадает с object_id
+    author_id = models.BigIntegerField()  # автор объявления
+    from_user_id = models.BigIntegerField(null=True, blank=True)  # автор отклика
+    category_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id} удалён {self.deleted_at:%d.%m.%Y %H:%M}'
 
     class Meta:
-        unique_together = ['from_user', 'ad'] # один пользователь - один отклик на объявление
\ No newline at end of file
+        indexes = [
+            models.Index(fields=['kind', 'deleted_at'], name='tombstone_kind_deleted_idx'),
+            models.Index(fields=['kind', 'author_id', 'deleted_at'], name='tombstone_author_deleted_idx'),
+            models.Index(fields=['kind', 'from_user_id', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
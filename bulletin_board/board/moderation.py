@@ -0,0 +1,51 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Response
+from .outbox import enqueue_emails
+from . import pagecache
+from .emails import response_accepted_email
+
+
+logger = logging.getLogger(__name__)
+
+
+def _selected(user, pks=None, ad_id=None):
+    # ad_author=user — проверка прав прямо в WHERE, чужие отклики просто не попадут в выборку
+    responses = Response.objects.filter(ad_author=user)
+    if ad_id is not None:
+        return responses.filter(ad_id=ad_id)
+    return responses.filter(pk__in=pks or [])
+
+
+@transaction.atomic
+def accept_responses(user, pks=None, ad_id=None):
+    """Принимает выбранные отклики (или все ожидающие на объявление ad_id) одним UPDATE."""
+    pending = _selected(user, pks, ad_id).filter(is_accepted=False)
+    accepted_pks = list(pending.values_list('pk', flat=True))
+    if not accepted_pks:
+        return 0
+
+    # UPDATE не шлёт post_save: письма ставим в outbox сами, одной пачкой;
+    # auto_now тоже не срабатывает, updated_at для ленты изменений API ставим явно
+    updated = Response.objects.filter(
+        ad_author=user, pk__in=accepted_pks, is_accepted=False,
+    ).update(is_accepted=True, updated_at=timezone.now())
+
+    accepted = list(Response.objects.filter(pk__in=accepted_pks).select_related('ad', 'ad__author', 'from_user'))
+    enqueue_emails([response_accepted_email(response) for response in accepted if response.from_user.email])
+    # UPDATE мимо сигналов: кэш страниц объявлений сбрасываем сами
+    pagecache.bump_on_commit(*{f'ad:{response.ad_id}' for response in accepted})
+    logger.info(f"Пользователь {user.pk} принял {updated} откликов, письма поставлены в очередь")
+    return updated
+
+
+@transaction.atomic
+def reject_responses(user, pks=None, ad_id=None):
+    """Отклоняет выбранные отклики (или все ожидающие на объявление ad_id): удаляет их одним DELETE."""
+    deleted, per_model = _selected(user, pks, ad_id).filter(is_accepted=False).delete()
+    rejected = per_model.get(Response._meta.label, 0)
+    logger.info(f"Пользователь {user.pk} отклонил {rejected} откликов")
+    return rejected
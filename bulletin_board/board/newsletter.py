@@ -0,0 +1,176 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NewsletterCampaign
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'NEWSLETTER_BATCH_SIZE', 100)
+CHUNK_SIZE = getattr(settings, 'NEWSLETTER_CHUNK_SIZE', 2000)
+
+
+def build_newsletter_message(campaign, email, connection=None):
+    message = EmailMultiAlternatives(
+        subject=campaign.subject,
+        body=campaign.message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+        connection=connection,
+    )
+    if campaign.html_message:
+        message.attach_alternative(campaign.html_message, 'text/html')
+    return message
+
+
+def iter_recipients(after_id=0, chunk_size=CHUNK_SIZE):
+    return (
+        User.objects.filter(is_active=True, profile__email_notifications=True, pk__gt=after_id)
+        .exclude(email='')
+        .order_by('pk')
+        .values_list('pk', 'email')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _reconnect(connection):
+    """После ошибки SMTP-сессия может быть в неопределённом состоянии: открываем заново."""
+    try:
+        connection.close()
+    except Exception:
+        pass
+    try:
+        connection.open()
+        return True
+    except Exception as e:
+        logger.error(f"Рассылка: не удалось переподключиться к SMTP: {e}")
+        return False
+
+
+def _send_batch(connection, campaign, batch):
+    """
+    Возвращает (sent, failed_ids, checkpoint, connected). checkpoint — id последнего
+    обработанного получателя; если SMTP пропал, дальше него пачка не идёт.
+    """
+    sent = 0
+    failed_ids = []
+    checkpoint = None
+    for user_id, email in batch:
+        try:
+            sent += connection.send_messages([build_newsletter_message(campaign, email)]) or 0
+        except Exception as e:
+            logger.error(f"Рассылка {campaign.pk}: ошибка отправки на {email}: {e}")
+            failed_ids.append(user_id)
+            checkpoint = user_id
+            if not _reconnect(connection):
+                return sent, failed_ids, checkpoint, False
+            continue
+        checkpoint = user_id
+    return sent, failed_ids, checkpoint, True
+
+
+def _save_progress(campaign, sent, failed_ids, checkpoint=None):
+    if checkpoint is not None:
+        campaign.last_user_id = checkpoint
+    campaign.failed_user_ids = campaign.failed_user_ids + failed_ids
+    NewsletterCampaign.objects.filter(pk=campaign.pk).update(
+        last_user_id=campaign.last_user_id,
+        failed_user_ids=campaign.failed_user_ids,
+        sent_count=F('sent_count') + sent,
+        failed_count=F('failed_count') + len(failed_ids),
+    )
+
+
+def retry_failed(connection, campaign):
+    """Один повтор для получателей из failed_user_ids. Возвращает (sent, failed)."""
+    if not campaign.failed_user_ids:
+        return 0, 0
+    # отписавшиеся и удалённые за это время выпадают из списка сами
+    recipients = list(
+        User.objects.filter(pk__in=campaign.failed_user_ids, is_active=True, profile__email_notifications=True)
+        .exclude(email='')
+        .order_by('pk')
+        .values_list('pk', 'email')
+    )
+    campaign.failed_user_ids = []
+    sent, failed_ids, checkpoint, connected = _send_batch(connection, campaign, recipients)
+    if not connected:
+        # до кого очередь не дошла, остаются в списке на следующий запуск
+        failed_ids += [user_id for user_id, _ in recipients if user_id > checkpoint]
+    campaign.failed_user_ids = failed_ids
+    NewsletterCampaign.objects.filter(pk=campaign.pk).update(
+        failed_user_ids=failed_ids,
+        sent_count=F('sent_count') + sent,
+    )
+    return sent, len(failed_ids)
+
+
+def run_campaign(campaign, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    """
+    Отправляет кампанию с последнего чекпоинта и один раз повторяет неудачные адреса.
+    Если SMTP пропал посреди прогона, кампания остаётся незавершённой и продолжается
+    с чекпоинта при следующем запуске. Возвращает статистику прогона.
+    """
+    started = time.monotonic()
+    sent_total = failed_total = 0
+    interrupted = False
+    batch = []
+
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        def flush():
+            nonlocal sent_total, failed_total, interrupted
+            sent, failed_ids, checkpoint, connected = _send_batch(connection, campaign, batch)
+            sent_total += sent
+            failed_total += len(failed_ids)
+            _save_progress(campaign, sent, failed_ids, checkpoint)
+            batch.clear()
+            interrupted = not connected
+
+        if campaign.status != NewsletterCampaign.STATUS_DONE:
+            for recipient in iter_recipients(campaign.last_user_id, chunk_size):
+                batch.append(recipient)
+                if len(batch) >= batch_size:
+                    flush()
+                    if interrupted:
+                        break
+            if batch and not interrupted:
+                flush()
+
+        if not interrupted:
+            retried, failed_total = retry_failed(connection, campaign)
+            sent_total += retried
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    if not interrupted:
+        NewsletterCampaign.objects.filter(pk=campaign.pk).update(
+            status=NewsletterCampaign.STATUS_DONE,
+            finished_at=timezone.now(),
+        )
+    campaign.refresh_from_db()
+
+    elapsed = time.monotonic() - started
+    rate = sent_total / elapsed if elapsed else 0.0
+    logger.info(
+        f"Рассылка {campaign.pk}: отправлено {sent_total}, ошибок {failed_total} "
+        f"за {elapsed:.1f} с ({rate:.1f} писем/с)"
+        + (", прервана: SMTP недоступен" if interrupted else "")
+    )
+    return {
+        'sent': sent_total,
+        'failed': failed_total,
+        'elapsed': elapsed,
+        'rate': rate,
+        'interrupted': interrupted,
+    }
@@ -0,0 +1,168 @@
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', 60)
+MAX_RETRY_DELAY = getattr(settings, 'OUTBOX_MAX_RETRY_DELAY', 3600)
+LEASE_SECONDS = getattr(settings, 'OUTBOX_LEASE_SECONDS', 300)
+
+# ошибки соединения, а не конкретного письма: попытки писем на них не расходуются
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+def _outbox_email(subject, message, recipient_list, html_message=None, from_email=None):
+    return OutboxEmail(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=','.join(recipient_list),
+    )
+
+
+def enqueue_email(subject, message, recipient_list, html_message=None, from_email=None):
+    """Кладёт письмо в outbox. Вызывается внутри текущей транзакции, SMTP не трогает."""
+    email = _outbox_email(subject, message, recipient_list, html_message, from_email)
+    email.save()
+    return email
+
+
+def enqueue_emails(emails):
+    """Кладёт пачку писем одним INSERT. emails — словари с аргументами enqueue_email."""
+    return OutboxEmail.objects.bulk_create([_outbox_email(**email) for email in emails])
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+
+
+def _due_filter(now):
+    # "sending" старше срока аренды - воркер упал посреди пачки, письмо забираем заново
+    return (
+        Q(status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=now) |
+        Q(status=OutboxEmail.STATUS_SENDING, locked_at__lt=now - timedelta(seconds=LEASE_SECONDS))
+    )
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    now = timezone.now()
+    ids = list(
+        OutboxEmail.objects.filter(_due_filter(now))
+        .order_by('next_attempt_at', 'id')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    # условный UPDATE: письмо достанется только одному из параллельных воркеров
+    OutboxEmail.objects.filter(_due_filter(now), pk__in=ids).update(
+        status=OutboxEmail.STATUS_SENDING,
+        locked_at=now,
+    )
+    return list(OutboxEmail.objects.filter(
+        pk__in=ids,
+        status=OutboxEmail.STATUS_SENDING,
+        locked_at=now,
+    ))
+
+
+def build_message(email, connection=None):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.recipients,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _mark_failed(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.locked_at = None
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = OutboxEmail.STATUS_DEAD
+        logger.error(f"Письмо {email.pk} не доставлено после {email.attempts} попыток: {error}")
+    else:
+        email.status = OutboxEmail.STATUS_PENDING
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+        logger.warning(f"Ошибка отправки письма {email.pk} (попытка {email.attempts}): {error}")
+    email.save(update_fields=['attempts', 'last_error', 'locked_at', 'status', 'next_attempt_at'])
+
+
+def _reschedule(emails, error):
+    """SMTP недоступен: письма не виноваты, откладываем их без расхода попыток."""
+    OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+        status=OutboxEmail.STATUS_PENDING,
+        locked_at=None,
+        last_error=str(error),
+        next_attempt_at=timezone.now() + timedelta(seconds=RETRY_DELAY),
+    )
+    logger.warning(f"Outbox: SMTP недоступен, {len(emails)} писем отложено на {RETRY_DELAY} с: {error}")
+
+
+def _mark_sent(email):
+    # отмечаем сразу: если воркер упадёт посреди пачки, доставленное не уйдёт повторно
+    OutboxEmail.objects.filter(pk=email.pk).update(
+        status=OutboxEmail.STATUS_SENT,
+        attempts=F('attempts') + 1,
+        sent_at=timezone.now(),
+        locked_at=None,
+        last_error='',
+    )
+
+
+def deliver_batch(batch_size=BATCH_SIZE):
+    """Отправляет одну пачку писем через одно SMTP-соединение. Возвращает (sent, failed)."""
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = 0
+    failed = 0
+    try:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+    except Exception as e:
+        _reschedule(emails, e)
+        return 0, len(emails)
+
+    try:
+        for index, email in enumerate(emails):
+            try:
+                build_message(email, connection).send()
+            except CONNECTION_ERRORS as e:
+                # соединение оборвалось: остаток пачки не тратит попытки на чужую ошибку
+                _reschedule(emails[index:], e)
+                failed += len(emails) - index
+                break
+            except Exception as e:
+                _mark_failed(email, e)
+                failed += 1
+            else:
+                _mark_sent(email)
+                sent += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    if sent:
+        logger.info(f"Outbox: отправлено {sent} писем")
+    return sent, failed
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+# сколько живёт блокировка пересчёта и сколько ждут её остальные запросы
+LOCK_TIMEOUT = getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 10)
+LOCK_WAIT = getattr(settings, 'PAGE_CACHE_LOCK_WAIT', 2.0)
+POLL_INTERVAL = 0.05
+
+VERSION_PREFIX = 'board:page:version:'
+PAGE_PREFIX = 'board:page:'
+# область, от которой зависит каждая страница: bump(ALL_SCOPE) сбрасывает кэш целиком,
+# например после выкладки новых шаблонов или перед замером промахов в run_bench
+ALL_SCOPE = '*'
+
+
+def _version_key(scope):
+    return VERSION_PREFIX + hashlib.md5(scope.encode()).hexdigest()
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # начальная версия от часов: после вытеснения ключа старые страницы не оживут
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Инвалидирует все страницы, зависящие от перечисленных областей."""
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_on_commit(*scopes):
+    """
+    bump после коммита текущей транзакции (вне транзакции — сразу).
+    Поднятая до коммита версия позволила бы параллельному запросу закэшировать
+    страницу со старыми данными уже под новой версией — до истечения TIMEOUT.
+    """
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def page_key(request, scopes):
+    versions = get_versions([ALL_SCOPE, *scopes])
+    raw = f'{request.get_full_path()}|{"|".join(scopes)}|{versions}'
+    return PAGE_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # всплывающее сообщение адресовано конкретному посетителю
+        and not len(get_messages(request))
+    )
+
+
+def _cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # страница с {% csrf_token %} содержит токен конкретного посетителя
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def _render(view, request, args, kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response = response.render()
+    return response
+
+
+def _from_cache(entry):
+    content, content_type = entry
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def cache_anonymous_page(scopes, timeout=None):
+    """
+    Кэширует целиком страницы для анонимных посетителей.
+    scopes(request, *args, **kwargs) возвращает области данных, от которых зависит страница;
+    их версии входят в ключ, а сигналы поднимают версии при записи (bump).
+    Пересчёт промаха — single-flight: страницу рендерит один запрос, остальные ждут результат.
+    """
+    timeout = TIMEOUT if timeout is None else timeout
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            key = page_key(request, scopes(request, *args, **kwargs))
+            entry = cache.get(key)
+            if entry is not None:
+                return _from_cache(entry)
+
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                deadline = time.monotonic() + LOCK_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(POLL_INTERVAL)
+                    entry = cache.get(key)
+                    if entry is not None:
+                        return _from_cache(entry)
+                    if cache.get(lock_key) is None:
+                        # владелец блокировки закончил, но страницу не сохранил (не кэшируемая)
+                        break
+                else:
+                    logger.warning(f"Кэш страниц: не дождались пересчёта {request.path}, рендерим сами")
+                return view(request, *args, **kwargs)
+
+            try:
+                response = _render(view, request, args, kwargs)
+                if _cacheable_response(request, response):
+                    cache.set(key, (response.content, response['Content-Type']), timeout)
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        @wraps(view)
+        async def async_wrapped(request, *args, **kwargs):
+            # request.user и шаблоны трогают БД, поэтому проверки — в синхронном потоке
+            if not await sync_to_async(_cacheable_request)(request):
+                return await view(request, *args, **kwargs)
+
+            key = await sync_to_async(page_key)(request, scopes(request, *args, **kwargs))
+            entry = await cache.aget(key)
+            if entry is not None:
+                return _from_cache(entry)
+
+            lock_key = f'{key}:lock'
+            if not await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+                deadline = time.monotonic() + LOCK_WAIT
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(POLL_INTERVAL)
+                    entry = await cache.aget(key)
+                    if entry is not None:
+                        return _from_cache(entry)
+                    if await cache.aget(lock_key) is None:
+                        break
+                else:
+                    logger.warning(f"Кэш страниц: не дождались пересчёта {request.path}, рендерим сами")
+                return await view(request, *args, **kwargs)
+
+            try:
+                response = await view(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response = await sync_to_async(response.render)()
+                if _cacheable_response(request, response):
+                    await cache.aset(key, (response.content, response['Content-Type']), timeout)
+                return response
+            finally:
+                await cache.adelete(lock_key)
+
+        return async_wrapped if asyncio.iscoroutinefunction(view) else wrapped
+
+    return decorator
+
+
+def home_scopes(request):
+    return ['ads', 'responses', 'categories', 'users']
+
+
+def ad_list_scopes(request):
+    # категория и курсор страницы уже входят в ключ через URL
+    return ['ads', 'categories']
+
+
+def ad_detail_scopes(request, pk):
+    return [f'ad:{pk}']
@@ -0,0 +1,159 @@
+import datetime
+from functools import cached_property
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+
+CURSOR_SALT = 'board.pagination.cursor'
+
+
+class CursorPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0])
+
+    @property
+    def first_query(self):
+        return self.paginator.build_query()
+
+    @property
+    def next_query(self):
+        return self.paginator.build_query(after=self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self.paginator.build_query(before=self.previous_cursor)
+
+
+class CursorPaginator:
+    """
+    Keyset-пагинация по упорядоченному набору полей, например ('-created', '-pk').
+    Последнее поле должно быть уникальным, чтобы порядок был полным.
+    Курсор подписан, его нельзя подделать, чтобы прочитать чужой срез.
+    """
+
+    def __init__(self, queryset, per_page, ordering, params=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.params = params if params is not None else QueryDict()
+
+    @cached_property
+    def count(self):
+        # полный COUNT(*) не нужен для навигации, считаем только по требованию шаблона
+        return self.queryset.count()
+
+    def _value(self, obj, name):
+        return getattr(obj, 'pk' if name == 'pk' else name)
+
+    def encode_cursor(self, obj):
+        values = []
+        for name, _ in self.ordering:
+            value = self._value(obj, name)
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps(values, salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor):
+        try:
+            values = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            return None
+
+        opts = self.queryset.model._meta
+        decoded = []
+        for (name, _), value in zip(self.ordering, values):
+            if name in self.queryset.query.annotations:
+                decoded.append(value)
+                continue
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            try:
+                decoded.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                # подписанный курсор от другого списка с другим порядком: начинаем сначала
+                return None
+        return decoded
+
+    def _keyset_filter(self, values, forward):
+        # (a, b) после (x, y): a > x OR (a = x AND b > y); направление берём из ordering
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending == forward else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[index]})
+            for prev_index in range(index):
+                term &= Q(**{self.ordering[prev_index][0]: values[prev_index]})
+            condition |= term
+        return condition
+
+    def _reversed_ordering(self):
+        return [name if descending else f'-{name}' for name, descending in self.ordering]
+
+    def page(self, after=None, before=None):
+        after_values = self.decode_cursor(after) if after else None
+        before_values = self.decode_cursor(before) if before else None
+
+        if before_values is not None:
+            rows = list(
+                self.queryset.filter(self._keyset_filter(before_values, forward=False))
+                .order_by(*self._reversed_ordering())[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return CursorPage(self, rows, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset
+        if after_values is not None:
+            queryset = queryset.filter(self._keyset_filter(after_values, forward=True))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(self, rows[:self.per_page], has_next=has_next, has_previous=after_values is not None)
+
+    def get_page(self, params=None):
+        params = params if params is not None else self.params
+        return self.page(after=params.get('after'), before=params.get('before'))
+
+    def build_query(self, after=None, before=None):
+        params = self.params.copy()
+        for key in ('page', 'after', 'before'):
+            params.pop(key, None)
+        if after:
+            params['after'] = after
+        if before:
+            params['before'] = before
+        return params.urlencode()
@@ -0,0 +1,231 @@
+import logging
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Ad, Response
+
+
+logger = logging.getLogger(__name__)
+
+AD_FTS_TABLE = 'board_ad_fts'
+RESPONSE_FTS_TABLE = 'board_response_fts'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Облегчённый стеммер для русского: отрезаем самые частые окончания, чтобы
+# "танки", "танков" и "танкам" попадали в один токен. Длинные окончания первыми.
+_RU_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ешь', 'ишь',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ов', 'ев', 'ах', 'ях',
+    'ам', 'ям', 'ом', 'ем', 'ую', 'юю', 'ию', 'ия', 'ть', 'ет', 'ют', 'ут', 'ат', 'ят',
+    'ит', 'ла', 'ли', 'ло', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+_MIN_STEM = 3
+
+
+def stem(word):
+    if len(word) <= _MIN_STEM or not _CYRILLIC_RE.search(word):
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    text = (text or '').lower().replace('ё', 'е')
+    return [stem(word) for word in _WORD_RE.findall(text)]
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))
+
+
+def build_match(query):
+    """Превращает пользовательский запрос в безопасное FTS5-выражение: все слова, по префиксу."""
+    return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+
+class SearchBackend:
+    """Интерфейс поиска. Бэкенд для Postgres (tsvector) реализует те же методы."""
+
+    def index_ad(self, ad):
+        pass
+
+    def remove_ad(self, pk):
+        pass
+
+    def index_response(self, response):
+        pass
+
+    def remove_response(self, pk):
+        pass
+
+    def reindex_ad_responses(self, ad):
+        pass
+
+    def reindex_user_responses(self, user):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        pass
+
+    def filter_ads(self, queryset, query):
+        raise NotImplementedError
+
+    def filter_responses(self, queryset, query):
+        raise NotImplementedError
+
+
+class LikeSearchBackend(SearchBackend):
+    """Старый путь через icontains: без индекса, но работает на любой БД."""
+
+    def filter_ads(self, queryset, query):
+        return queryset.filter(Q(title__icontains=query) | Q(content__icontains=query))
+
+    def filter_responses(self, queryset, query):
+        return queryset.filter(
+            Q(text__icontains=query) |
+            Q(ad__title__icontains=query) |
+            Q(from_user__username__icontains=query)
+        )
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """Виртуальные таблицы FTS5, rowid совпадает с pk модели, ранжирование bm25."""
+
+    # веса колонок для bm25: заголовок важнее текста
+    AD_WEIGHTS = (5.0, 1.0)
+    RESPONSE_WEIGHTS = (1.0, 3.0, 2.0)
+
+    def _execute(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def index_ad(self, ad):
+        self.remove_ad(ad.pk)
+        self._execute(
+            f'INSERT INTO {AD_FTS_TABLE}(rowid, title, content) VALUES (%s, %s, %s)',
+            [ad.pk, normalize(ad.title), normalize(ad.content)],
+        )
+
+    def remove_ad(self, pk):
+        self._execute(f'DELETE FROM {AD_FTS_TABLE} WHERE rowid = %s', [pk])
+
+    def index_response(self, response):
+        self.remove_response(response.pk)
+        self._execute(
+            f'INSERT INTO {RESPONSE_FTS_TABLE}(rowid, text, ad_title, username) VALUES (%s, %s, %s, %s)',
+            [response.pk, normalize(response.text), normalize(response.ad.title),
+             normalize(response.from_user.username)],
+        )
+
+    def remove_response(self, pk):
+        self._execute(f'DELETE FROM {RESPONSE_FTS_TABLE} WHERE rowid = %s', [pk])
+
+    def reindex_ad_responses(self, ad):
+        self._execute(
+            f'UPDATE {RESPONSE_FTS_TABLE} SET ad_title = %s WHERE rowid IN '
+            f'(SELECT id FROM {Response._meta.db_table} WHERE ad_id = %s)',
+            [normalize(ad.title), ad.pk],
+        )
+
+    def reindex_user_responses(self, user):
+        # переписываем только строки со старым именем: без переименования запрос ничего не меняет
+        username = normalize(user.username)
+        self._execute(
+            f'UPDATE {RESPONSE_FTS_TABLE} SET username = %s WHERE username != %s AND rowid IN '
+            f'(SELECT id FROM {Response._meta.db_table} WHERE from_user_id = %s)',
+            [username, username, user.pk],
+        )
+
+    def _insert_batched(self, cursor, sql, rows, batch_size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+    def rebuild(self, batch_size=1000):
+        ads = Ad.objects.values_list('pk', 'title', 'content').iterator(chunk_size=batch_size)
+        responses = Response.objects.values_list(
+            'pk', 'text', 'ad__title', 'from_user__username'
+        ).iterator(chunk_size=batch_size)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {AD_FTS_TABLE}')
+            cursor.execute(f'DELETE FROM {RESPONSE_FTS_TABLE}')
+            self._insert_batched(
+                cursor,
+                f'INSERT INTO {AD_FTS_TABLE}(rowid, title, content) VALUES (%s, %s, %s)',
+                ((pk, normalize(title), normalize(content)) for pk, title, content in ads),
+                batch_size,
+            )
+            self._insert_batched(
+                cursor,
+                f'INSERT INTO {RESPONSE_FTS_TABLE}(rowid, text, ad_title, username) VALUES (%s, %s, %s, %s)',
+                ((pk, normalize(text), normalize(ad_title), normalize(username))
+                 for pk, text, ad_title, username in responses),
+                batch_size,
+            )
+            cursor.execute(f"INSERT INTO {AD_FTS_TABLE}({AD_FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f"INSERT INTO {RESPONSE_FTS_TABLE}({RESPONSE_FTS_TABLE}) VALUES ('optimize')")
+
+    def _filter(self, queryset, query, fts_table, weights):
+        match = build_match(query)
+        if not match:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        bm25_args = ', '.join(str(weight) for weight in weights)
+        # отбор — один MATCH по всей FTS-таблице; bm25 считается только для найденных строк,
+        # поиском по rowid внутри того же MATCH
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match]),
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT bm25({fts_table}, {bm25_args}) FROM {fts_table} '
+                f'WHERE {fts_table} MATCH %s AND {fts_table}.rowid = "{table}"."id"',
+                [match],
+            )
+        ).order_by('search_rank', '-pk')
+
+    def filter_ads(self, queryset, query):
+        return self._filter(queryset, query, AD_FTS_TABLE, self.AD_WEIGHTS)
+
+    def filter_responses(self, queryset, query):
+        return self._filter(queryset, query, RESPONSE_FTS_TABLE, self.RESPONSE_WEIGHTS)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    backend_path = getattr(settings, 'SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    return LikeSearchBackend()
+
+
+def search_ads(queryset, query):
+    return get_backend().filter_ads(queryset, query)
+
+
+def search_responses(queryset, query):
+    return get_backend().filter_responses(queryset, query)
+
+
+def result_ordering(queryset, default):
+    """Порядок для keyset-пагинации: по релевантности, если запрос ранжирован бэкендом."""
+    if 'search_rank' in queryset.query.annotations:
+        return ('search_rank', '-pk')
+    return default
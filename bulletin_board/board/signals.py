@@ -1,13 +1,18 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Response, Ad
+from .models import Response, Ad, Category, NewsletterCampaign, SiteCounter, Tombstone
+from .newsletter import run_campaign
+from .outbox import enqueue_email
+from .emails import response_accepted_email, ad_created_email
+from .digests import notify_new_response
+from .images import delete_renditions_on_commit, schedule_ad_image
+from . import stats, pagecache
+from .categories import registry as category_registry
+from .search import get_backend as get_search_backend
 import logging
-from django.core.mail import send_mass_mail
-from django.contrib.auth.models import User
 
 
 logger = logging.getLogger(__name__) #
@@ -17,146 +22,203 @@ logger = logging.getLogger(__name__) #
 def send_response_email(sender, instance, created, **kwargs):
     if created:
         try:
-            ad = instance.ad
-            author = ad.author
-            responder = instance.from_user
-            subject = f'Новый отклик на ваше объявление "{ad.title}"'
-            html_message = render_to_string('board/emails/new_response.html', {
-                'ad': ad,
-                'response': instance,
-                'author': author,
-                'responder': responder,
-                'site_name': 'MMORPG Форум'
-            })
-            plain_message = f"""
-            Здравствуйте, {author.username}!
-
-            Пользователь {responder.username} оставил отклик на ваше объявление "{ad.title}".
-
-            Текст отклика:
-            {instance.text}
-
-            Вы можете просмотреть и принять отклик в личном кабинете:
-            {settings.SITE_URL}/bulletin-board/responses/
-
-            С уважением,
-            Команда MMORPG Форума
-            """
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[author.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-            logger.info(f"Email отправлен автору {author.email} о новом отклике на объявление {ad.id}")
+            notification = notify_new_response(instance)
+            if notification is not None:
+                logger.info(f"Уведомление автору объявления {instance.ad_id} о новом отклике поставлено в очередь")
 
         except Exception as e:
-            logger.error(f"Ошибка отправки email о новом отклике: {e}")
+            logger.error(f"Ошибка постановки в очередь email о новом отклике: {e}")
 
 
 @receiver(post_save, sender=Response)
-def send_response_accepted_email(sender, instance, **kwargs):
-    if instance.pk:
+def send_response_accepted_email(sender, instance, created, **kwargs):
+    if not created and instance.has_changed('is_accepted') and instance.is_accepted:
         try:
-            old_response = Response.objects.get(pk=instance.pk)
-            if not old_response.is_accepted and instance.is_accepted:
-                ad = instance.ad
-                responder = instance.from_user
-                author = ad.author
-                subject = f'Ваш отклик на объявление "{ad.title}" принят!'
-                html_message = render_to_string('board/emails/response_accepted.html', {
-                    'ad': ad,
-                    'response': instance,
-                    'responder': responder,
-                    'author': author,
-                    'site_name': 'MMORPG Форум'
-                })
-                plain_message = f"""
-                Поздравляем, {responder.username}!
-
-                Автор {author.username} принял ваш отклик на объявление "{ad.title}".
-
-                Теперь вы можете связаться с автором для дальнейшего обсуждения:
-                Email автора: {author.email}
-
-                Текст вашего отклика:
-                {instance.text}
-
-                С уважением,
-                Команда MMORPG Форума
-                """
-                send_mail(
-                    subject=subject,
-                    message=plain_message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[responder.email],
-                    html_message=html_message,
-                    fail_silently=False,
-                )
-                logger.info(f"Email отправлен {responder.email} о принятии отклика на объявление {ad.id}")
-
-        except Response.DoesNotExist:
-            pass
+            enqueue_email(**response_accepted_email(instance))
+            logger.info(f"Email {instance.from_user.email} о принятии отклика на объявление {instance.ad_id} поставлен в очередь")
+
         except Exception as e:
-            logger.error(f"Ошибка отправки email о принятии отклика: {e}")
+            logger.error(f"Ошибка постановки в очередь email о принятии отклика: {e}")
 
 
 @receiver(post_save, sender=Ad)
 def send_ad_created_email(sender, instance, created, **kwargs):
     if created:
         try:
-            author = instance.author
-            subject = f'Ваше объявление "{instance.title}" успешно создано!'
-            html_message = render_to_string('board/emails/ad_created.html', {
-                'ad': instance,
-                'author': author,
-                'site_name': 'MMORPG Форум'
-            })
+            email = ad_created_email(instance)
+            enqueue_email(**email)
+            logger.info(f"Email автору {email['recipient_list'][0]} о создании объявления {instance.id} поставлен в очередь")
+
+        except Exception as e:
+            logger.error(f"Ошибка постановки в очередь email о создании объявления: {e}")
+
+
+@receiver(post_save, sender=Ad)
+def update_ad_stats(sender, instance, created, **kwargs):
+    if created:
+        if instance.is_active:
+            stats.bump_active_ads(instance.category_id, 1)
+        return
+    if not instance.has_changed('is_active') and not instance.has_changed('category_id'):
+        return
+
+    was_active = instance.get_loaded_value('is_active')
+    old_category_id = instance.get_loaded_value('category_id')
+    if was_active is None:
+        was_active = instance.is_active
+    if old_category_id is None:
+        old_category_id = instance.category_id
+    if was_active:
+        stats.bump_active_ads(old_category_id, -1)
+    if instance.is_active:
+        stats.bump_active_ads(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Ad)
+def update_ad_stats_on_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        stats.bump_active_ads(instance.category_id, -1)
 
-            plain_message = f"""
-            Здравствуйте, {author.username}!
 
-            Ваше объявление "{instance.title}" успешно создано и опубликовано на MMORPG Форуме.
+@receiver(post_save, sender=Response)
+def update_response_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.bump_responses(instance.created_at, 1)
+        stats.invalidate_ad_response_count(instance.ad_id)
 
-            Категория: {instance.category.name}
-            Дата создания: {instance.created.strftime('%d.%m.%Y %H:%M')}
 
-            Вы можете просмотреть своё объявление по ссылке:
-            {settings.SITE_URL}/bulletin-board/{instance.pk}/
+@receiver(post_delete, sender=Response)
+def update_response_stats_on_delete(sender, instance, **kwargs):
+    stats.bump_responses(instance.created_at, -1)
+    stats.invalidate_ad_response_count(instance.ad_id)
 
-            Управлять откликами можно в личном кабинете:
-            {settings.SITE_URL}/bulletin-board/responses/
 
-            С уважением,
-            Команда MMORPG Форума
-            """
+@receiver(post_save, sender=User)
+def update_user_stats(sender, instance, created, **kwargs):
+    if created:
+        stats.bump_counter(SiteCounter.USERS, 1)
 
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[author.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
 
-            logger.info(f"Email отправлен автору {author.email} о создании объявления {instance.id}")
+@receiver(post_delete, sender=User)
+def update_user_stats_on_delete(sender, instance, **kwargs):
+    stats.bump_counter(SiteCounter.USERS, -1)
 
-        except Exception as e:
-            logger.error(f"Ошибка отправки email о создании объявления: {e}")
+
+@receiver(post_save, sender=Ad)
+def update_ad_search_index(sender, instance, created, **kwargs):
+    if not (created or instance.has_changed('title') or instance.has_changed('content')):
+        return
+    backend = get_search_backend()
+    backend.index_ad(instance)
+    if not created and instance.has_changed('title'):
+        backend.reindex_ad_responses(instance)
+
+
+@receiver(post_delete, sender=Ad)
+def remove_ad_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove_ad(instance.pk)
+
+
+@receiver(post_save, sender=Ad)
+def sync_response_ad_author(sender, instance, created, **kwargs):
+    # Response.ad_author — копия ad.author: при передаче объявления переносим отклики одним UPDATE,
+    # updated_at двигаем, чтобы они попали в ленту изменений API нового автора
+    if created or not instance.has_changed('author_id'):
+        return
+    Response.objects.filter(ad_id=instance.pk).update(ad_author_id=instance.author_id, updated_at=timezone.now())
+    pagecache.bump_on_commit('responses')
+
+
+@receiver(post_save, sender=Response)
+def update_response_search_index(sender, instance, created, **kwargs):
+    if created or instance.has_changed('text'):
+        get_search_backend().index_response(instance)
+
+
+@receiver(post_delete, sender=Response)
+def remove_response_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove_response(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def update_username_in_search_index(sender, instance, created, update_fields=None, **kwargs):
+    # имя автора входит в индекс откликов; вход в систему сохраняет только last_login — его пропускаем
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    get_search_backend().reindex_user_responses(instance)
+
+
+@receiver(post_save, sender=Ad)
+def process_ad_image(sender, instance, created, **kwargs):
+    if not (created or instance.has_changed('image')):
+        return
+    if not created and instance.image_renditions:
+        # копии прежней картинки больше не нужны: сбрасываем ссылки и удаляем файлы после коммита
+        delete_renditions_on_commit(instance.image_renditions, str(instance.get_loaded_value('image') or ''))
+        Ad.objects.filter(pk=instance.pk).update(image_renditions={})
+        instance.image_renditions = {}
+    schedule_ad_image(instance)
+
+
+@receiver(post_delete, sender=Ad)
+def delete_ad_renditions(sender, instance, **kwargs):
+    # строки уже нет: отложенное поле не догрузить
+    if 'image_renditions' not in instance.get_deferred_fields() and instance.image_renditions:
+        delete_renditions_on_commit(instance.image_renditions, instance.image.name or '')
+
+
+@receiver(post_delete, sender=Ad)
+def record_ad_tombstone(sender, instance, **kwargs):
+    # лента изменений API (since=) сообщает клиентам об удалении по этим записям
+    Tombstone.objects.create(kind=Tombstone.KIND_AD, object_id=instance.pk, ad_id=instance.pk,
+                             author_id=instance.author_id, category_id=instance.category_id)
+
+
+@receiver(post_delete, sender=Response)
+def record_response_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=Tombstone.KIND_RESPONSE, object_id=instance.pk, ad_id=instance.ad_id,
+                             author_id=instance.ad_author_id, from_user_id=instance.from_user_id)
+
+
+@receiver(post_save, sender=Ad)
+@receiver(post_delete, sender=Ad)
+def invalidate_ad_pages(sender, instance, **kwargs):
+    pagecache.bump_on_commit('ads', f'ad:{instance.pk}')
+
+
+@receiver(post_save, sender=Response)
+@receiver(post_delete, sender=Response)
+def invalidate_response_pages(sender, instance, **kwargs):
+    # число откликов видно на карточках списка и на главной
+    pagecache.bump_on_commit('ads', 'responses', f'ad:{instance.ad_id}')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    # версию поднимаем после коммита: иначе другой процесс успеет перечитать
+    # ещё старые строки уже под новой версией и будет отдавать их до следующей правки
+    transaction.on_commit(category_registry.invalidate)
+    pagecache.bump_on_commit('categories')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, created, **kwargs):
+    if created:
+        pagecache.bump_on_commit('users')
 
 
 def send_newsletter_to_all_users(subject, message, html_message=None):
     try:
-        users = User.objects.filter(is_active=True, profile__email_notifications=True)
-        email_list = [(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
-                      for user in users]
-        send_mass_mail(email_list, fail_silently=False)
-        logger.info(f"Рассылка отправлена {len(email_list)} пользователям")
-        return len(email_list)
+        campaign = NewsletterCampaign.objects.create(
+            subject=subject,
+            message=message,
+            html_message=html_message or '',
+        )
+        stats = run_campaign(campaign)
+        logger.info(f"Рассылка отправлена {stats['sent']} пользователям ({stats['rate']:.1f} писем/с)")
+        return stats['sent']
 
     except Exception as e:
         logger.error(f"Ошибка отправки рассылки: {e}")
-        return 0
\ No newline at end of file
+        return 0
@@ -0,0 +1,99 @@
+import logging
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Ad, Category, CategoryCounter, Response, ResponseBucket, SiteCounter
+
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_WINDOW = timedelta(hours=24)
+AD_RESPONSE_COUNT_TIMEOUT = 60 * 60
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+# Строку счётчика создаём только при положительной дельте: отрицательная без строки
+# означает каскадное удаление, когда считать уже нечего.
+def bump_counter(name, delta):
+    if not SiteCounter.objects.filter(name=name).update(value=F('value') + delta) and delta > 0:
+        SiteCounter.objects.get_or_create(name=name)
+        SiteCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def bump_category(category_id, delta):
+    if not CategoryCounter.objects.filter(category_id=category_id).update(active_ads=F('active_ads') + delta) and delta > 0:
+        CategoryCounter.objects.get_or_create(category_id=category_id)
+        CategoryCounter.objects.filter(category_id=category_id).update(active_ads=F('active_ads') + delta)
+
+
+def bump_active_ads(category_id, delta):
+    bump_counter(SiteCounter.ACTIVE_ADS, delta)
+    bump_category(category_id, delta)
+
+
+def bump_responses(created_at, delta):
+    hour = _hour(created_at)
+    if timezone.now() - hour > RESPONSE_WINDOW + timedelta(hours=1):
+        return  # бакет уже вне окна, считать незачем
+    if not ResponseBucket.objects.filter(hour=hour).update(count=F('count') + delta) and delta > 0:
+        ResponseBucket.objects.get_or_create(hour=hour)
+        ResponseBucket.objects.filter(hour=hour).update(count=F('count') + delta)
+
+
+def _ad_response_count_key(ad_id):
+    return f'board:ad:{ad_id}:response_count'
+
+
+def get_ad_response_count(ad_id):
+    return cache.get_or_set(
+        _ad_response_count_key(ad_id),
+        lambda: Response.objects.filter(ad_id=ad_id).count(),
+        AD_RESPONSE_COUNT_TIMEOUT,
+    )
+
+
+def invalidate_ad_response_count(ad_id):
+    cache.delete(_ad_response_count_key(ad_id))
+
+
+def get_site_stats():
+    counters = dict(SiteCounter.objects.values_list('name', 'value'))
+    since = _hour(timezone.now() - RESPONSE_WINDOW)
+    response_count = ResponseBucket.objects.filter(hour__gte=since).aggregate(total=Sum('count'))['total']
+    return {
+        'user_count': counters.get(SiteCounter.USERS, 0),
+        'ad_count': counters.get(SiteCounter.ACTIVE_ADS, 0),
+        'response_count': response_count or 0,
+    }
+
+
+@transaction.atomic
+def reconcile():
+    """Пересчитывает все счётчики с нуля по основным таблицам."""
+    SiteCounter.objects.update_or_create(name=SiteCounter.USERS, defaults={'value': User.objects.count()})
+    SiteCounter.objects.update_or_create(
+        name=SiteCounter.ACTIVE_ADS,
+        defaults={'value': Ad.objects.filter(is_active=True).count()},
+    )
+
+    categories = Category.objects.annotate(active=Count('ad', filter=Q(ad__is_active=True)))
+    for category in categories:
+        CategoryCounter.objects.update_or_create(category=category, defaults={'active_ads': category.active})
+
+    since = _hour(timezone.now() - RESPONSE_WINDOW)
+    ResponseBucket.objects.all().delete()
+    hours = {}
+    for created_at in Response.objects.filter(created_at__gte=since).values_list('created_at', flat=True).iterator():
+        hour = _hour(created_at)
+        hours[hour] = hours.get(hour, 0) + 1
+    ResponseBucket.objects.bulk_create([ResponseBucket(hour=hour, count=count) for hour, count in hours.items()])
+
+    logger.info(f"Статистика пересчитана: категорий {len(categories)}, часовых бакетов {len(hours)}")
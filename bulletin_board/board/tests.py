@@ -1,3 +1,1246 @@
-from django.test import TestCase
+import re
+import shutil
+import smtplib
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from accounts.models import Profile
+from .models import (
+    Category, CategoryCounter, Ad, Response, ResponseBucket, SiteCounter, NewsletterCampaign, OutboxEmail,
+    PendingNotification,
+)
+from .categories import registry as category_registry
+from .emails import new_response_email
+from .digests import send_digests
+from .moderation import accept_responses, reject_responses
+from .newsletter import run_campaign
+from .bench import driver, seed
+from . import api, concurrency, images, instrumentation, outbox, pagecache, search, stats
+from .outbox import enqueue_email
+from .search import search_ads, search_responses, result_ordering
+from .pagination import CURSOR_SALT, CursorPaginator
+from .views import RESPONSES_PAGE_SIZE
+
+
+# таблицы, которые растут вместе с сайтом: по ним полный скан недопустим
+LARGE_TABLES = ('board_ad', 'board_response', 'board_tombstone', 'auth_user', 'accounts_profile')
+_FULL_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Прогоняет горячие страницы, снимает все их SELECT-запросы и проверяет
+    EXPLAIN QUERY PLAN: ни полного скана больших таблиц, ни временного B-дерева для сортировки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.responder = User.objects.create_user('responder', 'responder@example.com', 'password123')
+        cls.category = Category.objects.create(name='Танки')
+        cls.ad = Ad.objects.create(title='Ищем танка', content='В гильдию нужен танк',
+                                   author=cls.author, category=cls.category)
+        Response.objects.create(text='Готов помочь', from_user=cls.responder, ad=cls.ad)
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN есть только в SQLite')
+        # страница из кэша не выполняет запросов, и проверять было бы нечего
+        cache.clear()
+
+    def assertIndexedPlan(self, sql, params=(), label=''):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            steps = [row[-1] for row in cursor.fetchall()]
+        for step in steps:
+            self.assertNotIn('TEMP B-TREE', step, f'{label}: сортировка без индекса\n{sql}')
+            match = _FULL_SCAN_RE.match(step)
+            if match:
+                self.assertNotIn(match.group(1), LARGE_TABLES, f'{label}: полный скан\n{sql}')
+
+    def assertIndexedQuerysets(self, *querysets):
+        for queryset in querysets:
+            sql, params = queryset.query.sql_with_params()
+            self.assertIndexedPlan(sql, params, label=str(queryset.model.__name__))
+
+    def assertIndexedPlans(self, url, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for query in queries.captured_queries:
+            if query['sql'].lstrip().upper().startswith('SELECT'):
+                self.assertIndexedPlan(query['sql'], label=url)
+
+    def test_home(self):
+        self.assertIndexedPlans(reverse('home'))
+
+    def test_ad_list(self):
+        self.assertIndexedPlans(reverse('ad_list'))
+
+    def test_ad_list_by_category(self):
+        self.assertIndexedPlans(f"{reverse('ad_list')}?category={self.category.name}")
+
+    def test_ad_list_next_page(self):
+        for index in range(12):
+            Ad.objects.create(title=f'Объявление {index}', content='Текст', author=self.author, category=self.category)
+        page = self.client.get(reverse('ad_list')).context['page_obj']
+        self.assertIndexedPlans(f"{reverse('ad_list')}?{page.next_query}")
+
+    def test_my_responses(self):
+        for filter_type in ('all', 'accepted', 'pending', 'my'):
+            with self.subTest(filter_type=filter_type):
+                self.assertIndexedPlans(f"{reverse('my_responses')}?filter={filter_type}", user=self.author)
+
+    def test_profile(self):
+        self.assertIndexedPlans(reverse('profile'), user=self.author)
+
+    def test_api_ads(self):
+        self.assertIndexedPlans(reverse('api_ad_list'))
+
+    def test_api_ads_since(self):
+        since = urlencode({'since': (timezone.now() - timedelta(days=1)).isoformat()})
+        self.assertIndexedPlans(f"{reverse('api_ad_list')}?{since}")
+
+    def test_api_responses_since(self):
+        since = urlencode({'since': (timezone.now() - timedelta(days=1)).isoformat()})
+        self.assertIndexedPlans(f"{reverse('api_response_list')}?{since}", user=self.author)
+
+    def test_api_responses(self):
+        self.assertIndexedPlans(reverse('api_response_list'), user=self.author)
+
+    def test_public_profile(self):
+        # у public_profile_view нет шаблона, поэтому проверяем его запросы напрямую
+        user_ads = Ad.objects.filter(author=self.author, is_active=True)
+        self.assertIndexedQuerysets(user_ads.order_by('-created')[:10], user_ads.values('pk'))
+
+
+# Объявленные бюджеты запросов на страницу. Превышение или рост числа запросов
+# вместе с объёмом данных (N+1) валит тест, а не проявляется задержкой в проде.
+QUERY_BUDGETS = {
+    'home': 5,
+    'ad_list': 3,
+    'ad_detail': 10,
+    'my_responses': 10,
+    'profile': 11,
+}
+
+
+@override_settings(ACTIVITY_FLUSH_INTERVAL=10 ** 9)
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.category = Category.objects.create(name='Хилы')
+        cls.ad = Ad.objects.create(title='Нужен хил', content='Рейд в субботу', author=cls.author, category=cls.category)
+        cls.add_rows(1)
+
+    def setUp(self):
+        # кэш общий на процесс: данные прошлых тестов с теми же pk не должны давать попаданий
+        cache.clear()
+        # справочник категорий грузится один раз на процесс, бюджет считаем для прогретого
+        category_registry.invalidate()
+        category_registry.all()
+
+    @classmethod
+    def add_rows(cls, count):
+        start = User.objects.count()
+        for index in range(start, start + count):
+            user = User.objects.create_user(f'player{index}', f'player{index}@example.com', 'password123')
+            ad = Ad.objects.create(title=f'Объявление {index}', content='Текст', author=cls.author, category=cls.category)
+            Response.objects.create(text='Отклик', from_user=user, ad=ad)
+            Response.objects.create(text='Отклик', from_user=user, ad=cls.ad)
+            Ad.objects.create(title=f'Своё объявление {index}', content='Текст', author=user, category=cls.category)
+            Response.objects.create(text='Ответ', from_user=cls.author, ad=Ad.objects.filter(author=user).first())
+
+    def count_queries(self, url, user=None):
+        self.client.logout()
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertQueryBudget(self, name, url, user=None):
+        small = self.count_queries(url, user)
+        # версии кэша страниц поднимаются после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_rows(5)
+        large = self.count_queries(url, user)
+        self.assertEqual(small, large, f'{name}: число запросов растёт вместе с данными ({small} → {large})')
+        self.assertLessEqual(large, QUERY_BUDGETS[name], f'{name}: {large} запросов при бюджете {QUERY_BUDGETS[name]}')
+
+    def test_home(self):
+        self.assertQueryBudget('home', reverse('home'))
+
+    def test_ad_list(self):
+        self.assertQueryBudget('ad_list', reverse('ad_list'))
+
+    def test_ad_detail(self):
+        self.assertQueryBudget('ad_detail', reverse('ad_detail', args=[self.ad.pk]), user=self.author)
+
+    def test_my_responses(self):
+        self.assertQueryBudget('my_responses', reverse('my_responses'), user=self.author)
+
+    def test_profile(self):
+        self.assertQueryBudget('profile', reverse('profile'), user=self.author)
+
+    def test_async_views_load_user_once(self):
+        self.client.force_login(self.author)
+        for name in ('my_responses', 'profile'):
+            with self.subTest(name=name), CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(name))
+            user_loads = [query for query in queries.captured_queries
+                          if re.match(r'SELECT .* FROM "auth_user" WHERE "auth_user"."id" = ', query['sql'])]
+            self.assertEqual(len(user_loads), 1, name)
+
+
+@override_settings(ACTIVITY_FLUSH_INTERVAL=10 ** 9)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.category = Category.objects.create(name='Крафт')
+        cls.ad = Ad.objects.create(title='Продам руду', content='Много руды', author=cls.author, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_served_from_cache(self):
+        url = reverse('ad_detail', args=[self.ad.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(len(queries), 0)
+
+    def test_write_invalidates_page(self):
+        url = reverse('ad_list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ad.objects.create(title='Куплю руду', content='Дорого', author=self.author, category=self.category)
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Куплю руду')
+
+    def test_other_ad_page_stays_cached(self):
+        url = reverse('ad_detail', args=[self.ad.pk])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Response.objects.create(text='Беру', from_user=self.author,
+                                    ad=Ad.objects.create(title='Другое', content='Текст', author=self.author,
+                                                         category=self.category))
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+
+    def test_invalidation_waits_for_commit(self):
+        url = reverse('ad_list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ad.objects.create(title='Куплю кирку', content='Дорого', author=self.author, category=self.category)
+            # до коммита версия прежняя: страница из кэша, новые данные в неё не попадут
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        self.assertContains(self.client.get(url), 'Куплю кирку')
+
+    def test_authenticated_bypasses_cache(self):
+        url = reverse('home')
+        self.client.get(url)
+        self.client.force_login(self.author)
+        self.assertFalse(self.client.get(url).has_header('X-Page-Cache'))
+
+
+class CategoryRegistryTests(TestCase):
+
+    def test_lookup_without_queries_after_load(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name='Зельевары', description='Зелья, эликсиры')
+        category_registry.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(category_registry.id_for_name('Зельевары'), category.pk)
+            self.assertEqual(category_registry.hints(), {'Зельевары': 'Зелья, эликсиры'})
+
+    def test_invalidated_on_save_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name='Кузнецы')
+        category_registry.all()
+        category.name = 'Оружейники'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+            # до коммита справочник не сбрасывается
+            self.assertEqual(category_registry.id_for_name('Кузнецы'), category.pk)
+        self.assertIsNone(category_registry.id_for_name('Кузнецы'))
+        self.assertEqual(category_registry.id_for_name('Оружейники'), category.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.assertEqual(category_registry.all(), [])
+
+
+class EmailRenderingTests(TestCase):
+
+    def test_parts_rendered_from_same_context(self):
+        author = User.objects.create_user('email_author', 'author@example.com', 'pass')
+        responder = User.objects.create_user('email_responder', 'responder@example.com', 'pass')
+        ad = Ad.objects.create(title='Рейд <в субботу>', content='Текст', author=author,
+                               category=Category.objects.create(name='Танки'))
+        response = Response.objects.create(ad=ad, from_user=responder, text='Беру & иду')
+
+        email = new_response_email(response)
+        self.assertEqual(email['recipient_list'], ['author@example.com'])
+        # текстовая часть не экранируется, HTML — экранируется
+        self.assertIn('Беру & иду', email['message'])
+        self.assertIn('Беру &amp; иду', email['html_message'])
+        self.assertIn('Рейд &lt;в субботу&gt;', email['html_message'])
+        self.assertIn(f'{settings.SITE_URL}/bulletin-board/responses/', email['message'])
+        self.assertIn(f'{settings.SITE_URL}/bulletin-board/responses/', email['html_message'])
+
+
+class DigestTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user('digest_author', 'author@example.com', 'pass')
+        self.ad = Ad.objects.create(title='Рейд', content='Текст', author=self.author,
+                                    category=Category.objects.create(name='Танки'))
+        OutboxEmail.objects.all().delete()
+
+    def _respond(self, count):
+        # один пользователь — один отклик на объявление, поэтому откликаются разные
+        for i in range(count):
+            responder = User.objects.create_user(f'digest_responder_{i}', f'responder{i}@example.com', 'pass')
+            Response.objects.create(ad=self.ad, from_user=responder, text=f'Отклик {i}')
+
+    def test_hourly_digest_sends_one_email(self):
+        Profile.objects.filter(user=self.author).update(response_notifications=Profile.NOTIFY_HOURLY)
+        self._respond(3)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+        self.assertEqual(send_digests(Profile.NOTIFY_HOURLY), (1, 3))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, 'author@example.com')
+        self.assertIn('Отклик 2', email.body)
+        self.assertFalse(PendingNotification.objects.exists())
+
+    def test_off_sends_nothing(self):
+        Profile.objects.filter(user=self.author).update(response_notifications=Profile.NOTIFY_OFF)
+        self._respond(2)
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertFalse(PendingNotification.objects.exists())
+
+
+class BenchTests(TestCase):
+
+    def test_seed_fills_denormalized_author(self):
+        Category.objects.create(name='Танки')
+        created = seed.seed(users=3, ads=5, responses=20, batch_size=4, random_seed=1, log=lambda message: None)
+        self.assertEqual(Ad.objects.count(), 5)
+        # 3 пользователя × 5 объявлений: повторные пары (from_user, ad) пропускаются
+        self.assertGreater(created['responses'], 0)
+        self.assertEqual(Response.objects.count(), created['responses'])
+        self.assertFalse(Response.objects.exclude(ad_author=F('ad__author')).exists())
+        self.assertEqual(Profile.objects.filter(user__username__startswith=seed.USERNAME_PREFIX).count(), 3)
+
+    def test_every_route_resolves(self):
+        Category.objects.create(name='Танки')
+        seed.seed(users=2, ads=2, responses=2, random_seed=1, log=lambda message: None)
+        data = driver.fixtures()
+        routes = driver.discover_routes(include_unsafe=True)
+        self.assertIn('ad_list', [name for _, name, _ in routes])
+        for _, name, params in routes:
+            driver.route_path(name, params, data)
+
+    def test_run_reports_route_errors_and_skips_page_cache(self):
+        Category.objects.create(name='Танки')
+        seed.seed(users=2, ads=2, responses=2, random_seed=1, log=lambda message: None)
+        cache.clear()
+        with mock.patch.object(pagecache, '_from_cache', wraps=pagecache._from_cache) as from_cache:
+            report = driver.run(3, anonymous=True, only={'ad_list', 'ad_delete'}, log=lambda line: None)
+        # у ad_delete нет шаблона подтверждения: ошибка в отчёте, прогон не прерван
+        self.assertIn('TemplateDoesNotExist', report['routes']['ad_delete']['error'])
+        self.assertEqual(report['routes']['ad_list']['status'], 200)
+        self.assertGreater(report['routes']['ad_list']['queries'], 0)
+        # прогрев может попасть в кэш, замеры — нет
+        self.assertLessEqual(from_cache.call_count, 1)
+
+    def test_record_queries_restores_parallel(self):
+        parallel = concurrency.PARALLEL
+        with self.assertRaises(RuntimeError):
+            with driver.record_queries():
+                self.assertFalse(concurrency.PARALLEL)
+                raise RuntimeError
+        self.assertEqual(concurrency.PARALLEL, parallel)
+
+
+@override_settings(MIDDLEWARE=['board.instrumentation.QueryInstrumentationMiddleware'] + settings.MIDDLEWARE)
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.aggregates.reset()
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            instrumentation.fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 5'),
+            instrumentation.fingerprint('SELECT * FROM t WHERE id IN (%s) AND x = 7'),
+        )
+
+    def test_request_recorded_by_route_name(self):
+        response = self.client.get(reverse('ad_list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        stats = instrumentation.aggregates.snapshot()['ad_list']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['avg_queries'], 0)
+
+    @override_settings(SQL_INSTRUMENTATION_MAX_QUERIES=1)
+    def test_thresholds_read_at_request_time(self):
+        with self.assertLogs('board.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('ad_list'))
+        self.assertIn('GET ad_list:', logs.output[0])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('search_author', 'search@example.com', 'pass')
+        self.category = Category.objects.create(name='Танки')
+
+    def _ad(self, title, content='Текст'):
+        return Ad.objects.create(title=title, content=content, author=self.user, category=self.category)
+
+    def _found(self, query):
+        return list(search_ads(Ad.objects.all(), query).values_list('pk', flat=True))
+
+    def test_stemmer(self):
+        self.assertEqual(search.stem('танками'), 'танк')
+        self.assertEqual(search.stem('танки'), 'танк')
+        self.assertEqual(search.stem('танков'), 'танк')
+        # короткие и латинские слова не трогаем
+        self.assertEqual(search.stem('лук'), 'лук')
+        self.assertEqual(search.stem('tanks'), 'tanks')
+        self.assertEqual(search.normalize('Зелья ЛЕЧЕНИЯ, ёж'), 'зель лечен еж')
+
+    def test_title_ranks_above_content(self):
+        in_content = self._ad('Ищу группу', 'Нужны танки в рейд')
+        in_title = self._ad('Танки в рейд', 'Ищу группу')
+        self._ad('Продам зелья', 'Недорого')
+        self.assertEqual(self._found('танк'), [in_title.pk, in_content.pk])
+
+    def test_ranked_results_paginate(self):
+        ads = [self._ad(f'Танк {i}', 'танк ' * i) for i in range(1, 6)]
+        queryset = search_ads(Ad.objects.all(), 'танк')
+        paginator = CursorPaginator(queryset, 2, result_ordering(queryset, ('-created', '-pk')))
+        seen = []
+        page = paginator.page()
+        while True:
+            seen.extend(ad.pk for ad in page)
+            if not page.has_next():
+                break
+            page = paginator.page(after=page.next_cursor)
+        self.assertEqual(sorted(seen), sorted(ad.pk for ad in ads))
+
+    def test_index_follows_update_and_delete(self):
+        ad = self._ad('Продам меч')
+        responder = User.objects.create_user('search_responder', 'responder@example.com', 'pass')
+        Response.objects.create(ad=ad, from_user=responder, text='Беру')
+        self.assertEqual(self._found('меч'), [ad.pk])
+
+        ad.title = 'Продам щит'
+        ad.save()
+        self.assertEqual(self._found('меч'), [])
+        self.assertEqual(self._found('щит'), [ad.pk])
+        # заголовок объявления в индексе откликов тоже обновился
+        self.assertEqual(search_responses(Response.objects.all(), 'щит').count(), 1)
+
+        ad.delete()
+        self.assertEqual(self._found('щит'), [])
+
+    def test_response_index_follows_username_change(self):
+        ad = self._ad('Продам меч')
+        responder = User.objects.create_user('Ворон', 'raven@example.com', 'pass')
+        response = Response.objects.create(ad=ad, from_user=responder, text='Беру')
+        self.assertEqual(list(search_responses(Response.objects.all(), 'ворон')), [response])
+
+        responder.username = 'Сокол'
+        responder.save()
+        self.assertEqual(list(search_responses(Response.objects.all(), 'ворон')), [])
+        self.assertEqual(list(search_responses(Response.objects.all(), 'сокол')), [response])
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        OutboxEmail.objects.all().delete()
+
+    def _enqueue(self, count=1):
+        for i in range(count):
+            enqueue_email(subject=f'Тема {i}', message='Текст', recipient_list=[f'user{i}@example.com'],
+                          html_message='<p>Текст</p>')
+
+    def test_enqueue_does_not_send(self):
+        self._enqueue()
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.STATUS_PENDING)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_delivery(self):
+        self._enqueue(3)
+        self.assertEqual(outbox.deliver_batch(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.STATUS_SENT).exists())
+        self.assertEqual(outbox.deliver_batch(), (0, 0))
+
+    def test_failed_message_retried_with_backoff(self):
+        self._enqueue()
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=ValueError('плохой адрес')):
+            self.assertEqual(outbox.deliver_batch(), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.STATUS_PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=outbox.RETRY_DELAY - 5))
+        # пока срок не подошёл, письмо не забирается
+        self.assertEqual(outbox.deliver_batch(), (0, 0))
+        self.assertEqual(outbox.retry_delay(3), outbox.RETRY_DELAY * 4)
+        self.assertEqual(outbox.retry_delay(100), outbox.MAX_RETRY_DELAY)
+
+    def test_dead_letter_after_max_attempts(self):
+        self._enqueue()
+        OutboxEmail.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=ValueError('плохой адрес')):
+            outbox.deliver_batch()
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.STATUS_DEAD)
+
+    def test_connection_failure_keeps_attempts(self):
+        self._enqueue(2)
+        connection_mock = mock.Mock()
+        connection_mock.open.side_effect = ConnectionRefusedError('SMTP недоступен')
+        with mock.patch('board.outbox.get_connection', return_value=connection_mock):
+            self.assertEqual(outbox.deliver_batch(), (0, 2))
+        for email in OutboxEmail.objects.all():
+            self.assertEqual(email.status, OutboxEmail.STATUS_PENDING)
+            self.assertEqual(email.attempts, 0)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_sent_marked_before_connection_drops(self):
+        self._enqueue(3)
+        original_send = EmailMultiAlternatives.send
+        calls = []
+
+        def send(message, *args, **kwargs):
+            calls.append(message)
+            if len(calls) == 2:
+                raise smtplib.SMTPServerDisconnected('соединение закрыто')
+            return original_send(message, *args, **kwargs)
+
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', send):
+            self.assertEqual(outbox.deliver_batch(), (1, 2))
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.STATUS_SENT).count(), 1)
+        self.assertFalse(OutboxEmail.objects.filter(attempts__gt=0).exclude(status=OutboxEmail.STATUS_SENT).exists())
+
+
+class NewsletterTests(TestCase):
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(f'reader{i}', f'reader{i}@example.com', 'pass')
+            for i in range(5)
+        ]
+        self.campaign = NewsletterCampaign.objects.create(subject='Новости', message='Текст')
+
+    def _recipients(self):
+        return sorted(address for message in mail.outbox for address in message.to)
+
+    def _failing_send(self, emails, times=None):
+        """send_messages, который падает на адресах emails (times раз на каждый, None — всегда)."""
+        original = LocmemEmailBackend.send_messages
+        failures = {}
+
+        def send_messages(backend, messages):
+            address = messages[0].to[0]
+            if address in emails and (times is None or failures.get(address, 0) < times):
+                failures[address] = failures.get(address, 0) + 1
+                raise smtplib.SMTPRecipientsRefused({address: (550, b'mailbox unavailable')})
+            return original(backend, messages)
+
+        return mock.patch.object(LocmemEmailBackend, 'send_messages', send_messages)
+
+    def test_resume_after_crash_does_not_resend(self):
+        original = LocmemEmailBackend.send_messages
+        calls = []
+
+        def send_messages(backend, messages):
+            calls.append(messages)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return original(backend, messages)
+
+        with mock.patch.object(LocmemEmailBackend, 'send_messages', send_messages):
+            with self.assertRaises(KeyboardInterrupt):
+                run_campaign(self.campaign, batch_size=2)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, NewsletterCampaign.STATUS_RUNNING)
+        self.assertEqual(self.campaign.last_user_id, self.users[1].pk)
+
+        call_command('send_newsletter', resume=self.campaign.pk, batch_size=2, stdout=StringIO())
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, NewsletterCampaign.STATUS_DONE)
+        self.assertEqual(self._recipients(), sorted(user.email for user in self.users))
+        self.assertEqual(self.campaign.sent_count, 5)
+
+    def test_transient_failure_retried(self):
+        with self._failing_send({self.users[1].email}, times=1):
+            stats = run_campaign(self.campaign, batch_size=2)
+        self.campaign.refresh_from_db()
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(self.campaign.status, NewsletterCampaign.STATUS_DONE)
+        self.assertEqual(self.campaign.failed_user_ids, [])
+        self.assertEqual(self._recipients(), sorted(user.email for user in self.users))
+
+    def test_permanent_failure_kept_for_resume(self):
+        with self._failing_send({self.users[2].email}):
+            stats = run_campaign(self.campaign, batch_size=2)
+        self.campaign.refresh_from_db()
+        self.assertEqual((stats['sent'], stats['failed']), (4, 1))
+        self.assertEqual(self.campaign.status, NewsletterCampaign.STATUS_DONE)
+        self.assertEqual(self.campaign.failed_user_ids, [self.users[2].pk])
+
+        # завершённую кампанию с недоставленными можно добить: уходит только им
+        mail.outbox = []
+        call_command('send_newsletter', resume=self.campaign.pk, stdout=StringIO())
+        self.campaign.refresh_from_db()
+        self.assertEqual(self._recipients(), [self.users[2].email])
+        self.assertEqual(self.campaign.failed_user_ids, [])
+        self.assertEqual(self.campaign.sent_count, 5)
+
+    def test_reconnect_failure_interrupts_campaign(self):
+        original_open = LocmemEmailBackend.open
+        opened = []
+
+        def open_connection(backend):
+            opened.append(backend)
+            if len(opened) > 1:
+                raise ConnectionRefusedError('SMTP недоступен')
+            return original_open(backend)
+
+        with self._failing_send({self.users[2].email}), \
+                mock.patch.object(LocmemEmailBackend, 'open', open_connection):
+            stats = run_campaign(self.campaign, batch_size=2)
+        self.assertTrue(stats['interrupted'])
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, NewsletterCampaign.STATUS_RUNNING)
+        self.assertEqual(self.campaign.last_user_id, self.users[2].pk)
+        self.assertEqual(self.campaign.failed_user_ids, [self.users[2].pk])
+
+        call_command('send_newsletter', resume=self.campaign.pk, stdout=StringIO())
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, NewsletterCampaign.STATUS_DONE)
+        self.assertEqual(self._recipients(), sorted(user.email for user in self.users))
+
+
+class DownloadTests(TestCase):
+    CONTENT = bytes(range(100))
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        author = User.objects.create_user('author', 'author@example.com', 'password123')
+        self.ad = Ad.objects.create(title='Гайд', content='Текст', author=author,
+                                    category=Category.objects.create(name='Гайды'))
+        self.ad.file.save('guide.bin', ContentFile(self.CONTENT))
+        self.url = reverse('ad_file_download', args=[self.ad.pk])
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn("filename*=UTF-8''guide", response['Content-Disposition'])
+
+    def test_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(self._body(response), self.CONTENT[10:20])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=90-'})
+        self.assertEqual(response['Content-Range'], 'bytes 90-99/100')
+        self.assertEqual(self._body(response), self.CONTENT[90:])
+
+    def test_suffix_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 95-99/100')
+        self.assertEqual(self._body(response), self.CONTENT[-5:])
+        # суффикс длиннее файла — весь файл
+        response = self.client.get(self.url, headers={'Range': 'bytes=-500'})
+        self.assertEqual(response['Content-Range'], 'bytes 0-99/100')
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=100-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range_mismatch_returns_full_file(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.CONTENT)
+
+    def test_not_modified(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, headers={'If-Modified-Since': first['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_file_is_404(self):
+        self.ad.file.storage.delete(self.ad.file.name)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+
+class ResponseApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.category = Category.objects.create(name='Рейды')
+        cls.ad = Ad.objects.create(title='Рейд', content='Текст', author=cls.author, category=cls.category)
+        cls.responses = [
+            Response.objects.create(ad=cls.ad, from_user=User.objects.create_user(f'player{i}', password='pass'),
+                                    text=f'Отклик {i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.author)
+        self.url = reverse('api_response_list')
+
+    def test_etag_not_modified_skips_page_query(self):
+        first = self.client.get(self.url)
+        self.assertEqual(len(first.json()['results']), 3)
+        with mock.patch.object(CursorPaginator, 'get_page') as get_page:
+            response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        get_page.assert_not_called()
+
+    def test_accepting_changes_etag_and_last_modified(self):
+        first = self.client.get(self.url)
+        Response.objects.filter(pk=self.responses[0].pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        accept_responses(self.author, pks=[self.responses[0].pk])
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertTrue(response.json()['results'][-1]['is_accepted'])
+
+    def test_deleting_changes_etag(self):
+        first = self.client.get(self.url)
+        self.responses[1].delete()
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_since_includes_accepted_responses(self):
+        since = timezone.now()
+        response = self.client.get(self.url, {'since': since.isoformat()})
+        self.assertEqual(response.json()['results'], [])
+
+        accept_responses(self.author, pks=[self.responses[1].pk])
+        results = self.client.get(self.url, {'since': since.isoformat()}).json()['results']
+        self.assertEqual([result['id'] for result in results], [self.responses[1].pk])
+        self.assertTrue(results[0]['is_accepted'])
+
+    def test_since_reports_deleted_responses(self):
+        since = timezone.now()
+        rejected, removed = self.responses[0].pk, self.responses[1].pk
+        reject_responses(self.author, pks=[rejected])
+        Response.objects.get(pk=removed).delete()
+
+        results = self.client.get(self.url, {'since': since.isoformat()}).json()['results']
+        self.assertEqual(results, [{'id': rejected, 'deleted': True}, {'id': removed, 'deleted': True}])
+        # автор отклика видит удаление в своей ленте, посторонний — нет
+        self.client.force_login(self.responses[0].from_user)
+        sent = self.client.get(self.url, {'since': since.isoformat(), 'role': 'sent'}).json()['results']
+        self.assertEqual(sent, [{'id': rejected, 'deleted': True}])
+
+    def test_since_reports_deleted_ad(self):
+        since = timezone.now()
+        ad_pk = self.ad.pk
+        Ad.objects.get(pk=ad_pk).delete()
+
+        results = self.client.get(reverse('api_ad_list'), {'since': since.isoformat()}).json()['results']
+        self.assertEqual(results, [{'id': ad_pk, 'deleted': True}])
+        results = self.client.get(reverse('api_ad_list'), {
+            'since': since.isoformat(), 'category': 'Другая',
+        }).json()['results']
+        self.assertEqual(results, [])
+        # отклики ушли каскадом и тоже попали в ленту
+        results = self.client.get(self.url, {'since': since.isoformat()}).json()['results']
+        self.assertEqual({result['id'] for result in results}, {response.pk for response in self.responses})
+
+    def test_deleted_entries_come_once_across_pages(self):
+        since = timezone.now()
+        first, second, third = (response.pk for response in self.responses)
+        Response.objects.get(pk=first).delete()
+        accept_responses(self.author, pks=[second])
+        Response.objects.get(pk=third).delete()
+        added = Response.objects.create(ad=self.ad, from_user=self.responses[0].from_user, text='Ещё')
+
+        seen, query = [], {'since': since.isoformat(), 'limit': 1, 'fields': 'id'}
+        url = self.url
+        while url:
+            payload = self.client.get(url, query).json()
+            seen += payload['results']
+            url, query = payload['next'], None
+        self.assertEqual(sorted((result['id'], result.get('deleted', False)) for result in seen), sorted([
+            (first, True), (second, False), (third, True), (added.pk, False),
+        ]))
+
+    def test_too_old_since_is_gone(self):
+        since = timezone.now() - timedelta(days=api.TOMBSTONE_DAYS + 1)
+        response = self.client.get(self.url, {'since': since.isoformat()})
+        self.assertEqual(response.status_code, 410)
+
+    def test_ad_list_etag_not_modified_skips_page_query(self):
+        url = reverse('api_ad_list')
+        first = self.client.get(url, {'fields': 'id,title,category,response_count'})
+        with mock.patch.object(CursorPaginator, 'get_page') as get_page:
+            response = self.client.get(url, {'fields': 'id,title,category,response_count'},
+                                       headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        get_page.assert_not_called()
+
+        Response.objects.get(pk=self.responses[0].pk).delete()
+        response = self.client.get(url, {'fields': 'id,title,category,response_count'},
+                                   headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['response_count'], 2)
+
+    def test_ad_list_category_by_name(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Category.objects.create(name='Торговля')
+        Ad.objects.create(title='Продам', content='Текст', author=self.author, category=other)
+        response = self.client.get(reverse('api_ad_list'), {'category': 'Рейды'})
+        self.assertEqual([ad['id'] for ad in response.json()['results']], [self.ad.pk])
+        response = self.client.get(reverse('api_ad_list'), {'category': 'Нет такой'})
+        self.assertEqual(response.json()['results'], [])
+
+
+class ResponseAdAuthorTests(TestCase):
+
+    def test_ad_author_follows_ad_transfer(self):
+        author = User.objects.create_user('author', 'author@example.com', 'password123')
+        heir = User.objects.create_user('heir', 'heir@example.com', 'password123')
+        ad = Ad.objects.create(title='Гильдия', content='Текст', author=author,
+                               category=Category.objects.create(name='Гильдии'))
+        for i in range(2):
+            Response.objects.create(ad=ad, from_user=User.objects.create_user(f'player{i}', password='pass'),
+                                    text='Отклик')
+
+        ad = Ad.objects.get(pk=ad.pk)
+        ad.author = heir
+        ad.save()
+        self.assertFalse(Response.objects.filter(ad_author=author).exists())
+        self.assertEqual(Response.objects.filter(ad_author=heir).count(), 2)
+
+
+class TrackedFieldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.ad = Ad.objects.create(title='Рейд', content='Текст', author=cls.author,
+                                   category=Category.objects.create(name='Рейды'))
+
+    def _watch(self, field):
+        seen = {}
+
+        def receiver(sender, instance, created, **kwargs):
+            seen.update(changed=instance.has_changed(field), old=instance.get_loaded_value(field))
+
+        post_save.connect(receiver, sender=Ad)
+        self.addCleanup(post_save.disconnect, receiver, sender=Ad)
+        return seen
+
+    def test_deferred_field_assigned_without_reading(self):
+        seen = self._watch('is_active')
+        ad = Ad.objects.only('pk', 'title').get(pk=self.ad.pk)
+        ad.is_active = False
+        ad.save()
+        self.assertEqual(seen, {'changed': True, 'old': True})
+
+    def test_loading_deferred_field_keeps_other_changes(self):
+        ad = Ad.objects.only('pk', 'title').get(pk=self.ad.pk)
+        ad.title = 'Новый рейд'
+        self.assertTrue(ad.is_active)  # догрузка через refresh_from_db(fields=['is_active'])
+        self.assertTrue(ad.has_changed('title'))
+        self.assertFalse(ad.has_changed('is_active'))
+        ad.is_active = False
+        self.assertTrue(ad.has_changed('is_active'))
+
+    def test_untouched_deferred_field_not_changed(self):
+        seen = self._watch('content')
+        ad = Ad.objects.defer('content').get(pk=self.ad.pk)
+        ad.is_active = False
+        ad.save()
+        self.assertFalse(seen['changed'])
+
+
+@mock.patch.object(images, 'SYNC', True)
+class ImageRenditionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        self.category = Category.objects.create(name='Скриншоты')
+
+    def _image(self, name='pic.jpg'):
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', (700, 400), 'red').save(buffer, 'JPEG')
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def _files(self, ad):
+        return [
+            name for fmt in ad.image_renditions
+            for _, name in images.rendition_files(ad.image_renditions, fmt, ad.image.name)
+        ]
+
+    def _create_ad(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ad = Ad.objects.create(title='Скрин', content='Текст', author=self.author,
+                                   category=self.category, image=self._image())
+        return Ad.objects.get(pk=ad.pk)
+
+    def test_stores_names_returned_by_storage(self):
+        storage = FileSystemStorage(location=self.media_root)
+        storage.save('pic.jpg', self._image())
+        # файл с именем копии уже есть и не удаляется: хранилище сохранит под другим именем
+        storage.save('pic_w320.jpg', ContentFile(b'old'))
+        with mock.patch.object(storage, 'delete'):
+            renditions = images.generate_renditions('pic.jpg', storage)
+        (width, name), *_ = renditions['jpg']
+        self.assertEqual(width, 320)
+        self.assertNotEqual(name, 'pic_w320.jpg')
+        with storage.open(name, 'rb') as saved:
+            self.assertNotEqual(saved.read(), b'old')
+
+    def test_srcset_uses_stored_names(self):
+        ad = self._create_ad()
+        self.assertTrue(ad.image_renditions)
+        for name in self._files(ad):
+            self.assertTrue(ad.image.storage.exists(name))
+            self.assertIn(ad.image.storage.url(name), ad.image_srcset(name.rsplit('.', 1)[1]))
+        # записи старого вида: только ширины
+        ad.image_renditions = {'jpg': [320]}
+        self.assertEqual(ad.image_thumbnail_url, ad.image.storage.url(images.rendition_name(ad.image.name, 320, 'jpg')))
+
+    def test_old_renditions_deleted_on_replace(self):
+        ad = self._create_ad()
+        old_files = self._files(ad)
+        with self.captureOnCommitCallbacks(execute=True):
+            ad.image = self._image('new.jpg')
+            ad.save()
+        ad.refresh_from_db()
+        for name in old_files:
+            self.assertFalse(ad.image.storage.exists(name))
+        for name in self._files(ad):
+            self.assertTrue(ad.image.storage.exists(name))
+
+    def test_renditions_deleted_with_ad(self):
+        ad = self._create_ad()
+        files = self._files(ad)
+        self.assertTrue(files)
+        with self.captureOnCommitCallbacks(execute=True):
+            ad.delete()
+        for name in files:
+            self.assertFalse(default_storage.exists(name))
+
+
+class StatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.player = User.objects.create_user('player', 'player@example.com', 'password123')
+        cls.raids = Category.objects.create(name='Рейды')
+        cls.trade = Category.objects.create(name='Торговля')
+
+    def _active_ads(self, category):
+        return CategoryCounter.objects.filter(category=category).values_list('active_ads', flat=True).first() or 0
+
+    def _expected(self):
+        return {
+            'user_count': User.objects.count(),
+            'ad_count': Ad.objects.filter(is_active=True).count(),
+            'response_count': Response.objects.count(),
+        }
+
+    def test_counters_follow_changes(self):
+        ad = Ad.objects.create(title='Рейд', content='Текст', author=self.author, category=self.raids)
+        other = Ad.objects.create(title='Продам', content='Текст', author=self.author, category=self.trade)
+        Response.objects.create(ad=ad, from_user=self.player, text='Отклик')
+        self.assertEqual(stats.get_site_stats(), self._expected())
+        self.assertEqual((self._active_ads(self.raids), self._active_ads(self.trade)), (1, 1))
+
+        ad.category = self.trade
+        ad.save()
+        self.assertEqual((self._active_ads(self.raids), self._active_ads(self.trade)), (0, 2))
+
+        other.is_active = False
+        other.save()
+        self.assertEqual(self._active_ads(self.trade), 1)
+        ad.delete()
+        self.assertEqual(self._active_ads(self.trade), 0)
+        self.assertEqual(stats.get_site_stats(), self._expected())
+
+    def test_reconcile_fixes_drift(self):
+        ad = Ad.objects.create(title='Рейд', content='Текст', author=self.author, category=self.raids)
+        Response.objects.create(ad=ad, from_user=self.player, text='Отклик')
+        SiteCounter.objects.update(value=100)
+        CategoryCounter.objects.update(active_ads=100)
+        ResponseBucket.objects.update(count=100)
+
+        stats.reconcile()
+        self.assertEqual(stats.get_site_stats(), self._expected())
+        self.assertEqual(self._active_ads(self.raids), 1)
+        self.assertEqual(self._active_ads(self.trade), 0)
+
+    def test_buckets_outside_window_ignored_and_pruned(self):
+        ad = Ad.objects.create(title='Рейд', content='Текст', author=self.author, category=self.raids)
+        Response.objects.create(ad=ad, from_user=self.player, text='Отклик')
+        old = Response.objects.create(ad=ad, from_user=self.author, text='Давний отклик')
+        long_ago = timezone.now() - stats.RESPONSE_WINDOW - timedelta(days=2)
+        Response.objects.filter(pk=old.pk).update(created_at=long_ago)
+        ResponseBucket.objects.create(hour=long_ago.replace(minute=0, second=0, microsecond=0), count=7)
+
+        # бакет за окном не читается; оба отклика пока числятся в текущем часе
+        self.assertEqual(stats.get_site_stats()['response_count'], 2)
+        # в бакет за окном не пишем
+        stats.bump_responses(long_ago, 1)
+        self.assertEqual(ResponseBucket.objects.get(hour__lt=timezone.now() - stats.RESPONSE_WINDOW).count, 7)
+
+        stats.reconcile()
+        self.assertFalse(ResponseBucket.objects.filter(hour__lt=timezone.now() - stats.RESPONSE_WINDOW).exists())
+        self.assertEqual(stats.get_site_stats()['response_count'], 1)
+
+
+class CursorPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', 'author@example.com', 'password123')
+        category = Category.objects.create(name='Рейды')
+        cls.ads = [
+            Ad.objects.create(title=f'Объявление {index}', content='Текст', author=author, category=category)
+            for index in range(7)
+        ]
+        # одинаковое время у части объявлений: порядок добирает pk
+        Ad.objects.filter(pk__in=[ad.pk for ad in cls.ads[2:5]]).update(created=cls.ads[2].created)
+
+    def _paginator(self, **params):
+        query = QueryDict(mutable=True)
+        query.update(params)
+        return CursorPaginator(Ad.objects.all(), 3, ('-created', '-pk'), query)
+
+    def _ids(self, page):
+        return [ad.pk for ad in page]
+
+    def test_forward_and_back(self):
+        expected = list(Ad.objects.order_by('-created', '-pk').values_list('pk', flat=True))
+        pages = [self._paginator().get_page()]
+        while pages[-1].has_next():
+            pages.append(self._paginator(after=pages[-1].next_cursor).get_page())
+        self.assertEqual([pk for page in pages for pk in self._ids(page)], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+        self.assertTrue(pages[1].has_previous())
+
+        # назад с каждой страницы — ровно предыдущая
+        for previous, page in zip(pages, pages[1:]):
+            back = self._paginator(before=page.previous_cursor).get_page()
+            self.assertEqual(self._ids(back), self._ids(previous))
+            self.assertTrue(back.has_next())
+        self.assertFalse(self._paginator(before=pages[1].previous_cursor).get_page().has_previous())
+
+    def test_queries_keep_other_params(self):
+        page = self._paginator(category='Рейды', page='2').get_page()
+        query = QueryDict(page.next_query)
+        self.assertEqual(query['category'], 'Рейды')
+        self.assertNotIn('page', query)
+        self.assertEqual(query['after'], page.next_cursor)
+
+    def test_tampered_cursor_starts_from_first_page(self):
+        first = self._paginator().get_page()
+        cursor = first.next_cursor
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        for bad in (tampered, 'мусор', signing.dumps([1], salt=CURSOR_SALT), signing.dumps([1, 2], salt='other')):
+            page = self._paginator(after=bad).get_page()
+            self.assertEqual(self._ids(page), self._ids(first))
+            self.assertFalse(page.has_previous())
+
+    def test_cursor_from_other_ordering_ignored(self):
+        first = self._paginator().get_page()
+        # подписан нами, но для порядка (search_rank, pk): дата не разбирается
+        foreign = signing.dumps([-1.5, self.ads[0].pk], salt=CURSOR_SALT)
+        self.assertEqual(self._ids(self._paginator(after=foreign).get_page()), self._ids(first))
+
+
+class AdResponsesPageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.ad = Ad.objects.create(title='Рейд', content='Текст', author=cls.author,
+                                   category=Category.objects.create(name='Рейды'))
+        players = User.objects.bulk_create(
+            User(username=f'player{index}') for index in range(2 * RESPONSES_PAGE_SIZE + 5)
+        )
+        Response.objects.bulk_create(
+            Response(ad=cls.ad, ad_author=cls.author, from_user=player, text=f'Отклик {index}')
+            for index, player in enumerate(players)
+        )
+        cls.expected = list(Response.objects.filter(ad=cls.ad).order_by('-created_at', '-pk')
+                            .values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def _ids(self, response):
+        return [item.pk for item in response.context['responses']]
+
+    def _next_query(self, content):
+        match = re.search(r'data-next-url="[^"?]*\?([^"]+)"', content.decode())
+        return match and match.group(1).replace('&amp;', '&')
+
+    def test_detail_renders_first_page_and_cached_count(self):
+        url = reverse('ad_detail', args=[self.ad.pk])
+        response = self.client.get(url)
+        self.assertEqual(self._ids(response), self.expected[:RESPONSES_PAGE_SIZE])
+        self.assertEqual(response.context['response_count'], len(self.expected))
+        self.assertIsNotNone(self._next_query(response.content))
+
+        # число откликов уже в кэше: повторный рендер не считает их заново
+        pagecache.bump(pagecache.ALL_SCOPE)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['response_count'], len(self.expected))
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT(' in query['sql'].upper()])
+
+    def test_fragment_follows_cursor_to_the_end(self):
+        detail = self.client.get(reverse('ad_detail', args=[self.ad.pk]))
+        url = reverse('ad_responses', args=[self.ad.pk])
+
+        second = self.client.get(f'{url}?{self._next_query(detail.content)}')
+        self.assertEqual(self._ids(second), self.expected[RESPONSES_PAGE_SIZE:2 * RESPONSES_PAGE_SIZE])
+        last = self.client.get(f'{url}?{self._next_query(second.content)}')
+        self.assertEqual(self._ids(last), self.expected[2 * RESPONSES_PAGE_SIZE:])
+        self.assertNotContains(last, 'responses-sentinel')
+
+    def test_bad_cursor_returns_first_page(self):
+        url = reverse('ad_responses', args=[self.ad.pk])
+        for bad in ('мусор', signing.dumps(['не дата', 1], salt=CURSOR_SALT)):
+            with self.subTest(cursor=bad):
+                response = self.client.get(url, {'after': bad})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self._ids(response), self.expected[:RESPONSES_PAGE_SIZE])
+
+
+class ModerationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'password123')
+        cls.stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password123')
+        category = Category.objects.create(name='Рейды')
+        cls.ad = Ad.objects.create(title='Рейд', content='Текст', author=cls.author, category=category)
+        cls.other_ad = Ad.objects.create(title='Чужой рейд', content='Текст', author=cls.stranger, category=category)
+        cls.players = [User.objects.create_user(f'player{i}', f'player{i}@example.com', 'pass') for i in range(3)]
+        cls.responses = [
+            Response.objects.create(ad=cls.ad, from_user=player, text='Отклик') for player in cls.players
+        ]
+        cls.foreign = Response.objects.create(ad=cls.other_ad, from_user=cls.players[0], text='Отклик')
+
+    def setUp(self):
+        OutboxEmail.objects.all().delete()
+
+    def _accepted(self):
+        return set(Response.objects.filter(is_accepted=True).values_list('pk', flat=True))
+
+    def test_accept_only_own_responses(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            count = accept_responses(self.author, pks=[self.responses[0].pk, self.foreign.pk])
+        self.assertEqual(count, 1)
+        self.assertEqual(self._accepted(), {self.responses[0].pk})
+        self.assertEqual(list(OutboxEmail.objects.values_list('to', flat=True)), [self.players[0].email])
+
+    def test_stranger_cannot_accept_or_reject(self):
+        pks = [response.pk for response in self.responses]
+        self.assertEqual(accept_responses(self.stranger, pks=pks), 0)
+        self.assertEqual(accept_responses(self.stranger, ad_id=self.ad.pk), 0)
+        self.assertEqual(reject_responses(self.stranger, pks=pks), 0)
+        self.assertEqual(reject_responses(self.stranger, ad_id=self.ad.pk), 0)
+        self.assertEqual(Response.objects.filter(ad=self.ad).count(), 3)
+        self.assertEqual(self._accepted(), set())
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_accept_all_pending_for_ad(self):
+        accept_responses(self.author, pks=[self.responses[0].pk])
+        self.assertEqual(accept_responses(self.author, ad_id=self.ad.pk), 2)
+        self.assertEqual(self._accepted(), {response.pk for response in self.responses})
+        self.assertFalse(Response.objects.get(pk=self.foreign.pk).is_accepted)
+
+    def test_reject_skips_accepted(self):
+        accept_responses(self.author, pks=[self.responses[0].pk])
+        self.assertEqual(reject_responses(self.author, ad_id=self.ad.pk), 2)
+        self.assertEqual(list(Response.objects.filter(ad=self.ad).values_list('pk', flat=True)),
+                         [self.responses[0].pk])
+
+    def test_bulk_view(self):
+        self.client.force_login(self.stranger)
+        self.client.post(reverse('bulk_responses'), {'action': 'reject', 'ad': self.ad.pk})
+        self.assertEqual(Response.objects.filter(ad=self.ad).count(), 3)
+
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('bulk_responses'), {
+            'action': 'accept', 'responses': [self.responses[1].pk, self.foreign.pk, 'x'],
+        })
+        self.assertRedirects(response, reverse('my_responses'), fetch_redirect_response=False)
+        self.assertEqual(self._accepted(), {self.responses[1].pk})
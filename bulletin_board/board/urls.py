@@ -1,16 +1,23 @@
 from django.urls import path
 from .views import AdCreateView, AdListView, AdUpdateView, AdDetailView, AdDeleteView
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', AdListView.as_view(), name='ad_list'),
     path('create/', AdCreateView.as_view(), name='ad_create'),
     path('<int:pk>/edit/', AdUpdateView.as_view(), name='ad_update'),
     path('<int:pk>/', AdDetailView.as_view(), name='ad_detail'),
+    path('<int:pk>/responses/', views.ad_responses_view, name='ad_responses'),
+    path('<int:pk>/file/', views.ad_file_download_view, name='ad_file_download'),
     path('<int:pk>/delete', AdDeleteView.as_view(), name='ad_delete'),
     path('responses/', views.my_responses_view, name='my_responses'),
+    path('responses/bulk/', views.bulk_responses_view, name='bulk_responses'),
     path('responses/<int:pk>/', views.response_detail_view, name='response_detail'),
     path('responses/<int:pk>/accept/', views.accept_response_view, name='accept_response'),
     path('responses/<int:pk>/delete/', views.delete_response_view, name='delete_response'),
+    path('api/ads/', api.ad_list_api, name='api_ad_list'),
+    path('api/ads/<int:pk>/', api.ad_detail_api, name='api_ad_detail'),
+    path('api/responses/', api.response_list_api, name='api_response_list'),
+    path('debug/sql/', views.sql_stats_view, name='sql_stats'),
     path('ad/<int:ad_pk>/send-response/', views.send_response_view, name='send_response'),
 ]
\ No newline at end of file
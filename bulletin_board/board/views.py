@@ -3,42 +3,61 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib import messages
-from .models import Category, Ad, Response
+from .models import Ad, Response, CategoryCounter
+from .categories import registry as category_registry
 from .forms import AdForm
+from .stats import get_site_stats, get_ad_response_count
+from .search import search_ads, search_responses, result_ordering
+from .pagination import CursorPaginator
+from .concurrency import gather_queries, request_user
+from asgiref.sync import sync_to_async
+from .downloads import serve_file
+from .moderation import accept_responses, reject_responses
+from .pagecache import cache_anonymous_page, home_scopes, ad_list_scopes, ad_detail_scopes
+from django.utils.decorators import method_decorator
+from accounts.avatars import avatar_urls
+from accounts.throttling import throttle
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count
-from django.core.paginator import Paginator
+from django.http import QueryDict, Http404
+from django.views.decorators.http import require_safe, require_POST, require_http_methods
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.conf import settings
+from . import instrumentation
 from .forms import ResponseForm
-from django.contrib.auth.models import User
-from datetime import datetime, timedelta
-
-
-def home_view(request):
-    latest_ads = Ad.objects.filter(is_active=True).select_related(
-        'author', 'category', 'author__profile'
-    ).order_by('-created')[:6]
-    categories = Category.objects.annotate(
-        ad_count=Count('ad', filter=Q(ad__is_active=True))
-    ).order_by('name')
-    user_count = User.objects.count()
-    ad_count = Ad.objects.filter(is_active=True).count()
-    yesterday = datetime.now() - timedelta(days=1)
-    response_count = Response.objects.filter(
-        created_at__gte=yesterday
-    ).count()
+
+
+@cache_anonymous_page(home_scopes)
+async def home_view(request):
+    # запросы независимы: страница ждёт самый медленный, а не их сумму
+    results = await gather_queries(
+        latest_ads=lambda: list(Ad.objects.filter(is_active=True).select_related(
+            'author', 'category'
+        ).order_by('-created')[:6]),
+        counts=lambda: dict(CategoryCounter.objects.values_list('category_id', 'active_ads')),
+        categories=category_registry.all,
+        site_stats=get_site_stats,
+    )
+    latest_ads = results['latest_ads']
+    counts = results['counts']
+    # прогреваем кэш URL аватаров одним get_many, шаблон берёт их тегом avatar_url
+    await sync_to_async(avatar_urls)([ad.author_id for ad in latest_ads])
+    categories = [
+        {'pk': category.pk, 'name': category.name, 'ad_count': counts.get(category.pk, 0)}
+        for category in results['categories']
+    ]
     context = {
         'latest_ads': latest_ads,
         'categories': categories,
-        'user_count': user_count,
-        'ad_count': ad_count,
-        'response_count': response_count,
+        **results['site_stats'],
     }
 
-    return render(request, 'index.html', context)
+    return await sync_to_async(render)(request, 'index.html', context)
 
 
+@method_decorator(cache_anonymous_page(ad_list_scopes), name='dispatch')
 class AdListView(ListView):
-    queryset =Ad.objects.all()
+    queryset = Ad.objects.select_related('author', 'category').with_response_count()
     template_name = 'ads/list.html'
     context_object_name = 'ads'
     paginate_by = 10
@@ -48,23 +67,54 @@ class AdListView(ListView):
         queryset = super().get_queryset()
         category = self.request.GET.get('category')
         if category:
-            queryset = queryset.filter(category__name=category)
+            # имя -> id по справочнику: индексный фильтр по category_id без JOIN
+            category_id = category_registry.id_for_name(category)
+            if category_id is None:
+                return queryset.none()
+            queryset = queryset.filter(category_id=category_id)
+        search_query = self.request.GET.get('q', '').strip()
+        if search_query:
+            queryset = search_ads(queryset, search_query)
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(
+            queryset, page_size, result_ordering(queryset, ('-created', '-pk')), self.request.GET
+        )
+        page = paginator.get_page()
+        return paginator, page, page.object_list, page.has_other_pages()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = category_registry.all()
+        context['search_query'] = self.request.GET.get('q', '').strip()
         return context
 
 
+RESPONSES_PAGE_SIZE = 20
+
+
+def ad_responses_page(ad, params):
+    responses = Response.objects.filter(ad=ad).select_related('from_user')
+    return CursorPaginator(responses, RESPONSES_PAGE_SIZE, ('-created_at', '-pk'), params).get_page()
+
+
+@method_decorator(cache_anonymous_page(ad_detail_scopes), name='dispatch')
 class AdDetailView(DetailView):
-    model = Ad
+    queryset = Ad.objects.select_related('author', 'category')
     template_name = 'ads/detail.html'
     context_object_name = 'ad'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['responses'] = Response.objects.filter(ad=self.object)
+        # в первом рендере только первая страница откликов, остальное подгружается фрагментами
+        responses_page = ad_responses_page(self.object, QueryDict())
+        context['responses'] = responses_page.object_list
+        context['responses_page'] = responses_page
+        context['response_count'] = get_ad_response_count(self.object.pk)
+        context['similar_ads'] = Ad.objects.filter(
+            category_id=self.object.category_id
+        ).exclude(pk=self.object.pk)[:3]
 
         if self.request.user.is_authenticated:
             context['user_has_response'] = Response.objects.filter(
@@ -75,6 +125,25 @@ class AdDetailView(DetailView):
         return context
 
 
+def ad_responses_view(request, pk):
+    ad = get_object_or_404(Ad.objects.only('pk', 'author_id'), pk=pk)
+    page = ad_responses_page(ad, request.GET)
+    return render(request, 'ads/_responses.html', {
+        'ad': ad,
+        'responses': page.object_list,
+        'page': page,
+    })
+
+
+@require_safe
+def ad_file_download_view(request, pk):
+    ad = get_object_or_404(Ad.objects.only('pk', 'file', 'is_active', 'author_id'), pk=pk)
+    # неактивное объявление и его файл видит только автор
+    if not ad.file or (not ad.is_active and request.user.pk != ad.author_id):
+        raise Http404
+    return serve_file(request, ad.file)
+
+
 class AdCreateView(LoginRequiredMixin, CreateView):
     form_class = AdForm
     template_name = 'ads/create.html'
@@ -86,18 +155,7 @@ class AdCreateView(LoginRequiredMixin, CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['category_hints'] = {
-            'Танки': 'Защитники, щиты команды',
-            'Хилы': 'Лекари, поддержка здоровья',
-            'ДД': 'Урон, атакующие классы',
-            'Торговцы': 'Продажа предметов, ремесло',
-            'Гилдмастеры': 'Лидеры гильдий, организаторы',
-            'Квестгиверы': 'Задания, миссии',
-            'Кузнецы': 'Оружие, броня',
-            'Кожевники': 'Кожаная броня, сумки',
-            'Зельевары': 'Зелья, эликсиры',
-            'Мастера заклинаний': 'Магия, заклинания'
-        }
+        context['category_hints'] = category_registry.hints()
         return context
 
 
@@ -113,9 +171,12 @@ class AdDeleteView(DeleteView):
 
 
 @login_required
-def my_responses_view(request):
-    user_ads = Ad.objects.filter(author=request.user)
-    responses = Response.objects.filter(ad__in=user_ads).select_related('ad', 'from_user', 'ad__category').order_by('-created_at')
+async def my_responses_view(request):
+    user = await request_user(request)
+    user_ads = Ad.objects.filter(author=user).only('pk', 'title').order_by('-created')
+    responses = Response.objects.filter(ad_author=user).select_related(
+        'ad', 'ad__category', 'from_user', 'from_user__profile'
+    ).order_by('-created_at')
     filter_type = request.GET.get('filter', 'all')
 
     if filter_type == 'accepted':
@@ -123,22 +184,28 @@ def my_responses_view(request):
     elif filter_type == 'pending':
         responses = responses.filter(is_accepted=False)
     elif filter_type == 'my':
-        responses = Response.objects.filter(from_user=request.user).select_related('ad', 'from_user', 'ad__category').order_by('-created_at')
+        responses = Response.objects.filter(from_user=user).select_related(
+            'ad', 'ad__category', 'from_user', 'from_user__profile'
+        ).order_by('-created_at')
 
-    search_query = request.GET.get('search', '')
+    search_query = (request.GET.get('q') or request.GET.get('search', '')).strip()
     if search_query:
-        responses = responses.filter(
-            Q(text__icontains=search_query) |
-            Q(ad__title__icontains=search_query) |
-            Q(from_user__username__icontains=search_query)
-        )
+        responses = search_responses(responses, search_query)
 
-    paginator = Paginator(responses, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        responses, 15, result_ordering(responses, ('-created_at', '-pk')), request.GET
+    )
+    results = await gather_queries(
+        page_obj=paginator.get_page,
+        total_responses=Response.objects.filter(ad_author=user).count,
+        accepted_responses=Response.objects.filter(ad_author=user, is_accepted=True).count,
+        user_ads=lambda: list(user_ads),
+    )
+    page_obj = results['page_obj']
+    await sync_to_async(avatar_urls)([response.from_user_id for response in page_obj])
 
-    total_responses = Response.objects.filter(ad__in=user_ads).count()
-    accepted_responses = Response.objects.filter(ad__in=user_ads, is_accepted=True).count()
+    total_responses = results['total_responses']
+    accepted_responses = results['accepted_responses']
     pending_responses = total_responses - accepted_responses
 
     context = {
@@ -149,10 +216,31 @@ def my_responses_view(request):
         'pending_responses': pending_responses,
         'filter_type': filter_type,
         'search_query': search_query,
-        'user_ads': user_ads,
+        'user_ads': results['user_ads'],
     }
 
-    return render(request, 'board/responses/list.html', context)
+    return await sync_to_async(render)(request, 'board/responses/list.html', context)
+
+
+@login_required
+@require_POST
+def bulk_responses_view(request):
+    action = request.POST.get('action')
+    ad_id = request.POST.get('ad')
+    pks = [pk for pk in request.POST.getlist('responses') if pk.isdigit()]
+    # "все ожидающие по объявлению" важнее отдельных галочек
+    ad_id = int(ad_id) if ad_id and ad_id.isdigit() else None
+
+    if action == 'accept':
+        count = accept_responses(request.user, pks=pks, ad_id=ad_id)
+        messages.success(request, f'Принято откликов: {count}')
+    elif action == 'reject':
+        count = reject_responses(request.user, pks=pks, ad_id=ad_id)
+        messages.success(request, f'Отклонено откликов: {count}')
+    else:
+        messages.error(request, 'Неизвестное действие')
+
+    return redirect('my_responses')
 
 
 @login_required
@@ -174,9 +262,9 @@ def response_detail_view(request,pk):
 
 @login_required
 def accept_response_view(request, pk):
-    response = get_object_or_404(Response, pk=pk)
+    response = get_object_or_404(Response.objects.select_related('from_user'), pk=pk)
 
-    if response.ad.author != request.user:
+    if response.ad_author_id != request.user.pk:
         messages.error(request, 'Вы не можете принимать отклики на чужие объявления')
         return redirect('my_responses')
 
@@ -218,6 +306,7 @@ def delete_response_view(request, pk):
 
 
 @login_required
+@throttle('send_response')
 def send_response_view(request, ad_pk):
     ad = get_object_or_404(Ad, pk=ad_pk)
 
@@ -249,4 +338,15 @@ def send_response_view(request, ad_pk):
         'ad': ad,
     }
 
-    return render(request, 'board/responses/send.html', context)
\ No newline at end of file
+    return render(request, 'board/responses/send.html', context)
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def sql_stats_view(request):
+    """Сводка QueryInstrumentationMiddleware по маршрутам этого процесса; POST обнуляет её."""
+    if request.method == 'POST':
+        instrumentation.aggregates.reset()
+    return JsonResponse({
+        'enabled': getattr(settings, 'SQL_INSTRUMENTATION', False),
+        'routes': instrumentation.aggregates.snapshot(),
+    }, json_dumps_params={'ensure_ascii': False, 'indent': 2})
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bulletin_board.settings')
 
 application = get_asgi_application()
+
+# буфер последней активности (accounts.activity) досылается при остановке воркера
+from accounts.activity import flush_at_exit  # noqa: E402
+
+flush_at_exit()
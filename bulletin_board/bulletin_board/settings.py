@@ -59,12 +59,24 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.ActivityMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django_otp.middleware.OTPMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Счётчики SQL на каждый запрос (board.instrumentation): Server-Timing, лог тяжёлых запросов,
+# сводка по маршрутам на /bulletin-board/debug/sql/ для персонала
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', '') == '1'
+SQL_INSTRUMENTATION_MAX_QUERIES = 50
+SQL_INSTRUMENTATION_MAX_DB_MS = 200
+SQL_INSTRUMENTATION_SLOW_QUERY_MS = 100
+SQL_INSTRUMENTATION_DUPLICATE_THRESHOLD = 5
+if SQL_INSTRUMENTATION:
+    # первым, чтобы в счёт попали и запросы сессий и аутентификации
+    MIDDLEWARE.insert(0, 'board.instrumentation.QueryInstrumentationMiddleware')
+
 ROOT_URLCONF = 'bulletin_board.urls'
 
 SITE_ID = 1
@@ -173,4 +185,78 @@ LOGOUT_REDIRECT_URL = 'home'
 ACCOUNT_LOGOUT_REDIRECT_URL = 'home'
 SERVER_EMAIL = os.getenv('EMAIL_HOST_USER')
 
-SITE_URL = 'http://localhost:8000'
\ No newline at end of file
+SITE_URL = 'http://localhost:8000'
+# Outbox: письма из сигналов отправляет `manage.py run_outbox`
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+
+NEWSLETTER_BATCH_SIZE = 100
+NEWSLETTER_CHUNK_SIZE = 2000
+
+# Сводки об откликах: по cron `manage.py send_digests hourly` каждый час и `send_digests daily` раз в сутки
+DIGEST_BATCH_SIZE = 500
+DIGEST_MAX_RESPONSES_PER_AD = 5
+
+# Последняя активность копится в памяти процесса и пишется в Profile пачкой: по времени или по размеру
+ACTIVITY_FLUSH_INTERVAL = 60
+ACTIVITY_FLUSH_SIZE = 500
+
+# Уменьшенные копии картинок объявлений (board.images)
+IMAGE_RENDITION_WIDTHS = (320, 640, 1280)
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_WORKERS = 2
+
+# Скачивание вложений объявлений (board.downloads). В проде файлы отдаёт nginx:
+#   location /protected-media/ { internal; alias /path/to/media/; }
+# и DOWNLOADS_SENDFILE_BACKEND = 'nginx' (или 'sendfile' для Apache/lighttpd).
+DOWNLOADS_SENDFILE_BACKEND = None
+DOWNLOADS_ACCEL_PREFIX = '/protected-media/'
+
+# Аватары (accounts.avatars): квадратные копии и кэш их URL
+AVATAR_SIZES = (40, 96, 256)
+AVATAR_URL_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Общий для всех процессов кэш (URL аватаров, счётчики). Без REDIS_URL — локальный LocMem.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Кэш страниц для анонимных посетителей (board.pagecache)
+PAGE_CACHE_TIMEOUT = 300
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_LOCK_WAIT = 2.0
+
+# JSON API (board.api): сколько дней хранятся записи об удалениях для лент изменений since=
+API_TOMBSTONE_DAYS = 30
+
+# Справочник категорий в памяти процесса (board.categories): интервал сверки версии, секунд
+CATEGORY_REGISTRY_CHECK_INTERVAL = 5
+
+# Коды подтверждения регистрации (accounts.otp), хранятся в кэше с TTL
+OTP_TTL = 600
+OTP_MAX_ATTEMPTS = 5
+OTP_RESEND_INTERVAL = 60
+
+# Лимиты частоты (accounts.throttling): token bucket на IP и на пользователя.
+# scope -> {'ip': 'N/период', 'user': 'N/период'}, период: 30s, 10m, 1h, 1d; scope без записи не ограничен
+THROTTLE_RATES = {
+    'register': {'ip': '5/10m'},
+    'resend_code': {'ip': '3/10m'},
+    'password_reset': {'ip': '5/h'},
+    'send_response': {'ip': '30/h', 'user': '10/10m'},
+}
+THROTTLE_NUM_PROXIES = 0
+
+# Async-вьюхи (board.concurrency): независимые запросы в отдельных потоках и соединениях
+ASYNC_PARALLEL_QUERIES = True